@@ -1,29 +1,118 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Header, Response, UploadFile, File, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.read_preferences import ReadPreference, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
 import os
+import asyncio
+import bisect
+import functools
+import inspect
+import hashlib
+import io
+import json
 import logging
+import math
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+import gzip
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from zoneinfo import ZoneInfo
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, create_model
+from typing import Dict, List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
 from passlib.context import CryptContext
 import jwt
 
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # menu image uploads disabled
+    Image = None
+
+try:
+    import numpy as np
+except ImportError:  # ad-hoc analytics disabled
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export disabled
+    pa = None
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Database connection
+# STORAGE_BACKEND=mongo (default) uses MongoDB via Motor; STORAGE_BACKEND=sqlite
+# uses an embedded SQLite file for single-outlet deployments.
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo').lower()
+if STORAGE_BACKEND == 'sqlite':
+    from sqlite_store import SQLiteClient
+    client = SQLiteClient(
+        os.environ.get('SQLITE_PATH', str(ROOT_DIR / 'kasir.db')),
+        pool_size=int(os.environ.get('SQLITE_POOL_SIZE', '4'))
+    )
+else:
+    mongo_url = os.environ['MONGO_URL']
+    # One pool shared by every outlet served from this process
+    client = AsyncIOMotorClient(mongo_url, maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')))
 db = client[os.environ['DB_NAME']]
 
+# Every document belongs to an outlet; requests are scoped to the outlet in the
+# caller's JWT. Single-outlet deployments simply use DEFAULT_OUTLET_ID.
+DEFAULT_OUTLET_ID = os.environ.get('DEFAULT_OUTLET_ID', 'default')
+OUTLET_COLLECTIONS = ("users", "categories", "menu_items", "tables", "orders", "transactions", "settings")
+
+def analytics_read_preference():
+    """
+    Read preference for analytical queries (reports, dashboard stats, exports).
+    REPORTS_READ_PREFERENCE: primary, primaryPreferred, secondary,
+    secondaryPreferred or nearest. REPORTS_MAX_STALENESS_SECONDS: -1 for no
+    limit, otherwise at least 90 seconds.
+    """
+    mode = os.environ.get('REPORTS_READ_PREFERENCE', 'primary')
+    max_staleness = int(os.environ.get('REPORTS_MAX_STALENESS_SECONDS', '-1'))
+    modes = {
+        'primary': lambda: ReadPreference.PRIMARY,
+        'primaryPreferred': lambda: PrimaryPreferred(max_staleness=max_staleness),
+        'secondary': lambda: Secondary(max_staleness=max_staleness),
+        'secondaryPreferred': lambda: SecondaryPreferred(max_staleness=max_staleness),
+        'nearest': lambda: Nearest(max_staleness=max_staleness),
+    }
+    if mode not in modes:
+        raise ValueError(f"Invalid REPORTS_READ_PREFERENCE: {mode}")
+    return modes[mode]()
+
+# Analytical endpoints read through reports_db so heavy scans can be routed to
+# secondaries; POS and checkout paths keep using db (primary).
+if STORAGE_BACKEND == 'sqlite':
+    reports_db = db
+else:
+    reports_db = client.get_database(os.environ['DB_NAME'], read_preference=analytics_read_preference())
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # JWT settings
 SECRET_KEY = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
@@ -42,6 +131,7 @@ class User(BaseModel):
     username: str
     full_name: str
     role: str  # "admin" or "kasir"
+    outlet_id: str = DEFAULT_OUTLET_ID
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class UserCreate(BaseModel):
@@ -64,11 +154,18 @@ class Category(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     description: Optional[str] = None
+    version: int = 1
+    outlet_id: str = DEFAULT_OUTLET_ID
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class CategoryCreate(BaseModel):
     name: str
     description: Optional[str] = None
+    version: Optional[int] = None  # on update: the version being edited; a newer one is a 409
+
+class RecipeLine(BaseModel):
+    ingredient_id: str
+    quantity: float = Field(gt=0)  # ingredient units used per menu item sold
 
 class MenuItem(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -78,7 +175,12 @@ class MenuItem(BaseModel):
     price: float
     description: Optional[str] = None
     image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
     available: bool = True
+    stock: Optional[float] = None  # None: not tracked
+    recipe: List[RecipeLine] = []
+    version: int = 1
+    outlet_id: str = DEFAULT_OUTLET_ID
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class MenuItemCreate(BaseModel):
@@ -88,6 +190,32 @@ class MenuItemCreate(BaseModel):
     description: Optional[str] = None
     image_url: Optional[str] = None
     available: bool = True
+    stock: Optional[float] = None
+    recipe: List[RecipeLine] = []
+    version: Optional[int] = None
+
+class Ingredient(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    unit: str = "pcs"
+    stock: float = 0
+    outlet_id: str = DEFAULT_OUTLET_ID
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class IngredientCreate(BaseModel):
+    name: str
+    unit: str = "pcs"
+    stock: float = 0
+
+class MenuSearchHit(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    name: str
+    category_id: str
+    price: float
+    thumbnail_url: Optional[str] = None
+    available: bool = True
 
 class Table(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -95,14 +223,18 @@ class Table(BaseModel):
     table_number: str
     capacity: int
     status: str  # "available", "occupied", "reserved"
+    version: int = 1
+    outlet_id: str = DEFAULT_OUTLET_ID
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class TableCreate(BaseModel):
     table_number: str
     capacity: int
     status: str = "available"
+    version: Optional[int] = None
 
 class OrderItem(BaseModel):
+    line_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     menu_item_id: str
     menu_item_name: str
     quantity: int
@@ -123,6 +255,7 @@ class Order(BaseModel):
     total: float
     status: str  # "pending", "completed", "cancelled"
     created_by: str
+    outlet_id: str = DEFAULT_OUTLET_ID
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     completed_at: Optional[datetime] = None
 
@@ -135,6 +268,13 @@ class OrderCreate(BaseModel):
     tax: float
     total: float
 
+class OrderItemsAdd(BaseModel):
+    items: List[OrderItem] = Field(min_length=1)
+
+class OrderItemUpdate(BaseModel):
+    quantity: int = Field(ge=1)
+    notes: Optional[str] = None
+
 class Transaction(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -145,6 +285,7 @@ class Transaction(BaseModel):
     change_amount: float
     total: float
     cashier: str
+    outlet_id: str = DEFAULT_OUTLET_ID
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class TransactionCreate(BaseModel):
@@ -154,6 +295,77 @@ class TransactionCreate(BaseModel):
     change_amount: float
     total: float
 
+class TransactionWithOrder(Transaction):
+    order: Optional[Order] = None
+
+class TransactionPage(BaseModel):
+    items: List[TransactionWithOrder]
+    skip: int
+    limit: int
+    has_more: bool
+
+class SyncOrder(OrderCreate):
+    id: str  # generated on the terminal while offline
+    created_at: datetime
+
+class SyncPayment(BaseModel):
+    id: str  # generated on the terminal while offline
+    order_id: Optional[str] = None  # only for orders that were already synced
+    payment_method: str
+    amount_paid: float
+    change_amount: float
+    total: float
+    created_at: datetime
+
+class SyncEntry(BaseModel):
+    order: Optional[SyncOrder] = None
+    payment: Optional[SyncPayment] = None
+
+class SyncBatch(BaseModel):
+    terminal_id: Optional[str] = None
+    entries: List[SyncEntry]
+
+class SyncEntryResult(BaseModel):
+    status: str  # "applied", "duplicate", "error"
+    order_id: Optional[str] = None
+    order_number: Optional[str] = None
+    transaction_id: Optional[str] = None
+    transaction_number: Optional[str] = None
+    detail: Optional[str] = None
+
+class SyncResult(BaseModel):
+    applied: int
+    duplicates: int
+    errors: int
+    results: List[SyncEntryResult]
+
+class Shift(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    username: str
+    cashier: str  # full name, as stamped on transactions
+    status: str = "open"  # "open", "closed"
+    opening_cash: float = 0
+    totals: Dict[str, float] = Field(default_factory=dict)  # payment method -> amount
+    transaction_count: int = 0
+    expected_cash: Optional[float] = None
+    counted_cash: Optional[float] = None
+    cash_difference: Optional[float] = None
+    note: Optional[str] = None
+    outlet_id: str = DEFAULT_OUTLET_ID
+    opened_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    closed_at: Optional[datetime] = None
+
+class ShiftOpen(BaseModel):
+    opening_cash: float = Field(0, ge=0)
+
+class ShiftClose(BaseModel):
+    counted_cash: float = Field(ge=0)
+    note: Optional[str] = None
+
+class ShiftReport(Shift):
+    transactions: Optional[List[Transaction]] = None
+
 class Settings(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -162,6 +374,8 @@ class Settings(BaseModel):
     phone: str
     tax_percentage: float = 10.0
     logo_url: Optional[str] = None
+    version: int = 1
+    outlet_id: str = DEFAULT_OUTLET_ID
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class SettingsUpdate(BaseModel):
@@ -170,6 +384,7 @@ class SettingsUpdate(BaseModel):
     phone: Optional[str] = None
     tax_percentage: Optional[float] = None
     logo_url: Optional[str] = None
+    version: Optional[int] = None
 
 # ==================== HELPER FUNCTIONS ====================
 
@@ -202,6 +417,11 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
     
+    # Tokens issued before outlets existed carry no outlet claim
+    outlet_id = payload.get("outlet", user.get('outlet_id', DEFAULT_OUTLET_ID))
+    if outlet_id != user.get('outlet_id', DEFAULT_OUTLET_ID):
+        raise HTTPException(status_code=401, detail="Token outlet does not match user")
+    
     if isinstance(user['created_at'], str):
         user['created_at'] = datetime.fromisoformat(user['created_at'])
     
@@ -212,10 +432,114 @@ async def get_admin_user(current_user: User = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
 
+def get_request_outlet(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    """Outlet for endpoints that also serve unauthenticated callers, who only ever see the default outlet."""
+    if credentials:
+        try:
+            payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+            return payload.get("outlet", DEFAULT_OUTLET_ID)
+        except jwt.PyJWTError:
+            raise HTTPException(status_code=401, detail="Could not validate credentials")
+    return DEFAULT_OUTLET_ID
+
+def outlet_scope(current_user: User, query: Optional[dict] = None):
+    return {**(query or {}), "outlet_id": current_user.outlet_id}
+
+# Admin-editable documents carry a version that every edit increments.
+# Clients send back the version they loaded; an edit made against an older
+# one matches nothing and is reported as a conflict.
+VERSIONED_COLLECTIONS = ("categories", "menu_items", "tables", "settings")
+
+def versioned(query: dict, expected: Optional[int]):
+    return query if expected is None else {**query, "version": expected}
+
+async def update_versioned(collection, query: dict, update_data: dict, expected: Optional[int], label: str):
+    """$set update_data and bump the version in one round trip; returns the updated document."""
+    doc = await collection.find_one_and_update(
+        versioned(query, expected),
+        {"$set": update_data, "$inc": {"version": 1}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if doc is None:
+        # Only a failed edit pays for a second read, to tell a conflict from a missing document
+        if expected is not None and await collection.find_one(query, {"_id": 0, "id": 1}):
+            raise HTTPException(status_code=409, detail=f"{label} was changed by someone else, reload and try again")
+        raise HTTPException(status_code=404, detail=f"{label} not found")
+    if isinstance(doc.get('created_at'), str):
+        doc['created_at'] = datetime.fromisoformat(doc['created_at'])
+    return doc
+
+def parse_fields(fields: Optional[str], model: type):
+    """Field names from a comma-separated fields= parameter; id is always included."""
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(sorted(requested | {"id"}))
+
+def field_projection(fields: Optional[tuple], default: Optional[dict] = None):
+    if fields is None:
+        return default or {"_id": 0}
+    return {"_id": 0, **dict.fromkeys(fields, 1)}
+
+@functools.lru_cache(maxsize=128)
+def sparse_model(model: type, fields: tuple):
+    """Response model with only `fields` of `model`."""
+    return create_model(
+        f"{model.__name__}Fields",
+        __config__=ConfigDict(extra="ignore"),
+        **{name: (Optional[model.model_fields[name].annotation], None) for name in fields}
+    )
+
+def sparse_response(docs: list, model: type, fields: tuple):
+    partial = sparse_model(model, fields)
+    return JSONResponse([partial(**doc).model_dump(mode="json") for doc in docs])
+
+class LRUCache:
+    """Small in-process LRU cache with hit/miss counters and optional per-entry TTL."""
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        if key in self.entries:
+            value, expires_at = self.entries[key]
+            if expires_at is None or expires_at > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+        self.misses += 1
+        return None
+    
+    def put(self, key, value, ttl: Optional[float] = None):
+        self.entries[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+    
+    def discard(self, predicate):
+        """Drop every entry whose key matches predicate."""
+        for key in [k for k in self.entries if predicate(k)]:
+            del self.entries[key]
+    
+    def stats(self):
+        return {"entries": len(self.entries), "max_entries": self.max_entries, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
 # ==================== AUTH ROUTES ====================
 
 @api_router.post("/auth/register", response_model=User)
-async def register(user_input: UserCreate):
+async def register(user_input: UserCreate, current_user: User = Depends(get_admin_user)):
+    """Staff accounts are created by an admin, always inside the admin's own outlet."""
     # Check if username exists
     existing_user = await db.users.find_one({"username": user_input.username}, {"_id": 0})
     if existing_user:
@@ -225,12 +549,16 @@ async def register(user_input: UserCreate):
     password = user_dict.pop("password")
     hashed_password = get_password_hash(password)
     
-    user_obj = User(**user_dict)
+    user_obj = User(**user_dict, outlet_id=current_user.outlet_id)
     doc = user_obj.model_dump()
     doc['hashed_password'] = hashed_password
     doc['created_at'] = doc['created_at'].isoformat()
     
-    await db.users.insert_one(doc)
+    try:
+        await db.users.insert_one(doc)
+    except DuplicateKeyError:
+        # Registered concurrently; the unique index has the final say
+        raise HTTPException(status_code=400, detail="Username already registered")
     return user_obj
 
 @api_router.post("/auth/login", response_model=Token)
@@ -239,7 +567,10 @@ async def login(user_input: UserLogin):
     if not user or not verify_password(user_input.password, user['hashed_password']):
         raise HTTPException(status_code=401, detail="Incorrect username or password")
     
-    access_token = create_access_token(data={"sub": user['username']})
+    access_token = create_access_token(data={
+        "sub": user['username'],
+        "outlet": user.get('outlet_id', DEFAULT_OUTLET_ID)
+    })
     
     if isinstance(user['created_at'], str):
         user['created_at'] = datetime.fromisoformat(user['created_at'])
@@ -255,15 +586,18 @@ async def get_me(current_user: User = Depends(get_current_user)):
 
 @api_router.post("/categories", response_model=Category)
 async def create_category(category_input: CategoryCreate, current_user: User = Depends(get_admin_user)):
-    category_obj = Category(**category_input.model_dump())
+    category_obj = Category(**category_input.model_dump(exclude={"version"}), outlet_id=current_user.outlet_id)
     doc = category_obj.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.categories.insert_one(doc)
     return category_obj
 
 @api_router.get("/categories", response_model=List[Category])
-async def get_categories(current_user: User = Depends(get_current_user)):
-    categories = await db.categories.find({}, {"_id": 0}).to_list(1000)
+async def get_categories(fields: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    selected = parse_fields(fields, Category)
+    categories = await db.categories.find(outlet_scope(current_user), field_projection(selected)).to_list(1000)
+    if selected:
+        return sparse_response(categories, Category, selected)
     for cat in categories:
         if isinstance(cat['created_at'], str):
             cat['created_at'] = datetime.fromisoformat(cat['created_at'])
@@ -271,77 +605,594 @@ async def get_categories(current_user: User = Depends(get_current_user)):
 
 @api_router.put("/categories/{category_id}", response_model=Category)
 async def update_category(category_id: str, category_input: CategoryCreate, current_user: User = Depends(get_admin_user)):
-    result = await db.categories.update_one(
-        {"id": category_id},
-        {"$set": category_input.model_dump()}
+    category = await update_versioned(
+        db.categories, outlet_scope(current_user, {"id": category_id}),
+        category_input.model_dump(exclude={"version"}), category_input.version, "Category"
     )
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Category not found")
-    
-    category = await db.categories.find_one({"id": category_id}, {"_id": 0})
-    if isinstance(category['created_at'], str):
-        category['created_at'] = datetime.fromisoformat(category['created_at'])
     return Category(**category)
 
 @api_router.delete("/categories/{category_id}")
 async def delete_category(category_id: str, current_user: User = Depends(get_admin_user)):
-    result = await db.categories.delete_one({"id": category_id})
+    result = await db.categories.delete_one(outlet_scope(current_user, {"id": category_id}))
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
     return {"message": "Category deleted successfully"}
 
+# ==================== MENU SEARCH INDEX ====================
+
+# Each worker keeps an index per outlet, updated in place on its own menu
+# writes and rebuilt after MENU_INDEX_REFRESH_SECONDS to pick up the others'.
+MENU_INDEX_REFRESH_SECONDS = float(os.environ.get('MENU_INDEX_REFRESH_SECONDS', '300'))
+menu_indexes = {}
+
+def search_tokens(text: Optional[str]):
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode().lower()
+    return re.findall(r"[a-z0-9]+", text)
+
+def token_variants(token: str):
+    """The token plus its single-character deletions; two tokens sharing a variant are at most one edit apart."""
+    return {token} | {token[:i] + token[i + 1:] for i in range(len(token))}
+
+class MenuSearchIndex:
+    """Token/prefix index over one outlet's menu item names and descriptions."""
+    
+    NAME_WEIGHT = 3
+    DESCRIPTION_WEIGHT = 1
+    
+    def __init__(self):
+        self.items = {}
+        self.item_tokens = {}
+        self.postings = {}
+        self.sorted_tokens = []
+        self.variants = defaultdict(set)
+        self.loaded_at = time.monotonic()
+    
+    def add(self, item: dict):
+        self.remove(item['id'])
+        weights = {token: self.DESCRIPTION_WEIGHT for token in search_tokens(item.get('description'))}
+        weights.update({token: self.NAME_WEIGHT for token in search_tokens(item['name'])})
+        for token, weight in weights.items():
+            if token not in self.postings:
+                self.postings[token] = {}
+                bisect.insort(self.sorted_tokens, token)
+                for variant in token_variants(token):
+                    self.variants[variant].add(token)
+            self.postings[token][item['id']] = weight
+        self.items[item['id']] = MenuSearchHit(**item)
+        self.item_tokens[item['id']] = set(weights)
+    
+    def remove(self, item_id: str):
+        self.items.pop(item_id, None)
+        for token in self.item_tokens.pop(item_id, ()):
+            posting = self.postings[token]
+            posting.pop(item_id, None)
+            if posting:
+                continue
+            del self.postings[token]
+            del self.sorted_tokens[bisect.bisect_left(self.sorted_tokens, token)]
+            for variant in token_variants(token):
+                self.variants[variant].discard(token)
+                if not self.variants[variant]:
+                    del self.variants[variant]
+    
+    def expand(self, term: str):
+        """Indexed tokens matching a query term, with a score factor: exact 1, prefix 0.8, one typo 0.5."""
+        matches = {}
+        i = bisect.bisect_left(self.sorted_tokens, term)
+        while i < len(self.sorted_tokens) and self.sorted_tokens[i].startswith(term):
+            token = self.sorted_tokens[i]
+            matches[token] = 1.0 if token == term else 0.8
+            i += 1
+        if len(term) >= 3:
+            for variant in token_variants(term):
+                for token in self.variants.get(variant, ()):
+                    matches.setdefault(token, 0.5)
+        return matches
+    
+    def search(self, q: str, category_id: Optional[str] = None, include_unavailable: bool = False, limit: int = 50):
+        terms = search_tokens(q)
+        if terms:
+            # Every term must match; an item scores its best match per term
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for token, factor in self.expand(term).items():
+                    for item_id, weight in self.postings[token].items():
+                        term_scores[item_id] = max(term_scores.get(item_id, 0), weight * factor)
+                scores = term_scores if scores is None else {
+                    item_id: score + term_scores[item_id] for item_id, score in scores.items() if item_id in term_scores
+                }
+                if not scores:
+                    break
+        else:
+            scores = dict.fromkeys(self.items, 0)
+        
+        hits = [
+            self.items[item_id] for item_id in scores
+            if (include_unavailable or self.items[item_id].available)
+            and (not category_id or self.items[item_id].category_id == category_id)
+        ]
+        hits.sort(key=lambda hit: (-scores[hit.id], hit.name.lower()))
+        return hits[:limit]
+
+async def menu_index(outlet_id: str):
+    index = menu_indexes.get(outlet_id)
+    if index is None or time.monotonic() - index.loaded_at > MENU_INDEX_REFRESH_SECONDS:
+        index = MenuSearchIndex()
+        items = await db.menu_items.find(
+            {"outlet_id": outlet_id},
+            {"_id": 0, "id": 1, "name": 1, "description": 1, "category_id": 1, "price": 1,
+             "thumbnail_url": 1, "available": 1}
+        ).to_list(None)
+        for item in items:
+            index.add(item)
+        menu_indexes[outlet_id] = index
+    return index
+
+def index_menu_item(item: dict):
+    if item['outlet_id'] in menu_indexes:
+        menu_indexes[item['outlet_id']].add(item)
+
+def unindex_menu_item(outlet_id: str, item_id: str):
+    if outlet_id in menu_indexes:
+        menu_indexes[outlet_id].remove(item_id)
+
 # ==================== MENU ITEM ROUTES ====================
 
 @api_router.post("/menu-items", response_model=MenuItem)
 async def create_menu_item(item_input: MenuItemCreate, current_user: User = Depends(get_admin_user)):
-    item_obj = MenuItem(**item_input.model_dump())
+    item_obj = MenuItem(**item_input.model_dump(exclude={"version"}), outlet_id=current_user.outlet_id)
     doc = item_obj.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.menu_items.insert_one(doc)
+    index_menu_item(doc)
     return item_obj
 
 @api_router.get("/menu-items", response_model=List[MenuItem])
-async def get_menu_items(current_user: User = Depends(get_current_user)):
-    items = await db.menu_items.find({}, {"_id": 0}).to_list(1000)
+async def get_menu_items(fields: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    selected = parse_fields(fields, MenuItem)
+    items = await db.menu_items.find(outlet_scope(current_user), field_projection(selected)).to_list(1000)
+    if selected:
+        return sparse_response(items, MenuItem, selected)
     for item in items:
         if isinstance(item['created_at'], str):
             item['created_at'] = datetime.fromisoformat(item['created_at'])
     return items
 
+@api_router.get("/menu-items/search", response_model=List[MenuSearchHit])
+async def search_menu_items(
+    q: str = "",
+    category_id: Optional[str] = None,
+    include_unavailable: bool = False,
+    limit: int = Query(50, ge=1, le=1000),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Search menu item names and descriptions by token prefix, tolerating one typo per word.
+    Returns only the fields the POS grid needs; an empty q lists the menu by name.
+    """
+    index = await menu_index(current_user.outlet_id)
+    return index.search(q, category_id, include_unavailable, limit)
+
 @api_router.put("/menu-items/{item_id}", response_model=MenuItem)
 async def update_menu_item(item_id: str, item_input: MenuItemCreate, current_user: User = Depends(get_admin_user)):
-    result = await db.menu_items.update_one(
-        {"id": item_id},
-        {"$set": item_input.model_dump()}
+    update_data = item_input.model_dump(exclude={"version"})
+    # Keep an uploaded image, and stock links set elsewhere, when the form does not send them
+    for field in ("image_url", "stock", "recipe"):
+        if field not in item_input.model_fields_set:
+            update_data.pop(field)
+    item = await update_versioned(
+        db.menu_items, outlet_scope(current_user, {"id": item_id}), update_data, item_input.version, "Menu item"
     )
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Menu item not found")
-    
-    item = await db.menu_items.find_one({"id": item_id}, {"_id": 0})
-    if isinstance(item['created_at'], str):
-        item['created_at'] = datetime.fromisoformat(item['created_at'])
+    index_menu_item(item)
     return MenuItem(**item)
 
 @api_router.delete("/menu-items/{item_id}")
 async def delete_menu_item(item_id: str, current_user: User = Depends(get_admin_user)):
-    result = await db.menu_items.delete_one({"id": item_id})
+    result = await db.menu_items.delete_one(outlet_scope(current_user, {"id": item_id}))
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Menu item not found")
+    unindex_menu_item(current_user.outlet_id, item_id)
     return {"message": "Menu item deleted successfully"}
 
+# ==================== MENU IMAGES ====================
+
+# Uploaded images are resized to square WebP thumbnails in a process pool and
+# stored under MEDIA_DIR by content hash, so a URL never changes meaning and
+# can be cached forever by the terminals.
+MEDIA_DIR = Path(os.environ.get('MEDIA_DIR', str(ROOT_DIR / 'media')))
+THUMBNAIL_SIZES = tuple(sorted(int(size) for size in os.environ.get('THUMBNAIL_SIZES', '160,480').split(',')))
+MAX_IMAGE_BYTES = int(os.environ.get('MAX_IMAGE_BYTES', str(5 * 1024 * 1024)))
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', '2'))
+MEDIA_FILENAME = re.compile(r"^[0-9a-f]{32}\.webp$")
+image_pool = None
+
+def render_thumbnails(data: bytes, sizes: tuple):
+    """Center-cropped WebP thumbnail per size. Runs in a worker process."""
+    thumbnails = {}
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+        for size in sizes:
+            thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            thumbnail.save(buffer, "WEBP", quality=80, method=4)
+            thumbnails[size] = buffer.getvalue()
+    return thumbnails
+
+def store_media(data: bytes):
+    """Write under a unique temporary name, so concurrent uploads never share one."""
+    name = f"{hashlib.sha256(data).hexdigest()[:32]}.webp"
+    path = MEDIA_DIR / "menu" / name
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=name, suffix=".tmp", delete=False) as tmp:
+            try:
+                tmp.write(data)
+            except BaseException:
+                tmp.close()
+                os.unlink(tmp.name)
+                raise
+        os.replace(tmp.name, path)
+    return f"/api/media/menu/{name}"
+
+@api_router.post("/menu-items/{item_id}/image", response_model=MenuItem)
+async def upload_menu_item_image(
+    item_id: str,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_admin_user)
+):
+    global image_pool
+    if Image is None:
+        raise HTTPException(status_code=503, detail="Image processing is not available")
+    item = await db.menu_items.find_one(outlet_scope(current_user, {"id": item_id}), {"_id": 0})
+    if not item:
+        raise HTTPException(status_code=404, detail="Menu item not found")
+    data = await file.read(MAX_IMAGE_BYTES + 1)
+    if len(data) > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Image is too large")
+    
+    if image_pool is None:
+        image_pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    try:
+        thumbnails = await asyncio.get_running_loop().run_in_executor(
+            image_pool, render_thumbnails, data, THUMBNAIL_SIZES
+        )
+    except Exception:
+        raise HTTPException(status_code=400, detail="Unsupported or corrupt image")
+    urls = {size: await asyncio.to_thread(store_media, webp) for size, webp in thumbnails.items()}
+    
+    item['image_url'] = urls[THUMBNAIL_SIZES[-1]]
+    item['thumbnail_url'] = urls[THUMBNAIL_SIZES[0]]
+    await db.menu_items.update_one(
+        outlet_scope(current_user, {"id": item_id}),
+        {"$set": {"image_url": item['image_url'], "thumbnail_url": item['thumbnail_url']}}
+    )
+    index_menu_item(item)
+    if isinstance(item['created_at'], str):
+        item['created_at'] = datetime.fromisoformat(item['created_at'])
+    return MenuItem(**item)
+
+@api_router.get("/media/menu/{filename}")
+async def get_menu_image(
+    filename: str,
+    range_header: Optional[str] = Header(None, alias="range"),
+    if_none_match: Optional[str] = Header(None)
+):
+    path = MEDIA_DIR / "menu" / filename
+    if not MEDIA_FILENAME.match(filename) or not path.exists():
+        raise HTTPException(status_code=404, detail="Image not found")
+    headers = {
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "ETag": f'"{filename[:32]}"',
+        "Accept-Ranges": "bytes"
+    }
+    if if_none_match == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    
+    data = await asyncio.to_thread(path.read_bytes)
+    # A single "first-last", "first-" or "-suffix" byte range is honoured. Any
+    # other Range (several ranges, other units, last < first) is ignored and
+    # the whole image is sent, as RFC 9110 allows.
+    match = re.fullmatch(r"bytes=(?:(\d+)-(\d*)|-(\d+))", range_header.strip()) if range_header else None
+    if match and not (match.group(2) and int(match.group(2)) < int(match.group(1))):
+        first, last, suffix = match.groups()
+        size = len(data)
+        if suffix is not None:
+            start, end = max(size - int(suffix), 0), size - 1
+        else:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        if start >= size:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        return Response(
+            data[start:end + 1], status_code=206, media_type="image/webp",
+            headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"}
+        )
+    return Response(data, media_type="image/webp", headers=headers)
+
+# ==================== STOCK ====================
+
+# Menu items with a stock level, and the ingredients in their recipes, are
+# decremented with $inc when an order is placed. The filter only matches while
+# the level still covers the quantity, so the level is never read and written
+# back. Whatever runs out is marked unavailable and pushed to the menu search index.
+
+def stock_usage(items: List[OrderItem], menu: dict):
+    """Quantities sold per tracked menu item and used per ingredient."""
+    item_usage, ingredient_usage = defaultdict(float), defaultdict(float)
+    for line in items:
+        item = menu.get(line.menu_item_id)
+        if not item:
+            continue
+        if item.get('stock') is not None:
+            item_usage[item['id']] += line.quantity
+        for part in item.get('recipe') or []:
+            ingredient_usage[part['ingredient_id']] += part['quantity'] * line.quantity
+    return item_usage, ingredient_usage
+
+async def stock_menu(outlet_id: str, items: List[OrderItem]) -> dict:
+    return {
+        item['id']: item for item in await db.menu_items.find(
+            {"outlet_id": outlet_id, "id": {"$in": list({line.menu_item_id for line in items})}},
+            {"_id": 0, "id": 1, "name": 1, "available": 1, "stock": 1, "recipe": 1}
+        ).to_list(None)
+    }
+
+async def consume_stock(outlet_id: str, items: List[OrderItem], strict: bool = True):
+    """
+    Take an order's items out of stock. With strict, every decrement is
+    conditional on enough stock being left; if any of them misses, the ones
+    that applied are put back and the order is refused (409). Orders taken
+    offline are already sold and are always applied, even past zero.
+    """
+    menu = await stock_menu(outlet_id, items)
+    item_usage, ingredient_usage = stock_usage(items, menu)
+    
+    if not strict:
+        if item_usage:
+            await db.menu_items.bulk_write([
+                UpdateOne({"outlet_id": outlet_id, "id": item_id, "stock": {"$ne": None}}, {"$inc": {"stock": -quantity}})
+                for item_id, quantity in item_usage.items()
+            ], ordered=False)
+        if ingredient_usage:
+            await db.ingredients.bulk_write([
+                UpdateOne({"outlet_id": outlet_id, "id": ingredient_id}, {"$inc": {"stock": -quantity}})
+                for ingredient_id, quantity in ingredient_usage.items()
+            ], ordered=False)
+        await mark_sold_out(outlet_id, list(item_usage), list(ingredient_usage))
+        return
+    
+    for line in items:
+        item = menu.get(line.menu_item_id)
+        if item and not item.get('available', True):
+            raise HTTPException(status_code=409, detail=f"{item['name']} is not available")
+    
+    ingredients = {}
+    if ingredient_usage:
+        ingredients = {
+            ingredient['id']: ingredient for ingredient in await db.ingredients.find(
+                {"outlet_id": outlet_id, "id": {"$in": list(ingredient_usage)}}, {"_id": 0, "id": 1, "name": 1}
+            ).to_list(None)
+        }
+        if len(ingredients) < len(ingredient_usage):
+            raise HTTPException(status_code=409, detail="Not enough ingredients in stock")
+    
+    short = await take_stock(db.menu_items, outlet_id, item_usage)
+    if short:
+        raise HTTPException(status_code=409, detail=f"Not enough {menu[short]['name']} left")
+    short = await take_stock(db.ingredients, outlet_id, ingredient_usage)
+    if short:
+        await return_stock(db.menu_items, outlet_id, list(item_usage.items()))
+        raise HTTPException(status_code=409, detail=f"Not enough {ingredients[short]['name']} in stock")
+    await mark_sold_out(outlet_id, list(item_usage), list(ingredient_usage))
+
+async def take_stock(collection, outlet_id: str, usage: dict):
+    """
+    Decrement every level in `usage` with one ordered bulk_write; returns the
+    id that ran short (after putting back the decrements before it), or None.
+    
+    An ordered bulk does not stop on an update that matches nothing, so each
+    guarded $inc is an upsert: a level that is too low makes it insert a
+    second (outlet_id, id), which the unique index rejects. That stops the
+    bulk, and nMatched counts the decrements that went through before it.
+    Callers make sure every id exists, so the upsert never inserts.
+    """
+    if not usage:
+        return None
+    decrements = list(usage.items())
+    try:
+        await collection.bulk_write([
+            UpdateOne({"outlet_id": outlet_id, "id": key, "stock": {"$gte": quantity}},
+                      {"$inc": {"stock": -quantity}}, upsert=True)
+            for key, quantity in decrements
+        ], ordered=True)
+    except BulkWriteError as exc:
+        error = exc.details['writeErrors'][0]
+        if error['code'] != 11000:
+            raise
+        await return_stock(collection, outlet_id, decrements[:exc.details['nMatched']])
+        return decrements[error['index']][0]
+    return None
+
+async def return_stock(collection, outlet_id: str, increments: list):
+    if increments:
+        await collection.bulk_write([
+            UpdateOne({"outlet_id": outlet_id, "id": key}, {"$inc": {"stock": quantity}})
+            for key, quantity in increments
+        ], ordered=False)
+
+async def release_stock(outlet_id: str, items: List[OrderItem]):
+    """Put the items of removed order lines back into stock."""
+    item_usage, ingredient_usage = stock_usage(items, await stock_menu(outlet_id, items))
+    if item_usage:
+        await db.menu_items.bulk_write([
+            UpdateOne({"outlet_id": outlet_id, "id": item_id, "stock": {"$ne": None}}, {"$inc": {"stock": quantity}})
+            for item_id, quantity in item_usage.items()
+        ], ordered=False)
+        back = await db.menu_items.find(
+            {"outlet_id": outlet_id, "id": {"$in": list(item_usage)}, "stock": {"$gt": 0}, "available": False},
+            {"_id": 0, "id": 1}
+        ).to_list(None)
+        if back:
+            await set_availability(outlet_id, [item['id'] for item in back], True)
+    if ingredient_usage:
+        await db.ingredients.bulk_write([
+            UpdateOne({"outlet_id": outlet_id, "id": ingredient_id}, {"$inc": {"stock": quantity}})
+            for ingredient_id, quantity in ingredient_usage.items()
+        ], ordered=False)
+        for ingredient_id in ingredient_usage:
+            await restock_ingredient_items(outlet_id, ingredient_id)
+
+async def mark_sold_out(outlet_id: str, item_ids: list, ingredient_ids: list):
+    """Flip availability off for items that ran out, directly or through an ingredient."""
+    sold_out = set()
+    if item_ids:
+        sold_out.update(item['id'] for item in await db.menu_items.find(
+            {"outlet_id": outlet_id, "id": {"$in": item_ids}, "stock": {"$lte": 0}, "available": True},
+            {"_id": 0, "id": 1}
+        ).to_list(None))
+    if ingredient_ids:
+        empty = {ingredient['id'] for ingredient in await db.ingredients.find(
+            {"outlet_id": outlet_id, "id": {"$in": ingredient_ids}, "stock": {"$lte": 0}}, {"_id": 0, "id": 1}
+        ).to_list(None)}
+        if empty:
+            sold_out.update(item['id'] for item in await db.menu_items.find(
+                {"outlet_id": outlet_id, "available": True,
+                 "recipe": {"$elemMatch": {"ingredient_id": {"$in": list(empty)}}}},
+                {"_id": 0, "id": 1}
+            ).to_list(None))
+    if sold_out:
+        await set_availability(outlet_id, list(sold_out), False)
+
+async def set_availability(outlet_id: str, item_ids: list, available: bool):
+    await db.menu_items.update_many(
+        {"outlet_id": outlet_id, "id": {"$in": item_ids}}, {"$set": {"available": available}, "$inc": {"version": 1}}
+    )
+    for item in await db.menu_items.find({"outlet_id": outlet_id, "id": {"$in": item_ids}}, {"_id": 0}).to_list(None):
+        index_menu_item(item)
+
+async def restock_ingredient_items(outlet_id: str, ingredient_id: str):
+    """Make items available again once every ingredient they use is back in stock."""
+    items = await db.menu_items.find(
+        {"outlet_id": outlet_id, "available": False, "recipe": {"$elemMatch": {"ingredient_id": ingredient_id}}},
+        {"_id": 0, "id": 1, "stock": 1, "recipe": 1}
+    ).to_list(None)
+    if not items:
+        return
+    needed = {part['ingredient_id'] for item in items for part in item['recipe']}
+    levels = {
+        ingredient['id']: ingredient['stock'] for ingredient in await db.ingredients.find(
+            {"outlet_id": outlet_id, "id": {"$in": list(needed)}}, {"_id": 0, "id": 1, "stock": 1}
+        ).to_list(None)
+    }
+    ready = [
+        item['id'] for item in items
+        if (item.get('stock') is None or item['stock'] > 0)
+        and all(levels.get(part['ingredient_id'], 0) > 0 for part in item['recipe'])
+    ]
+    if ready:
+        await set_availability(outlet_id, ready, True)
+
+@api_router.post("/ingredients", response_model=Ingredient)
+async def create_ingredient(ingredient_input: IngredientCreate, current_user: User = Depends(get_admin_user)):
+    ingredient_obj = Ingredient(**ingredient_input.model_dump(), outlet_id=current_user.outlet_id)
+    doc = ingredient_obj.model_dump()
+    doc['created_at'] = doc['created_at'].isoformat()
+    await db.ingredients.insert_one(doc)
+    return ingredient_obj
+
+@api_router.get("/ingredients", response_model=List[Ingredient])
+async def get_ingredients(current_user: User = Depends(get_current_user)):
+    ingredients = await db.ingredients.find(outlet_scope(current_user), {"_id": 0}).sort("name", 1).to_list(1000)
+    for ingredient in ingredients:
+        if isinstance(ingredient['created_at'], str):
+            ingredient['created_at'] = datetime.fromisoformat(ingredient['created_at'])
+    return ingredients
+
+@api_router.put("/ingredients/{ingredient_id}", response_model=Ingredient)
+async def update_ingredient(ingredient_id: str, ingredient_input: IngredientCreate, current_user: User = Depends(get_admin_user)):
+    ingredient = await db.ingredients.find_one_and_update(
+        outlet_scope(current_user, {"id": ingredient_id}),
+        {"$set": ingredient_input.model_dump()},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if ingredient is None:
+        raise HTTPException(status_code=404, detail="Ingredient not found")
+    
+    if ingredient['stock'] > 0:
+        await restock_ingredient_items(current_user.outlet_id, ingredient_id)
+    else:
+        await mark_sold_out(current_user.outlet_id, [], [ingredient_id])
+    if isinstance(ingredient['created_at'], str):
+        ingredient['created_at'] = datetime.fromisoformat(ingredient['created_at'])
+    return Ingredient(**ingredient)
+
+@api_router.post("/ingredients/{ingredient_id}/adjust", response_model=Ingredient)
+async def adjust_ingredient(ingredient_id: str, delta: float, current_user: User = Depends(get_admin_user)):
+    """Add a delivery (positive delta) or write off waste (negative) without overwriting concurrent sales."""
+    ingredient = await db.ingredients.find_one_and_update(
+        outlet_scope(current_user, {"id": ingredient_id}),
+        {"$inc": {"stock": delta}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if ingredient is None:
+        raise HTTPException(status_code=404, detail="Ingredient not found")
+    
+    if ingredient['stock'] > 0:
+        await restock_ingredient_items(current_user.outlet_id, ingredient_id)
+    else:
+        await mark_sold_out(current_user.outlet_id, [], [ingredient_id])
+    if isinstance(ingredient['created_at'], str):
+        ingredient['created_at'] = datetime.fromisoformat(ingredient['created_at'])
+    return Ingredient(**ingredient)
+
+@api_router.delete("/ingredients/{ingredient_id}")
+async def delete_ingredient(ingredient_id: str, current_user: User = Depends(get_admin_user)):
+    result = await db.ingredients.delete_one(outlet_scope(current_user, {"id": ingredient_id}))
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Ingredient not found")
+    return {"message": "Ingredient deleted successfully"}
+
+@api_router.post("/menu-items/{item_id}/stock/adjust", response_model=MenuItem)
+async def adjust_menu_item_stock(item_id: str, delta: float, current_user: User = Depends(get_admin_user)):
+    """Add to (or take from) a tracked stock level with $inc; availability follows the new level."""
+    item = await db.menu_items.find_one_and_update(
+        outlet_scope(current_user, {"id": item_id, "stock": {"$ne": None}}),
+        {"$inc": {"stock": delta}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if item is None:
+        raise HTTPException(status_code=404, detail="Menu item not found or stock not tracked")
+    
+    if item['stock'] > 0 and not item['available']:
+        await set_availability(current_user.outlet_id, [item_id], True)
+        item.update(available=True, version=item['version'] + 1)
+    elif item['stock'] <= 0 and item['available']:
+        await set_availability(current_user.outlet_id, [item_id], False)
+        item.update(available=False, version=item['version'] + 1)
+    if isinstance(item['created_at'], str):
+        item['created_at'] = datetime.fromisoformat(item['created_at'])
+    return MenuItem(**item)
+
 # ==================== TABLE ROUTES ====================
 
 @api_router.post("/tables", response_model=Table)
 async def create_table(table_input: TableCreate, current_user: User = Depends(get_admin_user)):
-    table_obj = Table(**table_input.model_dump())
+    table_obj = Table(**table_input.model_dump(exclude={"version"}), outlet_id=current_user.outlet_id)
     doc = table_obj.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.tables.insert_one(doc)
     return table_obj
 
 @api_router.get("/tables", response_model=List[Table])
-async def get_tables(current_user: User = Depends(get_current_user)):
-    tables = await db.tables.find({}, {"_id": 0}).to_list(1000)
+async def get_tables(fields: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    selected = parse_fields(fields, Table)
+    tables = await db.tables.find(outlet_scope(current_user), field_projection(selected)).to_list(1000)
+    if selected:
+        return sparse_response(tables, Table, selected)
     for table in tables:
         if isinstance(table['created_at'], str):
             table['created_at'] = datetime.fromisoformat(table['created_at'])
@@ -349,59 +1200,246 @@ async def get_tables(current_user: User = Depends(get_current_user)):
 
 @api_router.put("/tables/{table_id}", response_model=Table)
 async def update_table(table_id: str, table_input: TableCreate, current_user: User = Depends(get_current_user)):
-    result = await db.tables.update_one(
-        {"id": table_id},
-        {"$set": table_input.model_dump()}
+    table = await update_versioned(
+        db.tables, outlet_scope(current_user, {"id": table_id}),
+        table_input.model_dump(exclude={"version"}), table_input.version, "Table"
     )
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Table not found")
-    
-    table = await db.tables.find_one({"id": table_id}, {"_id": 0})
-    if isinstance(table['created_at'], str):
-        table['created_at'] = datetime.fromisoformat(table['created_at'])
     return Table(**table)
 
 @api_router.delete("/tables/{table_id}")
 async def delete_table(table_id: str, current_user: User = Depends(get_admin_user)):
-    result = await db.tables.delete_one({"id": table_id})
+    result = await db.tables.delete_one(outlet_scope(current_user, {"id": table_id}))
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Table not found")
     return {"message": "Table deleted successfully"}
 
+# ==================== IDEMPOTENCY ====================
+
+# POST /orders and POST /transactions accept an Idempotency-Key header. The
+# first request reserves the key (unique index) and stores its response;
+# retries with the same key get that response back without any writes.
+IDEMPOTENCY_TTL_HOURS = float(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24'))
+idempotency_cache = LRUCache(int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '2048')))
+
+async def run_idempotent(key: Optional[str], scope: str, current_user: User, payload: BaseModel, handler):
+    if not key:
+        return await handler()
+    
+    cache_key = f"{scope}:{current_user.username}:{key}"
+    # Only what the client sent: generated defaults (line ids) differ on every retry
+    fingerprint = hashlib.sha256(payload.model_dump_json(exclude_unset=True).encode()).hexdigest()
+    
+    cached = idempotency_cache.get(cache_key)
+    if cached is None:
+        try:
+            await db.idempotency_keys.insert_one({
+                "key": cache_key,
+                "fingerprint": fingerprint,
+                "response": None,
+                "created_at": datetime.now(timezone.utc)
+            })
+        except DuplicateKeyError:
+            cached = await db.idempotency_keys.find_one({"key": cache_key}, {"_id": 0})
+            if cached is None:
+                # Expired between the insert and the read; treat as a new request
+                return await run_idempotent(key, scope, current_user, payload, handler)
+    
+    if cached is not None:
+        if cached['fingerprint'] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body")
+        if cached['response'] is None:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+        idempotency_cache.put(cache_key, cached)
+        return cached['response']
+    
+    try:
+        response = await handler()
+    except Exception:
+        # Let the client retry with the same key
+        await db.idempotency_keys.delete_one({"key": cache_key})
+        raise
+    
+    stored = response.model_dump(mode="json")
+    await db.idempotency_keys.update_one({"key": cache_key}, {"$set": {"response": stored}})
+    idempotency_cache.put(cache_key, {"fingerprint": fingerprint, "response": stored})
+    return response
+
+# ==================== JOB QUEUE ====================
+
+# Side effects that need not finish before the cashier gets a response are
+# recorded in the outbox collection next to the main write and run by
+# in-process workers. A job is claimed by pushing its run_after forward by a
+# lease, so workers in several processes can share one outbox; the poller
+# picks up retries and jobs left behind by a process that died.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '8'))
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', '60'))
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '5'))
+JOB_RETENTION_HOURS = float(os.environ.get('JOB_RETENTION_HOURS', '72'))
+job_handlers = {}
+job_queue = asyncio.Queue()
+queued_jobs = set()
+job_metrics = {"enqueued": 0, "completed": 0, "retried": 0, "failed": 0, "running": 0}
+
+def job_handler(kind: str):
+    def register(handler):
+        job_handlers[kind] = handler
+        return handler
+    return register
+
+async def enqueue_job(kind: str, payload: dict):
+    """Durably record a job; hand it to dispatch_job() once the write it follows is done."""
+    now = datetime.now(timezone.utc).isoformat()
+    job = {
+        "id": str(uuid.uuid4()), "kind": kind, "payload": payload, "status": "pending",
+        "attempts": 0, "run_after": now, "created_at": now
+    }
+    await db.outbox.insert_one(job)
+    job.pop("_id", None)
+    job_metrics["enqueued"] += 1
+    return job
+
+def dispatch_job(job: dict):
+    if job['id'] not in queued_jobs:
+        queued_jobs.add(job['id'])
+        job_queue.put_nowait(job['id'])
+
+async def claim_job(job_id: str):
+    now = datetime.now(timezone.utc)
+    result = await db.outbox.update_one(
+        {"id": job_id, "status": "pending", "run_after": {"$lte": now.isoformat()}},
+        {"$set": {"run_after": (now + timedelta(seconds=JOB_LEASE_SECONDS)).isoformat()}}
+    )
+    if result.matched_count == 0:
+        return None
+    return await db.outbox.find_one({"id": job_id}, {"_id": 0})
+
+async def run_job(job_id: str):
+    job = await claim_job(job_id)
+    if job is None:
+        return
+    attempts = job['attempts'] + 1
+    job_metrics["running"] += 1
+    try:
+        await job_handlers[job['kind']](job['payload'])
+    except Exception as exc:
+        now = datetime.now(timezone.utc)
+        failed = attempts >= JOB_MAX_ATTEMPTS
+        update = {
+            "status": "failed" if failed else "pending",
+            "attempts": attempts,
+            "last_error": repr(exc)[:500],
+            "run_after": (now + timedelta(seconds=min(2 ** attempts, 300))).isoformat()
+        }
+        if failed:
+            update["finished_at"] = now
+        await db.outbox.update_one({"id": job_id}, {"$set": update})
+        job_metrics["failed" if failed else "retried"] += 1
+        logger.warning("Job %s (%s) attempt %d failed: %r", job_id, job['kind'], attempts, exc)
+    else:
+        await db.outbox.update_one({"id": job_id}, {"$set": {
+            "status": "done", "attempts": attempts, "finished_at": datetime.now(timezone.utc)
+        }})
+        job_metrics["completed"] += 1
+    finally:
+        job_metrics["running"] -= 1
+
+async def job_worker():
+    while True:
+        job_id = await job_queue.get()
+        queued_jobs.discard(job_id)
+        try:
+            await run_job(job_id)
+        except Exception:
+            logger.exception("Job %s could not be run", job_id)
+
+async def job_poller():
+    while True:
+        await asyncio.sleep(JOB_POLL_SECONDS)
+        try:
+            due = await db.outbox.find(
+                {"status": "pending", "run_after": {"$lte": datetime.now(timezone.utc).isoformat()}},
+                {"_id": 0, "id": 1}
+            ).sort("run_after", 1).to_list(500)
+            for job in due:
+                dispatch_job(job)
+        except Exception:
+            logger.exception("Outbox poll failed")
+
+@api_router.get("/admin/jobs")
+async def get_job_stats(current_user: User = Depends(get_admin_user)):
+    oldest = await db.outbox.find({"status": "pending"}, {"_id": 0, "created_at": 1}).sort("created_at", 1).to_list(1)
+    return {
+        **job_metrics,
+        "queued": job_queue.qsize(),
+        "backlog": await db.outbox.count_documents({"status": "pending"}),
+        "failed_jobs": await db.outbox.count_documents({"status": "failed"}),
+        "oldest_pending_seconds": (
+            (datetime.now(timezone.utc) - datetime.fromisoformat(oldest[0]['created_at'])).total_seconds()
+            if oldest else 0
+        )
+    }
+
 # ==================== ORDER ROUTES ====================
 
 @api_router.post("/orders", response_model=Order)
-async def create_order(order_input: OrderCreate, current_user: User = Depends(get_current_user)):
+async def create_order(
+    order_input: OrderCreate,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    return await run_idempotent(
+        idempotency_key, "orders", current_user, order_input,
+        lambda: insert_order(order_input, current_user)
+    )
+
+async def insert_order(order_input: OrderCreate, current_user: User):
     # Generate order number
-    order_count = await db.orders.count_documents({})
+    order_count = await reserve_numbers(current_user.outlet_id, "orders")
     order_number = f"ORD-{datetime.now().strftime('%Y%m%d')}-{order_count + 1:04d}"
     
     order_dict = order_input.model_dump()
     order_dict['order_number'] = order_number
     order_dict['status'] = 'pending'
     order_dict['created_by'] = current_user.username
+    order_dict['outlet_id'] = current_user.outlet_id
     
     order_obj = Order(**order_dict)
     doc = order_obj.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     
+    await consume_stock(current_user.outlet_id, order_input.items)
+    try:
+        await db.orders.insert_one(doc)
+    except Exception:
+        # The order never existed, so neither did its sale
+        await release_stock(current_user.outlet_id, order_input.items)
+        raise
+    
     # Update table status if dine-in
     if order_input.table_id:
         await db.tables.update_one(
-            {"id": order_input.table_id},
+            outlet_scope(current_user, {"id": order_input.table_id}),
             {"$set": {"status": "occupied"}}
         )
     
-    await db.orders.insert_one(doc)
     return order_obj
 
 @api_router.get("/orders", response_model=List[Order])
-async def get_orders(status: Optional[str] = None, current_user: User = Depends(get_current_user)):
-    query = {}
+async def get_orders(
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """fields: comma-separated Order fields to return, e.g. fields=order_number,total,status"""
+    selected = parse_fields(fields, Order)
+    query = outlet_scope(current_user)
     if status:
         query['status'] = status
     
-    orders = await db.orders.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
+    orders = await db.orders.find(query, field_projection(selected)).sort("created_at", -1).to_list(1000)
+    if selected:
+        return sparse_response(orders, Order, selected)
     for order in orders:
         if isinstance(order['created_at'], str):
             order['created_at'] = datetime.fromisoformat(order['created_at'])
@@ -411,7 +1449,7 @@ async def get_orders(status: Optional[str] = None, current_user: User = Depends(
 
 @api_router.get("/orders/{order_id}", response_model=Order)
 async def get_order(order_id: str, current_user: User = Depends(get_current_user)):
-    order = await db.orders.find_one({"id": order_id}, {"_id": 0})
+    order = await db.orders.find_one(outlet_scope(current_user, {"id": order_id}), {"_id": 0})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -422,60 +1460,308 @@ async def get_order(order_id: str, current_user: User = Depends(get_current_user
     
     return Order(**order)
 
-@api_router.put("/orders/{order_id}/complete")
-async def complete_order(order_id: str, current_user: User = Depends(get_current_user)):
+# Pending orders are amended in place: lines are $push-ed / $pull-ed and the
+# totals moved by the same amount with $inc in that one update. Line changes
+# read the line first (for its amounts) and make the update conditional on
+# it being unchanged, so a concurrent edit gets a 409 instead of skewed totals.
+
+async def order_line(current_user: User, order_id: str, line_id: str) -> dict:
+    order = await db.orders.find_one(
+        outlet_scope(current_user, {"id": order_id, "status": "pending"}), {"_id": 0, "items": 1}
+    )
+    if not order:
+        raise HTTPException(status_code=404, detail="Pending order not found")
+    line = next((line for line in order['items'] if line.get('line_id') == line_id), None)
+    if not line:
+        raise HTTPException(status_code=404, detail="Order line not found")
+    return line
+
+def totals_delta(subtotal: float, tax_percentage: float) -> dict:
+    tax = subtotal * tax_percentage / 100
+    return {"subtotal": subtotal, "tax": tax, "total": subtotal + tax}
+
+@api_router.post("/orders/{order_id}/items")
+async def add_order_items(order_id: str, items_input: OrderItemsAdd, current_user: User = Depends(get_current_user)):
+    """Add a round of items to a pending order."""
+    settings, _ = await cached_settings(current_user.outlet_id)
+    delta = totals_delta(sum(line.subtotal for line in items_input.items), settings.tax_percentage)
+    await consume_stock(current_user.outlet_id, items_input.items)
+    
+    result = await db.orders.update_one(
+        outlet_scope(current_user, {"id": order_id, "status": "pending"}),
+        {"$push": {"items": {"$each": [line.model_dump() for line in items_input.items]}}, "$inc": delta}
+    )
+    if result.matched_count == 0:
+        await release_stock(current_user.outlet_id, items_input.items)
+        raise HTTPException(status_code=404, detail="Pending order not found")
+    return {"message": "Items added", "line_ids": [line.line_id for line in items_input.items], "totals_change": delta}
+
+@api_router.patch("/orders/{order_id}/items/{line_id}")
+async def update_order_item(
+    order_id: str,
+    line_id: str,
+    item_input: OrderItemUpdate,
+    current_user: User = Depends(get_current_user)
+):
+    """Change the quantity (and notes) of one line of a pending order."""
+    line = await order_line(current_user, order_id, line_id)
+    settings, _ = await cached_settings(current_user.outlet_id)
+    subtotal = line['price'] * item_input.quantity
+    delta = totals_delta(subtotal - line['subtotal'], settings.tax_percentage)
+    change = OrderItem(**{**line, "quantity": abs(item_input.quantity - line['quantity'])})
+    if item_input.quantity > line['quantity']:
+        await consume_stock(current_user.outlet_id, [change])
+    
+    updates = {"items.$.quantity": item_input.quantity, "items.$.subtotal": subtotal}
+    if item_input.notes is not None:
+        updates["items.$.notes"] = item_input.notes
+    result = await db.orders.update_one(
+        outlet_scope(current_user, {
+            "id": order_id, "status": "pending",
+            "items": {"$elemMatch": {"line_id": line_id, "quantity": line['quantity']}}
+        }),
+        {"$set": updates, "$inc": delta}
+    )
+    if result.matched_count == 0:
+        if item_input.quantity > line['quantity']:
+            await release_stock(current_user.outlet_id, [change])
+        raise HTTPException(status_code=409, detail="Order changed while editing, reload and try again")
+    if item_input.quantity < line['quantity']:
+        await release_stock(current_user.outlet_id, [change])
+    return {"message": "Order line updated", "line_id": line_id, "quantity": item_input.quantity, "totals_change": delta}
+
+@api_router.delete("/orders/{order_id}/items/{line_id}")
+async def remove_order_item(order_id: str, line_id: str, current_user: User = Depends(get_current_user)):
+    line = await order_line(current_user, order_id, line_id)
+    settings, _ = await cached_settings(current_user.outlet_id)
+    delta = totals_delta(-line['subtotal'], settings.tax_percentage)
+    
     result = await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc).isoformat()}}
+        outlet_scope(current_user, {
+            "id": order_id, "status": "pending",
+            "items": {"$elemMatch": {"line_id": line_id, "quantity": line['quantity']}}
+        }),
+        {"$pull": {"items": {"line_id": line_id}}, "$inc": delta}
     )
     if result.matched_count == 0:
+        raise HTTPException(status_code=409, detail="Order changed while editing, reload and try again")
+    await release_stock(current_user.outlet_id, [OrderItem(**line)])
+    return {"message": "Order line removed", "line_id": line_id, "totals_change": delta}
+
+def dwell_seconds(opened_at: str, completed_at: str) -> float:
+    """How long an order was open, stored on completion for the table-turnover report."""
+    return max((datetime.fromisoformat(completed_at) - datetime.fromisoformat(opened_at)).total_seconds(), 0)
+
+async def mark_completed(current_user: User, order_id: str):
+    """Complete an order; returns it (created_at only), or None if there is no such order."""
+    order = await db.orders.find_one(outlet_scope(current_user, {"id": order_id}), {"_id": 0, "created_at": 1})
+    if order:
+        completed_at = datetime.now(timezone.utc).isoformat()
+        await db.orders.update_one(
+            outlet_scope(current_user, {"id": order_id}),
+            {"$set": {"status": "completed", "completed_at": completed_at,
+                      "dwell_seconds": dwell_seconds(order['created_at'], completed_at)}}
+        )
+    return order
+
+@api_router.put("/orders/{order_id}/complete")
+async def complete_order(order_id: str, current_user: User = Depends(get_current_user)):
+    order = await mark_completed(current_user, order_id)
+    if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
+    await invalidate_reports(current_user.outlet_id, datetime.fromisoformat(order['created_at']))
+    invalidate_exports(current_user.outlet_id, datetime.fromisoformat(order['created_at']))
     return {"message": "Order completed successfully"}
 
+# ==================== TRANSACTION STORAGE ====================
+
+# TRANSACTIONS_TIMESERIES=true (MongoDB 7.0+) keeps transactions in a
+# time-series collection: `ts`, the created_at instant as a BSON date, is the
+# timeField and `meta` {outlet_id, payment_method, cashier} the metaField.
+# Documents keep their ISO created_at and flat fields, so every query works
+# on both layouts; range queries add a ts condition so only the buckets of
+# the requested period are opened. Existing data is moved over with
+# scripts/migrate_transactions_timeseries.py.
+TRANSACTIONS_TIMESERIES = (
+    STORAGE_BACKEND == 'mongo' and os.environ.get('TRANSACTIONS_TIMESERIES', 'false').lower() == 'true'
+)
+TRANSACTIONS_TIMESERIES_OPTIONS = {
+    "timeField": "ts",
+    "metaField": "meta",
+    "granularity": os.environ.get('TRANSACTIONS_TIMESERIES_GRANULARITY', 'minutes')
+}
+
+def stored_transaction(doc: dict) -> dict:
+    """A transaction document as written to the transactions collection."""
+    if TRANSACTIONS_TIMESERIES:
+        doc['ts'] = datetime.fromisoformat(doc['created_at'])
+        doc['meta'] = {"outlet_id": doc['outlet_id'], "payment_method": doc['payment_method'], "cashier": doc['cashier']}
+    return doc
+
+def transaction_time_filter(created_at: dict) -> dict:
+    """The ts equivalent of a created_at range on ISO strings; empty for the regular layout."""
+    if not TRANSACTIONS_TIMESERIES:
+        return {}
+    return {"ts": {op: datetime.fromisoformat(value) for op, value in created_at.items()}}
+
+# Registered ahead of the other startup hooks: anything touching the
+# collection first would create it as a regular one
+@app.on_event("startup")
+async def ensure_transactions_collection():
+    global TRANSACTIONS_TIMESERIES
+    if not TRANSACTIONS_TIMESERIES:
+        return
+    existing = await db.list_collections(filter={"name": "transactions"}).to_list(1)
+    if not existing:
+        await db.create_collection("transactions", timeseries=TRANSACTIONS_TIMESERIES_OPTIONS)
+    elif existing[0].get("type") != "timeseries":
+        logger.error(
+            "TRANSACTIONS_TIMESERIES is set but transactions is a regular collection; "
+            "run scripts/migrate_transactions_timeseries.py. Using the regular layout until then."
+        )
+        TRANSACTIONS_TIMESERIES = False
+
 # ==================== TRANSACTION ROUTES ====================
 
 @api_router.post("/transactions", response_model=Transaction)
-async def create_transaction(transaction_input: TransactionCreate, current_user: User = Depends(get_current_user)):
+async def create_transaction(
+    transaction_input: TransactionCreate,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    return await run_idempotent(
+        idempotency_key, "transactions", current_user, transaction_input,
+        lambda: insert_transaction(transaction_input, current_user)
+    )
+
+async def insert_transaction(transaction_input: TransactionCreate, current_user: User):
     # Generate transaction number
-    trans_count = await db.transactions.count_documents({})
+    trans_count = await reserve_numbers(current_user.outlet_id, "transactions")
     transaction_number = f"TRX-{datetime.now().strftime('%Y%m%d')}-{trans_count + 1:04d}"
     
     transaction_dict = transaction_input.model_dump()
     transaction_dict['transaction_number'] = transaction_number
     transaction_dict['cashier'] = current_user.full_name
+    transaction_dict['outlet_id'] = current_user.outlet_id
     
     transaction_obj = Transaction(**transaction_dict)
     doc = transaction_obj.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     
     # Complete the order
-    await db.orders.update_one(
-        {"id": transaction_input.order_id},
-        {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc).isoformat()}}
-    )
+    await mark_completed(current_user, transaction_input.order_id)
     
+    # Freeing the table and the rest run after the response, from the outbox
+    job = await enqueue_job("transaction.completed", {
+        "transaction_id": transaction_obj.id,
+        "order_id": transaction_input.order_id,
+        "outlet_id": current_user.outlet_id
+    })
+    await db.transactions.insert_one(stored_transaction(doc))
+    await record_shift_sales(current_user, {transaction_obj.payment_method: transaction_obj.total}, 1)
+    dispatch_job(job)
+    return transaction_obj
+
+@job_handler("transaction.completed")
+async def after_transaction(payload: dict):
+    transaction = await db.transactions.find_one({"id": payload['transaction_id']}, {"_id": 0, "id": 1})
+    if transaction is None:
+        # The job is recorded just before the transaction; retry until it lands
+        raise LookupError(f"Transaction {payload['transaction_id']} not written yet")
+    
+    order = await db.orders.find_one(
+        {"id": payload['order_id'], "outlet_id": payload['outlet_id']}, {"_id": 0, "table_id": 1, "created_at": 1}
+    )
     # Free up table if dine-in
-    order = await db.orders.find_one({"id": transaction_input.order_id}, {"_id": 0})
     if order and order.get('table_id'):
         await db.tables.update_one(
-            {"id": order['table_id']},
+            {"id": order['table_id'], "outlet_id": payload['outlet_id']},
             {"$set": {"status": "available"}}
         )
-    
-    await db.transactions.insert_one(doc)
-    return transaction_obj
+    # Completing an order changes reports from the day it was opened onwards
+    if order:
+        await invalidate_reports(payload['outlet_id'], datetime.fromisoformat(order['created_at']))
+        invalidate_exports(payload['outlet_id'], datetime.fromisoformat(order['created_at']))
+    # Render the receipt now so the printer's request is a cache hit
+    await rendered_receipt(payload['outlet_id'], payload['transaction_id'])
 
 @api_router.get("/transactions", response_model=List[Transaction])
-async def get_transactions(current_user: User = Depends(get_current_user)):
-    transactions = await db.transactions.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
+async def get_transactions(fields: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    """fields: comma-separated Transaction fields to return, e.g. fields=total,payment_method"""
+    selected = parse_fields(fields, Transaction)
+    transactions = await db.transactions.find(
+        outlet_scope(current_user), field_projection(selected)
+    ).sort("created_at", -1).to_list(1000)
+    if selected:
+        return sparse_response(transactions, Transaction, selected)
     for trans in transactions:
         if isinstance(trans['created_at'], str):
             trans['created_at'] = datetime.fromisoformat(trans['created_at'])
     return transactions
 
+@api_router.get("/transactions/history", response_model=TransactionPage)
+async def get_transaction_history(
+    include_order: bool = False,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Paginated transaction history, newest first, in one database round trip.
+    include_order=true embeds each transaction's order via $lookup.
+    start_date / end_date: YYYY-MM-DD (end_date inclusive)
+    """
+    query = outlet_scope(current_user)
+    try:
+        if start_date:
+            query.setdefault('created_at', {})['$gte'] = datetime.fromisoformat(start_date).replace(tzinfo=timezone.utc).isoformat()
+        if end_date:
+            end = datetime.fromisoformat(end_date).replace(tzinfo=timezone.utc) + timedelta(days=1)
+            query.setdefault('created_at', {})['$lt'] = end.isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    if 'created_at' in query:
+        query.update(transaction_time_filter(query['created_at']))
+    
+    # Fetch one extra row to know whether another page exists without a count query
+    pipeline = [
+        {"$match": query},
+        {"$sort": {"created_at": -1}},
+        {"$skip": skip},
+        {"$limit": limit + 1},
+    ]
+    if include_order:
+        pipeline += [
+            {"$lookup": {"from": "orders", "localField": "order_id", "foreignField": "id", "as": "order"}},
+            {"$unwind": {"path": "$order", "preserveNullAndEmptyArrays": True}},
+            {"$project": {"_id": 0, "order._id": 0}},
+        ]
+    else:
+        pipeline.append({"$project": {"_id": 0}})
+    
+    transactions = await db.transactions.aggregate(pipeline).to_list(limit + 1)
+    for trans in transactions:
+        if isinstance(trans['created_at'], str):
+            trans['created_at'] = datetime.fromisoformat(trans['created_at'])
+        order = trans.get('order')
+        if order:
+            if isinstance(order['created_at'], str):
+                order['created_at'] = datetime.fromisoformat(order['created_at'])
+            if order.get('completed_at') and isinstance(order['completed_at'], str):
+                order['completed_at'] = datetime.fromisoformat(order['completed_at'])
+    
+    return TransactionPage(
+        items=transactions[:limit],
+        skip=skip,
+        limit=limit,
+        has_more=len(transactions) > limit
+    )
+
 @api_router.get("/transactions/{transaction_id}", response_model=Transaction)
 async def get_transaction(transaction_id: str, current_user: User = Depends(get_current_user)):
-    transaction = await db.transactions.find_one({"id": transaction_id}, {"_id": 0})
+    transaction = await db.transactions.find_one(outlet_scope(current_user, {"id": transaction_id}), {"_id": 0})
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
@@ -484,92 +1770,1479 @@ async def get_transaction(transaction_id: str, current_user: User = Depends(get_
     
     return Transaction(**transaction)
 
-# ==================== SETTINGS ROUTES ====================
+# ==================== SHIFT ROUTES ====================
 
-@api_router.get("/settings", response_model=Settings)
-async def get_settings():
-    settings = await db.settings.find_one({}, {"_id": 0})
-    if not settings:
-        # Create default settings
-        default_settings = Settings(
-            restaurant_name="Restoran Saya",
-            address="Jl. Contoh No. 123, Jakarta",
-            phone="021-12345678",
-            tax_percentage=10.0
-        )
-        doc = default_settings.model_dump()
-        doc['updated_at'] = doc['updated_at'].isoformat()
-        await db.settings.insert_one(doc)
-        return default_settings
-    
-    if isinstance(settings['updated_at'], str):
-        settings['updated_at'] = datetime.fromisoformat(settings['updated_at'])
-    
-    return Settings(**settings)
+SHIFT_CLOSE_ATTEMPTS = 3
 
-@api_router.put("/settings", response_model=Settings)
-async def update_settings(settings_input: SettingsUpdate, current_user: User = Depends(get_admin_user)):
-    update_data = {k: v for k, v in settings_input.model_dump().items() if v is not None}
-    update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+def shift_key(payment_method: str) -> str:
+    # Payment methods become field names under totals; keep them to safe keys
+    return payment_method if re.fullmatch(r"[a-z0-9_-]+", payment_method) else "other"
+
+async def record_shift_sales(current_user: User, amounts: dict, count: int):
+    """Add sales to the cashier's open shift, if any, in one $inc."""
+    increments = {}
+    for method, amount in amounts.items():
+        key = f"totals.{shift_key(method)}"
+        increments[key] = increments.get(key, 0) + amount
+    increments["transaction_count"] = count
+    await db.shifts.update_one(
+        outlet_scope(current_user, {"username": current_user.username, "status": "open"}),
+        {"$inc": increments}
+    )
+
+def shift_from_doc(doc: dict) -> dict:
+    for field in ("opened_at", "closed_at"):
+        if isinstance(doc.get(field), str):
+            doc[field] = datetime.fromisoformat(doc[field])
+    return doc
+
+def open_shift_query(current_user: User) -> dict:
+    return outlet_scope(current_user, {"username": current_user.username, "status": "open"})
+
+@api_router.post("/shifts/open", response_model=Shift)
+async def open_shift(shift_input: ShiftOpen, current_user: User = Depends(get_current_user)):
+    if await db.shifts.find_one(open_shift_query(current_user), {"_id": 0, "id": 1}):
+        raise HTTPException(status_code=409, detail="A shift is already open for this cashier")
+    
+    shift_obj = Shift(
+        username=current_user.username,
+        cashier=current_user.full_name,
+        opening_cash=shift_input.opening_cash,
+        outlet_id=current_user.outlet_id
+    )
+    doc = shift_obj.model_dump()
+    doc['opened_at'] = doc['opened_at'].isoformat()
+    await db.shifts.insert_one(doc)
+    return shift_obj
+
+@api_router.get("/shifts/current", response_model=Shift)
+async def get_current_shift(current_user: User = Depends(get_current_user)):
+    shift = await db.shifts.find_one(open_shift_query(current_user), {"_id": 0})
+    if not shift:
+        raise HTTPException(status_code=404, detail="No open shift")
+    return shift_from_doc(shift)
+
+@api_router.post("/shifts/close", response_model=Shift)
+async def close_shift(close_input: ShiftClose, current_user: User = Depends(get_current_user)):
+    """
+    Close the cashier's open shift and reconcile the drawer. The running
+    totals are already on the shift document, so this is one read and one
+    write however many transactions the shift had.
+    """
+    for _ in range(SHIFT_CLOSE_ATTEMPTS):
+        shift = await db.shifts.find_one(open_shift_query(current_user), {"_id": 0})
+        if not shift:
+            raise HTTPException(status_code=404, detail="No open shift")
+        
+        expected_cash = shift['opening_cash'] + shift.get('totals', {}).get('cash', 0)
+        update = {
+            "status": "closed",
+            "closed_at": datetime.now(timezone.utc).isoformat(),
+            "expected_cash": expected_cash,
+            "counted_cash": close_input.counted_cash,
+            "cash_difference": close_input.counted_cash - expected_cash,
+            "note": close_input.note
+        }
+        # A sale landing between the read and the write would be missing from
+        # expected_cash; only close if the count is still what we read
+        result = await db.shifts.update_one(
+            {"id": shift['id'], "status": "open", "transaction_count": shift['transaction_count']},
+            {"$set": update}
+        )
+        if result.matched_count:
+            return shift_from_doc({**shift, **update})
+    raise HTTPException(status_code=409, detail="Shift is still taking payments, try again")
+
+@api_router.get("/shifts", response_model=List[Shift])
+async def get_shifts(
+    cashier: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(get_current_user)
+):
+    """Admins see every shift in the outlet (cashier: username filter); cashiers see their own."""
+    query = outlet_scope(current_user)
+    if current_user.role != "admin":
+        query['username'] = current_user.username
+    elif cashier:
+        query['username'] = cashier
+    if status:
+        query['status'] = status
+    
+    shifts = await db.shifts.find(query, {"_id": 0}).sort("opened_at", -1).to_list(limit)
+    return [shift_from_doc(shift) for shift in shifts]
+
+@api_router.get("/shifts/{shift_id}", response_model=ShiftReport)
+async def get_shift_report(
+    shift_id: str,
+    include_transactions: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """include_transactions=true lists the shift's transactions for an audit."""
+    query = outlet_scope(current_user, {"id": shift_id})
+    if current_user.role != "admin":
+        query['username'] = current_user.username
+    shift = await db.shifts.find_one(query, {"_id": 0})
+    if not shift:
+        raise HTTPException(status_code=404, detail="Shift not found")
+    
+    if include_transactions:
+        window = {"$gte": shift['opened_at']}
+        if shift.get('closed_at'):
+            window["$lte"] = shift['closed_at']
+        transactions = await db.transactions.find(
+            outlet_scope(current_user, {"cashier": shift['cashier'], "created_at": window, **transaction_time_filter(window)}),
+            {"_id": 0}
+        ).sort("created_at", 1).to_list(None)
+        for trans in transactions:
+            if isinstance(trans['created_at'], str):
+                trans['created_at'] = datetime.fromisoformat(trans['created_at'])
+        shift['transactions'] = transactions
+    return shift_from_doc(shift)
+
+# ==================== SYNC ROUTES ====================
+
+async def write_unique(collection, ops):
+    """Unordered bulk_write of (entry index, op) pairs; returns the entries a unique index rejected."""
+    if not ops:
+        return set()
+    try:
+        await collection.bulk_write([op for _, op in ops], ordered=False)
+    except BulkWriteError as exc:
+        errors = exc.details['writeErrors']
+        if any(error['code'] != 11000 for error in errors):
+            raise
+        return {ops[error['index']][0] for error in errors}
+    return set()
+
+@api_router.post("/sync/batch", response_model=SyncResult)
+async def sync_batch(batch: SyncBatch, current_user: User = Depends(get_current_user)):
+    """
+    Apply orders and payments queued by a terminal while it was offline.
+    Entries are keyed by their terminal-generated ids, so re-sending a batch
+    is safe: already-applied entries come back as "duplicate". A resend that
+    races the original loses the payment claim in synced_payments (or the
+    order insert) and writes nothing. Numbers are assigned in created_at
+    order and tables are reconciled once at the end.
+    """
+    entries = batch.entries
+    order_ids = [e.order.id for e in entries if e.order]
+    payment_order_ids = [e.payment.order_id for e in entries if e.payment and not e.order and e.payment.order_id]
+    payment_ids = [e.payment.id for e in entries if e.payment]
+    
+    existing_orders = {
+        o['id']: o for o in await db.orders.find(
+            outlet_scope(current_user, {"id": {"$in": order_ids + payment_order_ids}}),
+            {"_id": 0, "id": 1, "order_number": 1, "status": 1, "table_id": 1, "created_at": 1}
+        ).to_list(len(order_ids) + len(payment_order_ids))
+    }
+    known_payments = await db.transactions.find(
+        outlet_scope(current_user, {"$or": [{"id": {"$in": payment_ids}}, {"order_id": {"$in": payment_order_ids}}]}),
+        {"_id": 0, "id": 1, "transaction_number": 1, "order_id": 1}
+    ).to_list(None)
+    existing_transactions = {t['id']: t for t in known_payments}
+    # An order already paid online may reach us again from the offline queue
+    paid_orders = {t['order_id']: t for t in known_payments}
+    
+    # Numbers for every entry that may be applied; skipped ones leave gaps
+    order_count = await reserve_numbers(
+        current_user.outlet_id, "orders", sum(1 for e in entries if e.order and e.order.id not in existing_orders)
+    )
+    trans_count = await reserve_numbers(
+        current_user.outlet_id, "transactions",
+        sum(1 for e in entries if e.payment and e.payment.id not in existing_transactions)
+    )
     
-    await db.settings.update_one({}, {"$set": update_data}, upsert=True)
+    results = [None] * len(entries)
+    order_ops, transaction_ops = [], []
+    touched_tables = set()
+    paid_since = first_payment = None
+    
+    def entry_time(index):
+        first = entries[index].order or entries[index].payment
+        return first.created_at.astimezone(timezone.utc) if first else datetime.min.replace(tzinfo=timezone.utc)
+    
+    # Assign numbers in the order things happened on the terminal
+    for index in sorted(range(len(entries)), key=entry_time):
+        entry = entries[index]
+        order, payment = entry.order, entry.payment
+        if not order and not payment:
+            results[index] = SyncEntryResult(status="error", detail="Entry has neither order nor payment")
+            continue
+        
+        order_id = order.id if order else payment.order_id
+        if payment and payment.id in existing_transactions:
+            known = existing_transactions[payment.id]
+            results[index] = SyncEntryResult(
+                status="duplicate",
+                order_id=known['order_id'],
+                order_number=existing_orders.get(known['order_id'], {}).get('order_number'),
+                transaction_id=known['id'],
+                transaction_number=known['transaction_number']
+            )
+            continue
+        if order and order.id in existing_orders and not payment:
+            results[index] = SyncEntryResult(
+                status="duplicate", order_id=order.id, order_number=existing_orders[order.id]['order_number']
+            )
+            continue
+        
+        result = SyncEntryResult(status="applied", order_id=order_id)
+        if order and order.id not in existing_orders:
+            order_count += 1
+            created_at = order.created_at.astimezone(timezone.utc)
+            order_obj = Order(
+                **order.model_dump(exclude={"created_at"}),
+                order_number=f"ORD-{created_at.strftime('%Y%m%d')}-{order_count:04d}",
+                status="completed" if payment else "pending",
+                created_by=current_user.username,
+                outlet_id=current_user.outlet_id,
+                created_at=created_at,
+                completed_at=payment.created_at.astimezone(timezone.utc) if payment else None
+            )
+            doc = order_obj.model_dump()
+            doc['created_at'] = doc['created_at'].isoformat()
+            if doc['completed_at']:
+                doc['completed_at'] = doc['completed_at'].isoformat()
+                doc['dwell_seconds'] = dwell_seconds(doc['created_at'], doc['completed_at'])
+            order_ops.append((index, InsertOne(doc)))
+            existing_orders[order.id] = {"id": order.id, "order_number": order_obj.order_number,
+                                         "status": order_obj.status, "table_id": order.table_id,
+                                         "created_at": doc['created_at']}
+            result.order_number = order_obj.order_number
+            if order.table_id:
+                touched_tables.add(order.table_id)
+        else:
+            known = existing_orders.get(order_id)
+            if not known:
+                results[index] = SyncEntryResult(status="error", order_id=order_id, detail="Order not found")
+                continue
+            result.order_number = known['order_number']
+            if payment and known['status'] != "pending":
+                paid = paid_orders.get(order_id)
+                if paid:
+                    results[index] = SyncEntryResult(
+                        status="duplicate", order_id=order_id, order_number=known['order_number'],
+                        transaction_id=paid['id'], transaction_number=paid['transaction_number']
+                    )
+                else:
+                    results[index] = SyncEntryResult(
+                        status="error", order_id=order_id, order_number=known['order_number'],
+                        detail=f"Order is already {known['status']}"
+                    )
+                continue
+            if payment:
+                known['status'] = "completed"
+                completed_at = payment.created_at.astimezone(timezone.utc).isoformat()
+                order_ops.append((index, UpdateOne(
+                    outlet_scope(current_user, {"id": order_id, "status": "pending"}),
+                    {"$set": {"status": "completed", "completed_at": completed_at,
+                              "dwell_seconds": dwell_seconds(known['created_at'], completed_at)}}
+                )))
+                if known.get('table_id'):
+                    touched_tables.add(known['table_id'])
+        
+        if payment:
+            opened_at = datetime.fromisoformat(existing_orders[order_id]['created_at'])
+            paid_since = min(paid_since or opened_at, opened_at)
+            trans_count += 1
+            created_at = payment.created_at.astimezone(timezone.utc)
+            first_payment = min(first_payment or created_at, created_at)
+            transaction_obj = Transaction(
+                **payment.model_dump(exclude={"order_id", "created_at"}),
+                transaction_number=f"TRX-{created_at.strftime('%Y%m%d')}-{trans_count:04d}",
+                order_id=order_id,
+                cashier=current_user.full_name,
+                outlet_id=current_user.outlet_id,
+                created_at=created_at
+            )
+            doc = transaction_obj.model_dump()
+            doc['created_at'] = doc['created_at'].isoformat()
+            transaction_ops.append((index, InsertOne(stored_transaction(doc))))
+            existing_transactions[payment.id] = paid_orders[order_id] = {
+                "id": payment.id, "order_id": order_id, "transaction_number": transaction_obj.transaction_number
+            }
+            result.transaction_id = payment.id
+            result.transaction_number = transaction_obj.transaction_number
+        
+        results[index] = result
+    
+    # Claim every payment before writing anything; a concurrent resend of the
+    # same batch finds the claims taken and reports those entries as duplicates
+    claims = [
+        (index, InsertOne({"outlet_id": current_user.outlet_id, "id": entries[index].payment.id,
+                           "created_at": datetime.now(timezone.utc)}))
+        for index, _ in transaction_ops
+    ]
+    lost = await write_unique(db.synced_payments, claims)
+    claimed = [entries[index].payment.id for index, _ in claims if index not in lost]
+    
+    def duplicate(index):
+        results[index] = SyncEntryResult(status="duplicate", order_id=results[index].order_id,
+                                         transaction_id=results[index].transaction_id)
+    
+    for index in lost:
+        duplicate(index)
+    try:
+        # Orders are unique per outlet: an order the racing request inserted first is not ours
+        for index in await write_unique(db.orders, [(i, op) for i, op in order_ops if i not in lost]):
+            lost.add(index)
+            if entries[index].payment:
+                # Its payment is not applied; free the claim so the terminal can send it again
+                await db.synced_payments.delete_one({"outlet_id": current_user.outlet_id, "id": entries[index].payment.id})
+                results[index] = SyncEntryResult(status="error", order_id=results[index].order_id,
+                                                 detail="Order is being synced by another request")
+            else:
+                duplicate(index)
+        for index in await write_unique(db.transactions, [(i, op) for i, op in transaction_ops if i not in lost]):
+            lost.add(index)
+            duplicate(index)
+    except Exception:
+        await db.synced_payments.delete_many({"outlet_id": current_user.outlet_id, "id": {"$in": claimed}})
+        raise
+    
+    sold_items = [item for index, op in order_ops if index not in lost and isinstance(op, InsertOne)
+                  for item in entries[index].order.items]
+    if sold_items:
+        # Sold while offline: always applied, even past zero
+        await consume_stock(current_user.outlet_id, sold_items, strict=False)
+    paid = [entries[index].payment for index, _ in transaction_ops if index not in lost]
+    if paid:
+        shift_totals = {}
+        for payment in paid:
+            shift_totals[payment.payment_method] = shift_totals.get(payment.payment_method, 0) + payment.total
+        await record_shift_sales(current_user, shift_totals, len(paid))
+    if paid_since:
+        # Offline payments can land in periods that were already closed
+        await invalidate_reports(current_user.outlet_id, paid_since)
+        invalidate_analytics(current_user.outlet_id, first_payment)
+    changed = [entry_time(i) for i, r in enumerate(results) if r.status == "applied"] + [paid_since] * bool(paid_since)
+    if changed:
+        # Orders and payments taken offline can land in days already exported
+        invalidate_exports(current_user.outlet_id, min(changed))
+    
+    # A touched table stays occupied only if it still has a pending order
+    if touched_tables:
+        pending = await db.orders.find(
+            outlet_scope(current_user, {"table_id": {"$in": list(touched_tables)}, "status": "pending"}),
+            {"_id": 0, "table_id": 1}
+        ).to_list(None)
+        occupied = {o['table_id'] for o in pending}
+        await db.tables.bulk_write([
+            UpdateOne(outlet_scope(current_user, {"id": table_id}), {"$set": {"status": "occupied" if table_id in occupied else "available"}})
+            for table_id in touched_tables
+        ], ordered=False)
+    
+    return SyncResult(
+        applied=sum(1 for r in results if r.status == "applied"),
+        duplicates=sum(1 for r in results if r.status == "duplicate"),
+        errors=sum(1 for r in results if r.status == "error"),
+        results=results
+    )
+
+# ==================== SETTINGS ROUTES ====================
+
+@api_router.get("/settings", response_model=Settings)
+async def get_settings(outlet_id: str = Depends(get_request_outlet)):
+    settings = await db.settings.find_one({"outlet_id": outlet_id}, {"_id": 0})
+    if not settings:
+        # Nothing is stored until an admin saves; the first PUT writes these defaults
+        return default_settings(outlet_id)
     
-    settings = await db.settings.find_one({}, {"_id": 0})
     if isinstance(settings['updated_at'], str):
         settings['updated_at'] = datetime.fromisoformat(settings['updated_at'])
     
     return Settings(**settings)
 
-# ==================== DASHBOARD/REPORTS ROUTES ====================
+def default_settings(outlet_id: str):
+    return Settings(
+        restaurant_name="Restoran Saya",
+        address="Jl. Contoh No. 123, Jakarta",
+        phone="021-12345678",
+        tax_percentage=10.0,
+        outlet_id=outlet_id
+    )
 
-@api_router.get("/dashboard/stats")
-async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
-    # Get today's date range
+@api_router.put("/settings", response_model=Settings)
+async def update_settings(settings_input: SettingsUpdate, current_user: User = Depends(get_admin_user)):
+    update_data = {k: v for k, v in settings_input.model_dump(exclude={"version"}).items() if v is not None}
+    update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+    defaults = default_settings(current_user.outlet_id).model_dump(mode="json", exclude={"version", "outlet_id"})
+    
+    # The first save creates the document from the defaults the admin was shown
+    # (version 1). Without a version this is a blind write. Against an existing
+    # document with another version the upsert hits the unique outlet index.
+    expected = settings_input.version
+    try:
+        settings = await db.settings.find_one_and_update(
+            versioned(outlet_scope(current_user), expected),
+            {"$set": update_data, "$inc": {"version": 1},
+             "$setOnInsert": {k: v for k, v in defaults.items() if k not in update_data}},
+            projection={"_id": 0},
+            upsert=expected in (None, 1),
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        settings = None
+    if settings is None:
+        raise HTTPException(status_code=409, detail="Settings were changed by someone else, reload and try again")
+    if isinstance(settings['updated_at'], str):
+        settings['updated_at'] = datetime.fromisoformat(settings['updated_at'])
+    
+    return cache_settings(Settings(**settings))
+
+# In-process copy of each outlet's settings document. Other workers pick up
+# changes after SETTINGS_CACHE_SECONDS.
+SETTINGS_CACHE_SECONDS = float(os.environ.get('SETTINGS_CACHE_SECONDS', '30'))
+settings_cache = {}
+
+def settings_version(settings: Settings):
+    # Unsaved defaults get a fresh id and timestamp on every read
+    payload = json.dumps(settings.model_dump(mode="json", exclude={"id", "updated_at"}), sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+def cache_settings(settings: Settings):
+    settings_cache[settings.outlet_id] = {
+        "settings": settings, "version": settings_version(settings), "loaded_at": time.monotonic()
+    }
+    return settings
+
+async def cached_settings(outlet_id: str):
+    entry = settings_cache.get(outlet_id)
+    if entry is None or time.monotonic() - entry["loaded_at"] > SETTINGS_CACHE_SECONDS:
+        cache_settings(await get_settings(outlet_id))
+        entry = settings_cache[outlet_id]
+    return entry["settings"], entry["version"]
+
+# ==================== RECEIPT ROUTES ====================
+
+RECEIPT_TIMEZONE = ZoneInfo(os.environ.get('RECEIPT_TIMEZONE', 'Asia/Jakarta'))
+RECEIPT_WIDTH = 32
+RECEIPT_SEPARATOR = '-' * RECEIPT_WIDTH
+ESC = b'\x1b'
+GS = b'\x1d'
+
+# Rendered receipts keyed by sha256(transaction id + settings version). A
+# transaction never changes once written, so entries only go stale when the
+# settings change, which changes the key.
+receipt_cache = LRUCache(int(os.environ.get('RECEIPT_CACHE_SIZE', '512')))
+
+def format_rupiah(amount: float):
+    if float(amount).is_integer():
+        return f"Rp {int(amount):,}".replace(',', '.')
+    whole, fraction = f"{amount:,.2f}".split('.')
+    return f"Rp {whole.replace(',', '.')},{fraction}"
+
+def receipt_lines(transaction: dict, order: dict, settings: Settings):
+    """Receipt layout as (align, double_size, text) tuples."""
+    created_at = transaction['created_at']
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    local_time = created_at.astimezone(RECEIPT_TIMEZONE).strftime('%d/%m/%Y %H.%M.%S')
+    
+    lines = [
+        ("center", True, settings.restaurant_name),
+        ("center", False, settings.address),
+        ("center", False, settings.phone),
+        ("center", False, RECEIPT_SEPARATOR),
+        ("left", False, f"No. Transaksi: {transaction['transaction_number']}"),
+        ("left", False, f"Tanggal: {local_time}"),
+        ("left", False, f"Kasir: {transaction['cashier']}"),
+    ]
+    if order.get('table_number'):
+        lines.append(("left", False, f"Meja: {order['table_number']}"))
+    lines.append(("left", False, f"Tipe: {'Dine In' if order['order_type'] == 'dine-in' else 'Takeaway'}"))
+    lines.append(("left", False, RECEIPT_SEPARATOR))
+    
+    for item in order['items']:
+        lines.append(("left", False, item['menu_item_name']))
+        lines.append(("left", False, f"  {item['quantity']} x {format_rupiah(item['price'])} = {format_rupiah(item['subtotal'])}"))
+    
+    lines += [
+        ("left", False, RECEIPT_SEPARATOR),
+        ("left", False, f"Subtotal: {format_rupiah(order['subtotal'])}"),
+        ("left", False, f"Pajak ({settings.tax_percentage:g}%): {format_rupiah(order['tax'])}"),
+        ("left", True, f"TOTAL: {format_rupiah(order['total'])}"),
+        ("left", False, RECEIPT_SEPARATOR),
+        ("left", False, f"Bayar: {format_rupiah(transaction['amount_paid'])}"),
+        ("left", False, f"Kembali: {format_rupiah(transaction['change_amount'])}"),
+        ("left", False, f"Metode: {transaction['payment_method'].upper()}"),
+        ("left", False, RECEIPT_SEPARATOR),
+        ("center", False, "Terima Kasih"),
+        ("center", False, "Atas Kunjungan Anda"),
+    ]
+    return lines
+
+def render_receipt_text(lines):
+    return "\n".join(text.center(RECEIPT_WIDTH).rstrip() if align == "center" else text for align, _, text in lines) + "\n"
+
+def render_receipt_escpos(lines):
+    out = bytearray(ESC + b'@')
+    align, double = None, False
+    for line_align, line_double, text in lines:
+        if line_align != align:
+            out += ESC + b'a' + (b'\x01' if line_align == "center" else b'\x00')
+            align = line_align
+        if line_double != double:
+            out += GS + b'!' + (b'\x11' if line_double else b'\x00')
+            double = line_double
+        out += text.encode('utf-8') + b'\n'
+    if double:
+        out += GS + b'!' + b'\x00'
+    out += b'\n\n\n' + GS + b'V' + b'\x41' + b'\x03'
+    return bytes(out)
+
+async def receipt_key(outlet_id: str, transaction_id: str):
+    _, version = await cached_settings(outlet_id)
+    return hashlib.sha256(f"{outlet_id}:{transaction_id}:{version}".encode()).hexdigest()
+
+async def rendered_receipt(outlet_id: str, transaction_id: str):
+    """Text and ESC/POS renderings of a receipt, from receipt_cache when possible."""
+    key = await receipt_key(outlet_id, transaction_id)
+    receipt = receipt_cache.get(key)
+    if receipt is None:
+        settings, _ = await cached_settings(outlet_id)
+        rows = await db.transactions.aggregate([
+            {"$match": {"id": transaction_id, "outlet_id": outlet_id}},
+            {"$limit": 1},
+            {"$lookup": {"from": "orders", "localField": "order_id", "foreignField": "id", "as": "order"}},
+            {"$project": {"_id": 0, "order._id": 0}},
+        ]).to_list(1)
+        if not rows:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        if not rows[0]['order']:
+            raise HTTPException(status_code=404, detail="Order not found")
+        
+        lines = receipt_lines(rows[0], rows[0]['order'][0], settings)
+        receipt = {"text": render_receipt_text(lines), "escpos": render_receipt_escpos(lines)}
+        receipt_cache.put(key, receipt)
+    return receipt
+
+@api_router.get("/transactions/{transaction_id}/receipt")
+async def get_receipt(
+    transaction_id: str,
+    output: str = Query("text", alias="format", pattern="^(text|escpos)$"),
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Receipt for a transaction rendered with the current settings.
+    format: text (plain text) or escpos (raw ESC/POS printer bytes)
+    """
+    key = await receipt_key(current_user.outlet_id, transaction_id)
+    etag = f'"{key[:32]}-{output}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    receipt = await rendered_receipt(current_user.outlet_id, transaction_id)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if output == "escpos":
+        return Response(content=receipt['escpos'], media_type="application/octet-stream", headers=headers)
+    return PlainTextResponse(receipt['text'], headers=headers)
+
+# ==================== ARCHIVAL ====================
+
+# Orders and transactions older than ARCHIVE_AFTER_MONTHS full months are moved
+# into monthly archive collections (e.g. transactions_archive_2024_05) so the
+# hot collections and their indexes stay small.
+ARCHIVE_AFTER_MONTHS = int(os.environ.get('ARCHIVE_AFTER_MONTHS', '13'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+ARCHIVE_INTERVAL_HOURS = float(os.environ.get('ARCHIVE_INTERVAL_HOURS', '24'))
+ARCHIVED_COLLECTIONS = ("orders", "transactions")
+ARCHIVE_INDEX_TTL_SECONDS = float(os.environ.get('ARCHIVE_INDEX_TTL_SECONDS', '10'))
+
+# Archived months per collection ("YYYY-MM" -> document count), mirrored from
+# db.archive_months so report queries can pick archives without a round trip.
+# Any worker may archive, so the routes that read archives (reports, dashboard,
+# export) re-read it once it is older than ARCHIVE_INDEX_TTL_SECONDS
+# (fresh_archive_index).
+archive_index = {name: {} for name in ARCHIVED_COLLECTIONS}
+archive_index_loaded_at = None
+
+def archive_collection_name(base: str, month_key: str):
+    return f"{base}_archive_{month_key.replace('-', '_')}"
+
+def archive_cutoff(now: Optional[datetime] = None):
+    now = now or datetime.now(timezone.utc)
+    year, month = now.year, now.month - ARCHIVE_AFTER_MONTHS
+    while month < 1:
+        month += 12
+        year -= 1
+    return datetime(year, month, 1, tzinfo=timezone.utc)
+
+async def archived_count(base: str, outlet_id: str):
+    """An outlet's documents moved out of `base` into the archive collections."""
+    await fresh_archive_index()
+    total = 0
+    for month_key in archive_index[base]:
+        total += await db[archive_collection_name(base, month_key)].count_documents({"outlet_id": outlet_id})
+    return total
+
+async def reserve_numbers(outlet_id: str, base: str, count: int = 1):
+    """
+    Reserve `count` consecutive order/transaction numbers in an outlet with
+    one $inc on its counter; returns the number before the first one.
+    """
+    if count == 0:
+        return 0
+    key = {"outlet_id": outlet_id, "name": base}
+    counter = await db.counters.find_one_and_update(
+        key, {"$inc": {"seq": count}}, projection={"_id": 0, "seq": 1}, return_document=ReturnDocument.AFTER
+    )
+    if counter is None:
+        # First number since counters were introduced: carry on from what the outlet has
+        seq = await db[base].count_documents({"outlet_id": outlet_id}) + await archived_count(base, outlet_id)
+        try:
+            await db.counters.insert_one({**key, "seq": seq})
+        except DuplicateKeyError:
+            pass  # seeded by a concurrent request
+        return await reserve_numbers(outlet_id, base, count)
+    return counter['seq'] - count
+
+def archives_between(base: str, start: datetime, end: datetime):
+    names = []
+    for month_key in sorted(archive_index[base]):
+        year, month = map(int, month_key.split('-'))
+        archive_start = datetime(year, month, 1, tzinfo=timezone.utc)
+        archive_end = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+        if archive_start < end and archive_end > start:
+            names.append(archive_collection_name(base, month_key))
+    return names
+
+def with_archives(base: str, match: dict, start: datetime, end: datetime, fields: Optional[tuple] = None):
+    """
+    Pipeline prefix that reads `base` plus every archive collection
+    overlapping [start, end), all filtered by `match` and, if given,
+    projected down to `fields`.
+    """
+    branch = [{"$match": match}]
+    if fields:
+        branch.append({"$project": field_projection(fields)})
+    stages = list(branch)
+    for name in archives_between(base, start, end):
+        stages.append({"$unionWith": {"coll": name, "pipeline": branch}})
+    return stages
+
+async def load_archive_index():
+    global archive_index_loaded_at
+    months = {name: {} for name in ARCHIVED_COLLECTIONS}
+    for entry in await db.archive_months.find({}, {"_id": 0}).to_list(10000):
+        months[entry['collection']][entry['month']] = entry['count']
+    archive_index.update(months)
+    archive_index_loaded_at = time.monotonic()
+
+async def fresh_archive_index():
+    """Reload the archive index when it is older than ARCHIVE_INDEX_TTL_SECONDS."""
+    if archive_index_loaded_at is None or time.monotonic() - archive_index_loaded_at >= ARCHIVE_INDEX_TTL_SECONDS:
+        await load_archive_index()
+
+async def archive_collection(base: str, cutoff: datetime):
+    query = {"created_at": {"$lt": cutoff.isoformat()}}
+    if base == "orders":
+        # Never archive an order that can still be paid
+        query["status"] = {"$ne": "pending"}
+    
+    moved = 0
+    while True:
+        batch = await db[base].find(query, {"_id": 0}).sort("created_at", 1).to_list(ARCHIVE_BATCH_SIZE)
+        if not batch:
+            break
+        
+        by_month = {}
+        for doc in batch:
+            by_month.setdefault(doc['created_at'][:7], []).append(doc)
+        
+        for month_key, docs in by_month.items():
+            ids = [d['id'] for d in docs]
+            archive = db[archive_collection_name(base, month_key)]
+            if month_key not in archive_index[base]:
+                await archive.create_index("id")
+                await archive.create_index("created_at")
+            # Delete first so a batch interrupted between copy and delete can be re-run
+            await archive.delete_many({"id": {"$in": ids}})
+            await archive.insert_many(docs)
+            await db[base].delete_many({"id": {"$in": ids}})
+            
+            count = await archive.count_documents({})
+            await db.archive_months.update_one(
+                {"collection": base, "month": month_key},
+                {"$set": {"count": count}},
+                upsert=True
+            )
+            archive_index[base][month_key] = count
+        moved += len(batch)
+    return moved
+
+async def run_archival():
+    cutoff = archive_cutoff()
+    result = {"cutoff": cutoff.isoformat()}
+    for base in ARCHIVED_COLLECTIONS:
+        result[base] = await archive_collection(base, cutoff)
+    logger.info(f"Archival finished: {result}")
+    return result
+
+async def archival_loop():
+    while True:
+        try:
+            await run_archival()
+        except Exception:
+            logger.exception("Archival run failed")
+        await asyncio.sleep(ARCHIVE_INTERVAL_HOURS * 3600)
+
+@api_router.post("/admin/archive")
+async def trigger_archival(current_user: User = Depends(get_admin_user)):
+    return await run_archival()
+
+# ==================== PARQUET EXPORT ====================
+
+# Closed days of orders, order items and transactions are written under
+# EXPORT_DIR as Hive-partitioned Parquet for pandas/DuckDB, one file per
+# dataset, outlet and day:
+#   <dataset>/outlet_id=<outlet>/date=<YYYY-MM-DD>/part-0.parquet
+# A run only writes days that have rows but no files yet, streaming each day
+# from a cursor EXPORT_BATCH_SIZE rows at a time. Writes that change a closed
+# day (offline syncs, late completions) remove its files so the next run
+# redoes it.
+EXPORT_DIR = Path(os.environ.get('EXPORT_DIR', str(ROOT_DIR / 'exports')))
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '5000'))
+EXPORT_INTERVAL_HOURS = float(os.environ.get('EXPORT_INTERVAL_HOURS', '24'))
+EXPORT_DATASETS = ("orders", "order_items", "transactions")
+
+if pa is not None:
+    _timestamp = pa.timestamp("us", tz="UTC")
+    EXPORT_SCHEMAS = {
+        "orders": pa.schema([
+            ("id", pa.string()), ("order_number", pa.string()), ("order_type", pa.string()),
+            ("table_id", pa.string()), ("table_number", pa.string()), ("status", pa.string()),
+            ("item_count", pa.int64()), ("subtotal", pa.float64()), ("tax", pa.float64()), ("total", pa.float64()),
+            ("created_by", pa.string()), ("created_at", _timestamp), ("completed_at", _timestamp),
+        ]),
+        "order_items": pa.schema([
+            ("order_id", pa.string()), ("line_id", pa.string()), ("menu_item_id", pa.string()),
+            ("menu_item_name", pa.string()), ("quantity", pa.int64()), ("price", pa.float64()),
+            ("subtotal", pa.float64()), ("notes", pa.string()), ("created_at", _timestamp),
+        ]),
+        "transactions": pa.schema([
+            ("id", pa.string()), ("transaction_number", pa.string()), ("order_id", pa.string()),
+            ("payment_method", pa.string()), ("amount_paid", pa.float64()), ("change_amount", pa.float64()),
+            ("total", pa.float64()), ("cashier", pa.string()), ("created_at", _timestamp),
+        ]),
+    }
+
+def as_datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def export_rows(dataset: str, doc: dict) -> list:
+    if dataset == "orders":
+        return [{
+            **{field: doc.get(field) for field in EXPORT_SCHEMAS["orders"].names},
+            "item_count": sum(line['quantity'] for line in doc.get('items', [])),
+            "created_at": as_datetime(doc['created_at']),
+            "completed_at": as_datetime(doc.get('completed_at')),
+        }]
+    if dataset == "order_items":
+        created_at = as_datetime(doc['created_at'])
+        return [
+            {**{field: line.get(field) for field in EXPORT_SCHEMAS["order_items"].names},
+             "order_id": doc['id'], "created_at": created_at}
+            for line in doc.get('items', [])
+        ]
+    return [{**{field: doc.get(field) for field in EXPORT_SCHEMAS["transactions"].names},
+             "created_at": as_datetime(doc['created_at'])}]
+
+def export_path(dataset: str, outlet_id: str, day: datetime) -> Path:
+    return EXPORT_DIR / dataset / f"outlet_id={outlet_id}" / f"date={day:%Y-%m-%d}" / "part-0.parquet"
+
+class ParquetDayWriter:
+    """Writes one day's file through a temporary name so readers never see a partial file."""
+    
+    def __init__(self, dataset: str, outlet_id: str, day: datetime):
+        self.dataset = dataset
+        self.path = export_path(dataset, outlet_id, day)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp = self.path.with_name(f".{self.path.name}.{uuid.uuid4().hex}.tmp")
+        self.writer = pq.ParquetWriter(self.tmp, EXPORT_SCHEMAS[dataset], compression="zstd")
+        self.rows = []
+    
+    async def add(self, rows: list):
+        self.rows.extend(rows)
+        if len(self.rows) >= EXPORT_BATCH_SIZE:
+            await self.flush()
+    
+    async def flush(self):
+        if self.rows:
+            table = pa.Table.from_pylist(self.rows, schema=EXPORT_SCHEMAS[self.dataset])
+            self.rows = []
+            await asyncio.to_thread(self.writer.write_table, table)
+    
+    async def close(self):
+        await self.flush()
+        await asyncio.to_thread(self.writer.close)
+        os.replace(self.tmp, self.path)
+    
+    def abort(self):
+        self.writer.close()
+        self.tmp.unlink(missing_ok=True)
+
+async def export_day(outlet_id: str, day: datetime):
+    end = day + timedelta(days=1)
+    match = {"outlet_id": outlet_id, "created_at": {"$gte": day.isoformat(), "$lt": end.isoformat()}}
+    sources = (
+        (reports_db.orders, with_archives("orders", match, day, end), ("orders", "order_items")),
+        (reports_db.transactions, transactions_between(outlet_id, day, end, fields=None), ("transactions",)),
+    )
+    for collection, pipeline, datasets in sources:
+        writers = [ParquetDayWriter(dataset, outlet_id, day) for dataset in datasets]
+        try:
+            async for doc in collection.aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE):
+                for writer in writers:
+                    await writer.add(export_rows(writer.dataset, doc))
+            for writer in writers:
+                await writer.close()
+        except BaseException:
+            for writer in writers:
+                writer.abort()
+            raise
+
+async def days_with_rows(outlet_id: str, before: datetime) -> list:
+    """UTC days before `before` with at least one order or transaction, archives included."""
+    match = {"outlet_id": outlet_id, "created_at": {"$lt": before.isoformat()}}
+    by_day = {"$group": {"_id": {"$substr": ["$created_at", 0, 10]}}}
+    days = set()
+    for collection, pipeline in (
+        (reports_db.orders, with_archives("orders", match, EPOCH, before, ("created_at",))),
+        (reports_db.transactions, transactions_between(outlet_id, EPOCH, before, ("created_at",))),
+    ):
+        days.update(row['_id'] for row in await collection.aggregate([*pipeline, by_day]).to_list(None))
+    return [datetime.fromisoformat(day).replace(tzinfo=timezone.utc) for day in sorted(days)]
+
+async def run_export(outlet_id: Optional[str] = None):
+    """Write every closed day (UTC) that has rows but no export yet; returns the days written per outlet."""
+    if outlet_id:
+        outlets = [outlet_id]
+    else:
+        outlets = [row['_id'] for row in await db.users.aggregate([{"$group": {"_id": "$outlet_id"}}]).to_list(None)]
     today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    today_iso = today.isoformat()
+    await fresh_archive_index()
     
-    # Total revenue today
-    transactions_today = await db.transactions.find({
-        "created_at": {"$gte": today_iso}
-    }, {"_id": 0}).to_list(10000)
+    written = {}
+    for outlet in outlets:
+        written[outlet] = 0
+        for day in await days_with_rows(outlet, today):
+            if not all(export_path(dataset, outlet, day).exists() for dataset in EXPORT_DATASETS):
+                await export_day(outlet, day)
+                written[outlet] += 1
+    logger.info(f"Parquet export finished: {written}")
+    return {"export_dir": str(EXPORT_DIR), "days_written": written}
+
+def invalidate_exports(outlet_id: str, since: datetime):
+    """Drop exported days of the outlet from `since` on; the next run writes them again."""
+    day = since.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    while day <= datetime.now(timezone.utc):
+        for dataset in EXPORT_DATASETS:
+            day_dir = export_path(dataset, outlet_id, day).parent
+            if day_dir.is_dir():
+                shutil.rmtree(day_dir, ignore_errors=True)
+        day += timedelta(days=1)
+
+async def export_loop():
+    while True:
+        try:
+            await run_export()
+        except Exception:
+            logger.exception("Parquet export run failed")
+        await asyncio.sleep(EXPORT_INTERVAL_HOURS * 3600)
+
+@api_router.post("/admin/export", dependencies=[Depends(fresh_archive_index)])
+async def trigger_export(current_user: User = Depends(get_admin_user)):
+    if pa is None:
+        raise HTTPException(status_code=503, detail="Parquet export needs pyarrow")
+    return await run_export(current_user.outlet_id)
+
+# ==================== REPORT HELPERS ====================
+
+# Fields the report pipelines read; everything else is projected away early
+TRANSACTION_REPORT_FIELDS = ("created_at", "total", "payment_method")
+ORDER_ITEM_REPORT_FIELDS = ("items.menu_item_name", "items.quantity", "items.subtotal")
+
+def transactions_between(
+    outlet_id: str, start: datetime, end: datetime, fields: Optional[tuple] = TRANSACTION_REPORT_FIELDS
+):
+    match = {"outlet_id": outlet_id, "created_at": {"$gte": start.isoformat(), "$lt": end.isoformat()}}
+    stages = with_archives("transactions", match, start, end, fields)
+    buckets = transaction_time_filter(match['created_at'])
+    if not buckets:
+        return stages
+    # A leading $match only filters the base collection, never the archive branches
+    return [{"$match": {**buckets, "meta.outlet_id": outlet_id}}, *stages]
+
+async def transaction_summary(outlet_id: str, start: datetime, end: datetime):
+    rows = await reports_db.transactions.aggregate([
+        *transactions_between(outlet_id, start, end),
+        {"$group": {"_id": None, "revenue": {"$sum": "$total"}, "count": {"$sum": 1}}}
+    ]).to_list(1)
+    if not rows:
+        return 0, 0
+    return rows[0]['revenue'], rows[0]['count']
+
+async def daily_breakdown(outlet_id: str, start: datetime, end: datetime):
+    rows = await reports_db.transactions.aggregate([
+        *transactions_between(outlet_id, start, end),
+        {"$group": {
+            "_id": {"$substr": ["$created_at", 0, 10]},
+            "revenue": {"$sum": "$total"},
+            "transactions": {"$sum": 1}
+        }},
+        {"$sort": {"_id": 1}}
+    ]).to_list(1000)
+    return [{"date": r['_id'], "revenue": r['revenue'], "transactions": r['transactions']} for r in rows]
+
+async def order_type_breakdown(outlet_id: str, start: datetime, end: datetime):
+    rows = await reports_db.orders.aggregate([
+        *completed_orders_between(outlet_id, start, end, ("order_type",)),
+        {"$group": {"_id": "$order_type", "count": {"$sum": 1}}}
+    ]).to_list(100)
+    order_type_count = {"dine-in": 0, "takeaway": 0}
+    for r in rows:
+        order_type_count[r['_id']] = r['count']
+    return [{"type": k, "count": v} for k, v in order_type_count.items()]
+
+async def top_selling_items(source: list, limit: int):
+    rows = await reports_db.orders.aggregate([
+        *source,
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": "$items.menu_item_name",
+            "quantity": {"$sum": "$items.quantity"},
+            "revenue": {"$sum": "$items.subtotal"}
+        }},
+        {"$sort": {"quantity": -1}},
+        {"$limit": limit}
+    ]).to_list(limit)
+    return [{"name": r['_id'], "quantity": r['quantity'], "revenue": r['revenue']} for r in rows]
+
+def completed_orders_between(
+    outlet_id: str, start: datetime, end: datetime, fields: tuple = ORDER_ITEM_REPORT_FIELDS
+):
+    match = {
+        "outlet_id": outlet_id,
+        "created_at": {"$gte": start.isoformat(), "$lt": end.isoformat()},
+        "status": "completed"
+    }
+    return with_archives("orders", match, start, end, fields)
+
+def growth(current, previous):
+    return ((current - previous) / previous * 100) if previous > 0 else 0
+
+def parse_date_range(start_date: str, end_date: str):
+    """[start, end) covering the inclusive YYYY-MM-DD dates."""
+    try:
+        start = datetime.fromisoformat(start_date).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc)
+        end = datetime.fromisoformat(end_date).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc) + timedelta(days=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    return start, end
+
+# Length of the created_at prefix grouped on in the database. Week and month
+# buckets are rolled up from days so a range may start mid-week or mid-month.
+REPORT_GRANULARITIES = {"hour": 13, "day": 10, "week": 10, "month": 10}
+
+def bucket_label(key: str, granularity: str):
+    if granularity == "hour":
+        return f"{key}:00"
+    if granularity == "week":
+        day = datetime.fromisoformat(key).date()
+        return (day - timedelta(days=day.weekday())).isoformat()
+    if granularity == "month":
+        return key[:7]
+    return key
+
+async def period_report(
+    outlet_id: str, start: datetime, end: datetime,
+    granularity: str = "day", prev_start: Optional[datetime] = None
+):
+    """
+    Totals, bucketed series and payment breakdown for [start, end), compared
+    with [prev_start, start) - by default the equally long period before it.
+    Both periods come from a single aggregation grouped by
+    (created_at prefix, payment method).
+    """
+    prefix = REPORT_GRANULARITIES[granularity]
+    prev_start = prev_start or start - (end - start)
+    rows = await reports_db.transactions.aggregate([
+        *transactions_between(outlet_id, prev_start, end),
+        {"$group": {
+            "_id": {"bucket": {"$substr": ["$created_at", 0, prefix]}, "method": "$payment_method"},
+            "revenue": {"$sum": "$total"},
+            "transactions": {"$sum": 1}
+        }}
+    ]).to_list(None)
     
-    total_revenue_today = sum(t['total'] for t in transactions_today)
+    step = timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+    series = {}
+    cursor = start
+    while cursor < end:
+        series.setdefault(bucket_label(cursor.isoformat()[:prefix], granularity), {"revenue": 0, "transactions": 0})
+        cursor += step
     
-    # Total transactions today
-    total_transactions_today = len(transactions_today)
+    boundary = start.isoformat()[:prefix]
+    current = {"revenue": 0, "transactions": 0}
+    previous = {"revenue": 0, "transactions": 0}
+    methods = {}
+    for r in rows:
+        totals = current if r['_id']['bucket'] >= boundary else previous
+        totals["revenue"] += r['revenue']
+        totals["transactions"] += r['transactions']
+        if totals is current:
+            bucket = series[bucket_label(r['_id']['bucket'], granularity)]
+            bucket["revenue"] += r['revenue']
+            bucket["transactions"] += r['transactions']
+            methods[r['_id']['method']] = methods.get(r['_id']['method'], 0) + r['revenue']
     
-    # Pending orders
-    pending_orders = await db.orders.count_documents({"status": "pending"})
+    return {
+        "total_revenue": current["revenue"],
+        "total_transactions": current["transactions"],
+        "average_transaction": current["revenue"] / current["transactions"] if current["transactions"] > 0 else 0,
+        "previous": {
+            "start": prev_start.isoformat(),
+            "end": start.isoformat(),
+            "total_revenue": previous["revenue"],
+            "total_transactions": previous["transactions"]
+        },
+        "revenue_growth": growth(current["revenue"], previous["revenue"]),
+        "transaction_growth": growth(current["transactions"], previous["transactions"]),
+        "series": [{"bucket": k, **v} for k, v in sorted(series.items())],
+        "payment_breakdown": [{"method": m, "amount": a} for m, a in sorted(methods.items())]
+    }
+
+REPORT_TIMEZONE = ZoneInfo(os.environ.get('REPORT_TIMEZONE', os.environ.get('RECEIPT_TIMEZONE', 'Asia/Jakarta')))
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+async def hourly_heatmap(outlet_id: str, start: datetime, end: datetime):
+    """
+    Revenue and transaction counts as weekday x hour matrices in REPORT_TIMEZONE.
+    The database rolls transactions up per UTC hour (at most 24 rows a day);
+    only those rollups are folded into local weekday/hour cells here.
+    """
+    rows = await reports_db.transactions.aggregate([
+        *transactions_between(outlet_id, start, end),
+        {"$group": {
+            "_id": {"$substr": ["$created_at", 0, 13]},
+            "revenue": {"$sum": "$total"},
+            "transactions": {"$sum": 1}
+        }}
+    ]).to_list(None)
     
-    # Total menu items
-    total_menu_items = await db.menu_items.count_documents({})
+    revenue = [[0] * 24 for _ in range(7)]
+    transactions = [[0] * 24 for _ in range(7)]
+    for r in rows:
+        hour = datetime.fromisoformat(f"{r['_id']}:00:00+00:00").astimezone(REPORT_TIMEZONE)
+        revenue[hour.weekday()][hour.hour] += r['revenue']
+        transactions[hour.weekday()][hour.hour] += r['transactions']
+    return revenue, transactions
+
+TURNOVER_FIELDS = ("table_id", "table_number", "dwell_seconds")
+DWELL_PERCENTILES = (50, 75, 90, 95)
+
+def percentile(values: list, p: float):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    return values[max(1, math.ceil(p / 100 * len(values))) - 1]
+
+async def table_dwell_times(outlet_id: str, start: datetime, end: datetime):
+    """
+    Dwell minutes of every table order opened in [start, end), grouped per
+    table in the database from the dwell_seconds stored on completion.
+    """
+    match = {
+        "outlet_id": outlet_id,
+        "created_at": {"$gte": start.isoformat(), "$lt": end.isoformat()},
+        "status": "completed",
+        "table_id": {"$ne": None},
+        "dwell_seconds": {"$ne": None}
+    }
+    rows = await reports_db.orders.aggregate([
+        *with_archives("orders", match, start, end, TURNOVER_FIELDS),
+        {"$group": {"_id": "$table_id", "table_number": {"$max": "$table_number"},
+                    "dwell_seconds": {"$push": "$dwell_seconds"}}}
+    ]).to_list(None)
     
-    # Get all transactions for revenue chart (last 7 days)
-    seven_days_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-    recent_transactions = await db.transactions.find({
-        "created_at": {"$gte": seven_days_ago}
-    }, {"_id": 0}).to_list(10000)
+    dwell = {r['_id']: [seconds / 60 for seconds in r['dwell_seconds']] for r in rows}
+    numbers = {r['_id']: r['table_number'] for r in rows}
+    return dwell, numbers
+
+def dwell_summary(minutes: list) -> dict:
+    minutes = sorted(minutes)
+    summary = {f"p{p}": round(percentile(minutes, p), 1) if minutes else None for p in DWELL_PERCENTILES}
+    summary["average"] = round(sum(minutes) / len(minutes), 1) if minutes else None
+    summary["max"] = round(minutes[-1], 1) if minutes else None
+    return summary
+
+# Finished reports keyed by (outlet, report, range, params). A period that has
+# ended is kept for REPORT_CACHE_CLOSED_SECONDS; one that is still open
+# expires after REPORT_CACHE_OPEN_SECONDS. Writes that can change past periods
+# call invalidate_reports(), which drops this worker's entries and, when a
+# closed day is affected, records the change in db.report_invalidations so
+# every worker re-checks its closed entries against it before serving them.
+# The newest such change per outlet is re-read at most every
+# REPORT_INVALIDATION_CHECK_SECONDS, so another worker's change shows up
+# here within that delay. Only when it is newer than a cached entry is the
+# entry's range checked against the changes.
+#
+# A closed period only changes through invalidate_reports, so its TTL is not
+# about staleness: REPORT_CACHE_CLOSED_SECONDS bounds how long an entry nobody
+# asks for again holds memory, and how long db.report_invalidations keeps its
+# rows (its TTL index follows it). Six hours covers a day of repeated views.
+REPORT_CACHE_OPEN_SECONDS = float(os.environ.get('REPORT_CACHE_OPEN_SECONDS', '60'))
+REPORT_CACHE_CLOSED_SECONDS = float(os.environ.get('REPORT_CACHE_CLOSED_SECONDS', '21600'))
+REPORT_INVALIDATION_CHECK_SECONDS = float(os.environ.get('REPORT_INVALIDATION_CHECK_SECONDS', '5'))
+report_cache = LRUCache(int(os.environ.get('REPORT_CACHE_SIZE', '256')))
+newest_invalidations = {}  # outlet_id -> (read at, monotonic; newest `at` or None)
+
+async def newest_invalidation(outlet_id: str) -> Optional[datetime]:
+    checked = newest_invalidations.get(outlet_id)
+    if checked is None or time.monotonic() - checked[0] >= REPORT_INVALIDATION_CHECK_SECONDS:
+        rows = await db.report_invalidations.find(
+            {"outlet_id": outlet_id}, {"_id": 0, "at": 1}
+        ).sort("at", -1).limit(1).to_list(1)
+        at = rows[0]['at'] if rows else None
+        if isinstance(at, str):
+            at = datetime.fromisoformat(at)
+        if at is not None and at.tzinfo is None:
+            at = at.replace(tzinfo=timezone.utc)
+        checked = newest_invalidations[outlet_id] = (time.monotonic(), at)
+    return checked[1]
+
+async def cached_report(outlet_id: str, compute, name: str, start: datetime, end: datetime, *params):
+    key = (outlet_id, name, start, end, *params)
+    cached = report_cache.get(key)
+    if cached is not None:
+        report, computed_at, closed = cached
+        if not closed:
+            return report
+        newest = await newest_invalidation(outlet_id)
+        if newest is None or newest < computed_at or not await db.report_invalidations.find_one(
+            {"outlet_id": outlet_id, "at": {"$gte": computed_at}, "since": {"$lt": end.isoformat()}}, {"_id": 1}
+        ):
+            return report
+        report_cache.discard(lambda k: k == key)
     
-    # Group by date
-    daily_revenue = {}
-    for t in recent_transactions:
-        date_str = t['created_at'][:10]  # Get YYYY-MM-DD
-        daily_revenue[date_str] = daily_revenue.get(date_str, 0) + t['total']
+    computed_at = datetime.now(timezone.utc)
+    closed = end <= computed_at
+    report = await compute()
+    report_cache.put(
+        key, (report, computed_at, closed), ttl=REPORT_CACHE_CLOSED_SECONDS if closed else REPORT_CACHE_OPEN_SECONDS
+    )
+    return report
+
+async def invalidate_reports(outlet_id: str, since: datetime):
+    """Forget cached reports of the outlet whose range ends after `since`, in every worker if a closed day changed."""
+    report_cache.discard(lambda key: key[0] == outlet_id and key[3] > since)
+    # Report ranges end on UTC midnights, so only changes before today's reach a closed one
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if since < today:
+        await db.report_invalidations.insert_one({
+            "outlet_id": outlet_id, "since": since.astimezone(timezone.utc).isoformat(), "at": datetime.now(timezone.utc)
+        })
+        newest_invalidations.pop(outlet_id, None)
+
+# ==================== ANALYTICS CACHE ====================
+
+# Ad-hoc slicing runs on an in-process columnar copy of each outlet's sales:
+# one row per transaction and one per order line it paid, with ids
+# dictionary-encoded to int32 codes, amounts as float64 and times as int64
+# microseconds since the epoch (UTC). The first query of an outlet loads it,
+# archives included; every later query only appends transactions written
+# since, re-reading the last ANALYTICS_OVERLAP_SECONDS so that inserts which
+# committed late are not missed.
+ANALYTICS_CACHE_OUTLETS = int(os.environ.get('ANALYTICS_CACHE_OUTLETS', '8'))
+ANALYTICS_BATCH_SIZE = int(os.environ.get('ANALYTICS_BATCH_SIZE', '5000'))
+ANALYTICS_OVERLAP_SECONDS = float(os.environ.get('ANALYTICS_OVERLAP_SECONDS', '300'))
+ANALYTICS_TRANSACTION_FIELDS = ("id", "order_id", "created_at", "total", "payment_method", "cashier")
+ANALYTICS_ORDER_FIELDS = ("id", "items.menu_item_id", "items.menu_item_name", "items.quantity", "items.subtotal")
+ANALYTICS_DIMENSIONS = {
+    "transactions": ("payment_method", "cashier", "hour", "weekday", "day"),
+    "lines": ("item", "category", "payment_method", "cashier", "hour", "weekday", "day"),
+}
+ANALYTICS_MEASURES = {"transactions": ("revenue", "count"), "lines": ("revenue", "quantity", "count")}
+TRANSACTION_COLUMNS = {"ts": "int64", "payment_method": "int32", "cashier": "int32", "revenue": "float64"}
+LINE_COLUMNS = {**TRANSACTION_COLUMNS, "menu_item": "int32", "quantity": "int64"}
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+END_OF_TIME = datetime(9999, 1, 1, tzinfo=timezone.utc)
+HOUR_US = 3600 * 10**6
+
+def epoch_us(value: str) -> int:
+    created_at = datetime.fromisoformat(value)
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return (created_at - EPOCH) // timedelta(microseconds=1)
+
+class Dictionary:
+    """Dictionary encoding of one column: value -> int32 code and back."""
+    
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+    
+    def encode(self, value) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+class ColumnTable:
+    """Append-only NumPy columns; capacity doubles when full."""
+    
+    def __init__(self, dtypes: dict):
+        self.size = 0
+        self.columns = {name: np.empty(1024, dtype) for name, dtype in dtypes.items()}
+    
+    def append(self, rows: dict):
+        size = self.size + len(rows['ts'])
+        capacity = len(self.columns['ts'])
+        if size > capacity:
+            capacity = max(size, capacity * 2)
+            for name, column in self.columns.items():
+                grown = np.empty(capacity, column.dtype)
+                grown[:self.size] = column[:self.size]
+                self.columns[name] = grown
+        for name, values in rows.items():
+            self.columns[name][self.size:size] = values
+        self.size = size
+    
+    def __getitem__(self, name: str):
+        return self.columns[name][:self.size]
+    
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns.values())
+
+def local_time_codes(ts, dimensions: set) -> dict:
+    """
+    Hour, weekday and day codes in REPORT_TIMEZONE for int64 UTC timestamps.
+    Only the UTC hours that occur are converted in Python; rows pick their
+    hour's values by offset from the first one.
+    """
+    hours = ts // HOUR_US
+    first = int(hours.min())
+    offsets = hours - first
+    present = np.flatnonzero(np.bincount(offsets))
+    hour, weekday, day = (np.zeros(int(present[-1]) + 1, np.int64) for _ in range(3))
+    days = Dictionary()
+    for offset in present:
+        local = (EPOCH + timedelta(hours=first + int(offset))).astimezone(REPORT_TIMEZONE)
+        hour[offset], weekday[offset] = local.hour, local.weekday()
+        day[offset] = days.encode(local.strftime('%Y-%m-%d'))
+    codes = {"hour": (hour, list(range(24))), "weekday": (weekday, WEEKDAYS), "day": (day, days.values)}
+    codes = {name: (lookup[offsets], values) for name, (lookup, values) in codes.items() if name in dimensions}
+    return codes
+
+class SalesColumns:
+    """Columnar transactions and paid order lines of one outlet."""
+    
+    def __init__(self, outlet_id: str):
+        self.outlet_id = outlet_id
+        self.transactions = ColumnTable(TRANSACTION_COLUMNS)
+        self.lines = ColumnTable(LINE_COLUMNS)
+        self.dictionaries = {name: Dictionary() for name in ("payment_method", "cashier", "menu_item")}
+        self.item_names = {}
+        self.watermark = None
+        self.recent = {}
+        self.lock = asyncio.Lock()
+    
+    def overlap_start(self) -> datetime:
+        return datetime.fromisoformat(self.watermark) - timedelta(seconds=ANALYTICS_OVERLAP_SECONDS)
+    
+    async def catch_up(self):
+        """Append every transaction (and its lines) not loaded yet."""
+        since = EPOCH if self.watermark is None else self.overlap_start()
+        batch = []
+        async for doc in reports_db.transactions.aggregate(
+            transactions_between(self.outlet_id, since, END_OF_TIME, ANALYTICS_TRANSACTION_FIELDS),
+            batchSize=ANALYTICS_BATCH_SIZE
+        ):
+            if doc['id'] in self.recent:
+                continue
+            batch.append(doc)
+            if len(batch) >= ANALYTICS_BATCH_SIZE:
+                await self.append(batch)
+                batch = []
+        if batch:
+            await self.append(batch)
+    
+    async def append(self, transactions: list):
+        match = {"outlet_id": self.outlet_id, "id": {"$in": [t['order_id'] for t in transactions]}}
+        orders = {
+            order['id']: order.get('items', [])
+            for order in await reports_db.orders.aggregate(
+                with_archives("orders", match, EPOCH, END_OF_TIME, ANALYTICS_ORDER_FIELDS)
+            ).to_list(None)
+        }
+        
+        encode = {name: dictionary.encode for name, dictionary in self.dictionaries.items()}
+        transaction_rows = {name: [] for name in TRANSACTION_COLUMNS}
+        line_rows = {name: [] for name in LINE_COLUMNS}
+        for t in transactions:
+            ts = epoch_us(t['created_at'])
+            method = encode["payment_method"](t.get('payment_method'))
+            cashier = encode["cashier"](t.get('cashier'))
+            for name, value in (("ts", ts), ("payment_method", method), ("cashier", cashier), ("revenue", t['total'])):
+                transaction_rows[name].append(value)
+            for line in orders.get(t['order_id'], []):
+                self.item_names[line.get('menu_item_id')] = line.get('menu_item_name')
+                for name, value in (
+                    ("ts", ts), ("payment_method", method), ("cashier", cashier),
+                    ("menu_item", encode["menu_item"](line.get('menu_item_id'))),
+                    ("quantity", line['quantity']), ("revenue", line['subtotal'])
+                ):
+                    line_rows[name].append(value)
+            self.recent[t['id']] = t['created_at']
+            self.watermark = max(self.watermark or t['created_at'], t['created_at'])
+        self.transactions.append(transaction_rows)
+        self.lines.append(line_rows)
+        
+        cutoff = self.overlap_start().isoformat()
+        self.recent = {key: created_at for key, created_at in self.recent.items() if created_at >= cutoff}
+    
+    def group_by(self, dataset: str, by: list, start: datetime, end: datetime,
+                 filters: dict, item_categories: tuple, sort: str, limit: int) -> dict:
+        table = self.lines if dataset == "lines" else self.transactions
+        ts = table["ts"]
+        mask = (ts >= epoch_us(start.isoformat())) & (ts < epoch_us(end.isoformat()))
+        for name, value in filters.items():
+            if name == "category_id":
+                category_codes, categories, _ = item_categories
+                mask &= category_codes[table["menu_item"]] == categories.codes.get(value, -1)
+            else:
+                mask &= table[name] == self.dictionaries[name].codes.get(value, -1)
+        rows = np.flatnonzero(mask)
+        if rows.size == 0:
+            return {"rows_scanned": 0, "groups": 0, "rows": []}
+        
+        keys, labels = [], []
+        time_dimensions = {"hour", "weekday", "day"} & set(by)
+        local = local_time_codes(ts[rows], time_dimensions) if time_dimensions else {}
+        for dimension in by:
+            if dimension in ("hour", "weekday", "day"):
+                codes, values = local[dimension]
+            elif dimension == "item":
+                dictionary = self.dictionaries["menu_item"]
+                codes = table["menu_item"][rows]
+                values = [self.item_names.get(item_id) or item_id for item_id in dictionary.values]
+            elif dimension == "category":
+                category_codes, categories, names = item_categories
+                codes = category_codes[table["menu_item"][rows]]
+                values = [names.get(category_id, "Uncategorized") for category_id in categories.values]
+            else:
+                codes, values = table[dimension][rows], self.dictionaries[dimension].values
+            keys.append(codes.astype(np.int64))
+            labels.append(values)
+        
+        sizes = [len(values) for values in labels]
+        if len(keys) > 1:
+            combined = np.ravel_multi_index(keys, sizes)
+        else:
+            combined = keys[0] if keys else np.zeros(rows.size, np.int64)
+        if math.prod(sizes) <= max(rows.size, 1 << 16):
+            # Dense key space: count every possible group, keep the ones that occur
+            present = np.bincount(combined, minlength=math.prod(sizes))
+            groups = np.flatnonzero(present)
+            position = np.zeros(present.size, np.int64)
+            position[groups] = np.arange(groups.size)
+            inverse = position[combined]
+        else:
+            groups, inverse = np.unique(combined, return_inverse=True)
+        measures = {
+            "revenue": np.bincount(inverse, weights=table["revenue"][rows], minlength=groups.size),
+            "count": np.bincount(inverse, minlength=groups.size)
+        }
+        if dataset == "lines":
+            measures["quantity"] = np.bincount(inverse, weights=table["quantity"][rows], minlength=groups.size)
+        
+        order = np.argsort(-measures[sort], kind="stable")[:limit]
+        group_codes = np.unravel_index(groups[order], sizes) if keys else []
+        result = []
+        for position, index in enumerate(order):
+            row = {dimension: labels[d][group_codes[d][position]] for d, dimension in enumerate(by)}
+            row["revenue"] = round(float(measures["revenue"][index]), 2)
+            row["count"] = int(measures["count"][index])
+            if "quantity" in measures:
+                row["quantity"] = int(measures["quantity"][index])
+            result.append(row)
+        return {"rows_scanned": int(rows.size), "groups": int(groups.size), "rows": result}
     
-    revenue_chart = [{"date": k, "revenue": v} for k, v in sorted(daily_revenue.items())]
+    def stats(self) -> dict:
+        return {"transactions": self.transactions.size, "lines": self.lines.size,
+                "bytes": self.transactions.nbytes() + self.lines.nbytes()}
+
+analytics_cache = LRUCache(ANALYTICS_CACHE_OUTLETS)
+
+async def sales_columns(outlet_id: str) -> SalesColumns:
+    columns = analytics_cache.get(outlet_id)
+    if columns is None:
+        columns = SalesColumns(outlet_id)
+        analytics_cache.put(outlet_id, columns)
+    async with columns.lock:
+        await columns.catch_up()
+    return columns
+
+async def item_categories(outlet_id: str, columns: SalesColumns):
+    """
+    Category code of every menu item code in the cache, by the items'
+    current category, plus the category dictionary and names.
+    """
+    categories = Dictionary()
+    names = {c['id']: c['name'] for c in await reports_db.categories.find(
+        {"outlet_id": outlet_id}, {"_id": 0, "id": 1, "name": 1}
+    ).to_list(None)}
+    category_of = {m['id']: m.get('category_id') for m in await reports_db.menu_items.find(
+        {"outlet_id": outlet_id}, {"_id": 0, "id": 1, "category_id": 1}
+    ).to_list(None)}
+    codes = np.array([
+        categories.encode(category_of.get(item_id)) for item_id in columns.dictionaries["menu_item"].values
+    ], dtype=np.int64)
+    return codes, categories, names
+
+def invalidate_analytics(outlet_id: str, since: datetime):
+    """Drop the outlet's columns if transactions were written before what a catch-up re-reads."""
+    columns = analytics_cache.entries.get(outlet_id, (None,))[0]
+    if columns is not None and columns.watermark and since < columns.overlap_start():
+        analytics_cache.discard(lambda key: key == outlet_id)
+
+# ==================== DASHBOARD/REPORTS ROUTES ====================
+
+@api_router.get("/dashboard/stats", dependencies=[Depends(fresh_archive_index)])
+async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
+    # Get today's date range
+    now = datetime.now(timezone.utc)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    # Total revenue and transactions today
+    total_revenue_today, total_transactions_today = await transaction_summary(current_user.outlet_id, today, now + timedelta(days=1))
+    
+    # Pending orders
+    pending_orders = await reports_db.orders.count_documents(outlet_scope(current_user, {"status": "pending"}))
+    
+    # Total menu items
+    total_menu_items = await reports_db.menu_items.count_documents(outlet_scope(current_user))
+    
+    # Revenue chart (last 7 days), grouped by date
+    seven_days_ago = now - timedelta(days=7)
+    revenue_chart = [
+        {"date": d['date'], "revenue": d['revenue']}
+        for d in await daily_breakdown(current_user.outlet_id, seven_days_ago, now + timedelta(days=1))
+    ]
     
     # Top selling items
-    all_orders = await db.orders.find({"status": "completed"}, {"_id": 0}).to_list(10000)
-    item_sales = {}
-    for order in all_orders:
-        for item in order['items']:
-            key = item['menu_item_name']
-            if key not in item_sales:
-                item_sales[key] = {'name': key, 'quantity': 0, 'revenue': 0}
-            item_sales[key]['quantity'] += item['quantity']
-            item_sales[key]['revenue'] += item['subtotal']
-    
-    top_items = sorted(item_sales.values(), key=lambda x: x['quantity'], reverse=True)[:5]
+    top_items = await top_selling_items([
+        {"$match": outlet_scope(current_user, {"status": "completed"})},
+        {"$project": field_projection(ORDER_ITEM_REPORT_FIELDS)}
+    ], 5)
     
     return {
         "total_revenue_today": total_revenue_today,
@@ -582,7 +3255,188 @@ async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
 
 # ==================== REPORTS ROUTES ====================
 
-@api_router.get("/reports/daily")
+@api_router.get("/reports/range", dependencies=[Depends(fresh_archive_index)])
+async def get_range_report(
+    start_date: str = Query(..., alias="from"),
+    end_date: str = Query(..., alias="to"),
+    granularity: str = Query("day", pattern="^(hour|day|week|month)$"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Report for an arbitrary date range, compared with the preceding range of equal length
+    from, to format: YYYY-MM-DD (both inclusive)
+    granularity: hour, day, week or month
+    """
+    start, end = parse_date_range(start_date, end_date)
+    if granularity == "hour" and end - start > timedelta(days=31):
+        raise HTTPException(status_code=400, detail="Hourly reports are limited to 31 days")
+    
+    async def compute():
+        report = await period_report(current_user.outlet_id, start, end, granularity)
+        return {
+            "from": start_date,
+            "to": end_date,
+            "granularity": granularity,
+            **report,
+            "order_type_breakdown": await order_type_breakdown(current_user.outlet_id, start, end),
+            "top_selling_items": await top_selling_items(completed_orders_between(current_user.outlet_id, start, end), 10)
+        }
+    
+    return await cached_report(current_user.outlet_id, compute, "range", start, end, start_date, end_date, granularity)
+
+@api_router.get("/reports/heatmap", dependencies=[Depends(fresh_archive_index)])
+async def get_heatmap_report(
+    start_date: str = Query(..., alias="from"),
+    end_date: str = Query(..., alias="to"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Peak-load heatmap: revenue and transactions by weekday (rows, Monday first) x hour (columns)
+    from, to format: YYYY-MM-DD (both inclusive)
+    """
+    start, end = parse_date_range(start_date, end_date)
+    
+    async def compute():
+        revenue, transactions = await hourly_heatmap(current_user.outlet_id, start, end)
+        peak_day, peak_hour = max(
+            ((d, h) for d in range(7) for h in range(24)), key=lambda cell: transactions[cell[0]][cell[1]]
+        )
+        return {
+            "from": start_date,
+            "to": end_date,
+            "timezone": str(REPORT_TIMEZONE),
+            "weekdays": WEEKDAYS,
+            "hours": list(range(24)),
+            "revenue": revenue,
+            "transactions": transactions,
+            "peak": {
+                "weekday": WEEKDAYS[peak_day],
+                "hour": peak_hour,
+                "transactions": transactions[peak_day][peak_hour],
+                "revenue": revenue[peak_day][peak_hour]
+            }
+        }
+    
+    return await cached_report(current_user.outlet_id, compute, "heatmap", start, end, start_date, end_date)
+
+@api_router.get("/reports/table-turnover", dependencies=[Depends(fresh_archive_index)])
+async def get_table_turnover_report(
+    start_date: str = Query(..., alias="from"),
+    end_date: str = Query(..., alias="to"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Turns per table and dwell-time percentiles (minutes) for dine-in orders,
+    plus how long each currently occupied table has been seated.
+    from, to format: YYYY-MM-DD (both inclusive)
+    """
+    start, end = parse_date_range(start_date, end_date)
+    
+    async def compute():
+        dwell, numbers = await table_dwell_times(current_user.outlet_id, start, end)
+        tables = await db.tables.find(
+            outlet_scope(current_user), {"_id": 0, "id": 1, "table_number": 1}
+        ).to_list(None)
+        for table in tables:
+            numbers[table['id']] = table['table_number']
+        
+        days = (end - start).days
+        per_table = sorted((
+            {
+                "table_id": table_id,
+                "table_number": number,
+                "turns": len(dwell.get(table_id, [])),
+                "turns_per_day": round(len(dwell.get(table_id, [])) / days, 2),
+                "dwell_minutes": dwell_summary(dwell.get(table_id, []))
+            }
+            for table_id, number in numbers.items()
+        ), key=lambda t: -t['turns'])
+        total_turns = sum(t['turns'] for t in per_table)
+        return {
+            "from": start_date,
+            "to": end_date,
+            "days": days,
+            "total_turns": total_turns,
+            "turns_per_table_per_day": round(total_turns / (len(per_table) * days), 2) if per_table else 0,
+            "dwell_minutes": dwell_summary([m for minutes in dwell.values() for m in minutes]),
+            "tables": per_table
+        }
+    
+    report = await cached_report(current_user.outlet_id, compute, "table-turnover", start, end, start_date, end_date)
+    
+    # Seated tables change by the minute, so this part is never cached
+    now = datetime.now(timezone.utc)
+    seated = {}
+    for order in await db.orders.find(
+        outlet_scope(current_user, {"status": "pending", "table_id": {"$ne": None}}),
+        {"_id": 0, "table_id": 1, "table_number": 1, "created_at": 1}
+    ).to_list(None):
+        if order['table_id'] not in seated or order['created_at'] < seated[order['table_id']]['created_at']:
+            seated[order['table_id']] = order
+    occupied = [
+        {
+            "table_id": table_id,
+            "table_number": order.get('table_number'),
+            "seated_minutes": round((now - datetime.fromisoformat(order['created_at'])).total_seconds() / 60, 1)
+        }
+        for table_id, order in seated.items()
+    ]
+    return {**report, "occupied_now": sorted(occupied, key=lambda t: -t['seated_minutes'])}
+
+@api_router.get("/reports/group-by", dependencies=[Depends(fresh_archive_index)])
+async def get_group_by_report(
+    start_date: str = Query(..., alias="from"),
+    end_date: str = Query(..., alias="to"),
+    by: str = "",
+    dataset: str = Query("lines", pattern="^(lines|transactions)$"),
+    sort: str = Query("revenue", pattern="^(revenue|quantity|count)$"),
+    limit: int = Query(100, ge=1, le=10000),
+    payment_method: Optional[str] = None,
+    cashier: Optional[str] = None,
+    category_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Ad-hoc aggregation over the in-memory sales columns
+    from, to format: YYYY-MM-DD (both inclusive)
+    by: comma-separated dimensions; item, category, payment_method, cashier, hour, weekday, day
+        (lines) or payment_method, cashier, hour, weekday, day (transactions)
+    Hours, weekdays and days are in REPORT_TIMEZONE.
+    """
+    if np is None:
+        raise HTTPException(status_code=503, detail="Ad-hoc analytics needs numpy")
+    start, end = parse_date_range(start_date, end_date)
+    dimensions = [d.strip() for d in by.split(",") if d.strip()]
+    unknown = [d for d in dimensions if d not in ANALYTICS_DIMENSIONS[dataset]]
+    if unknown or len(set(dimensions)) != len(dimensions):
+        raise HTTPException(status_code=400, detail=f"Dimensions for {dataset}: {', '.join(ANALYTICS_DIMENSIONS[dataset])}")
+    if sort not in ANALYTICS_MEASURES[dataset]:
+        raise HTTPException(status_code=400, detail=f"Sort for {dataset}: {', '.join(ANALYTICS_MEASURES[dataset])}")
+    if category_id and dataset != "lines":
+        raise HTTPException(status_code=400, detail="category_id only applies to lines")
+    
+    started = time.perf_counter()
+    columns = await sales_columns(current_user.outlet_id)
+    filters = {name: value for name, value in (
+        ("payment_method", payment_method), ("cashier", cashier), ("category_id", category_id)
+    ) if value}
+    # Under the lock no catch-up can add menu item codes the category mapping lacks
+    async with columns.lock:
+        categories = None
+        if dataset == "lines" and ("category" in dimensions or category_id):
+            categories = await item_categories(current_user.outlet_id, columns)
+        result = columns.group_by(dataset, dimensions, start, end, filters, categories, sort, limit)
+    return {
+        "from": start_date,
+        "to": end_date,
+        "dataset": dataset,
+        "by": dimensions,
+        "timezone": str(REPORT_TIMEZONE),
+        **result,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+@api_router.get("/reports/daily", dependencies=[Depends(fresh_archive_index)])
 async def get_daily_report(date: str, current_user: User = Depends(get_current_user)):
     """
     Get daily report for a specific date
@@ -593,86 +3447,28 @@ async def get_daily_report(date: str, current_user: User = Depends(get_current_u
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
     
-    # Start and end of the day
+    # Start and end of the day, compared with the previous day
     start_of_day = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
     end_of_day = start_of_day + timedelta(days=1)
     
-    # Previous day for comparison
-    prev_start = start_of_day - timedelta(days=1)
-    prev_end = start_of_day
-    
-    # Get transactions for the day
-    transactions = await db.transactions.find({
-        "created_at": {
-            "$gte": start_of_day.isoformat(),
-            "$lt": end_of_day.isoformat()
-        }
-    }, {"_id": 0}).to_list(10000)
-    
-    # Get previous day transactions
-    prev_transactions = await db.transactions.find({
-        "created_at": {
-            "$gte": prev_start.isoformat(),
-            "$lt": prev_end.isoformat()
+    async def compute():
+        report = await period_report(current_user.outlet_id, start_of_day, end_of_day)
+        
+        return {
+            "date": date,
+            "total_revenue": report["total_revenue"],
+            "total_transactions": report["total_transactions"],
+            "average_transaction": report["average_transaction"],
+            "revenue_growth": report["revenue_growth"],
+            "transaction_growth": report["transaction_growth"],
+            "payment_breakdown": report["payment_breakdown"],
+            "order_type_breakdown": await order_type_breakdown(current_user.outlet_id, start_of_day, end_of_day),
+            "top_selling_items": await top_selling_items(completed_orders_between(current_user.outlet_id, start_of_day, end_of_day), 10)
         }
-    }, {"_id": 0}).to_list(10000)
-    
-    # Calculate metrics
-    total_revenue = sum(t['total'] for t in transactions)
-    total_transactions = len(transactions)
-    avg_transaction = total_revenue / total_transactions if total_transactions > 0 else 0
-    
-    prev_revenue = sum(t['total'] for t in prev_transactions)
-    prev_count = len(prev_transactions)
-    
-    revenue_growth = ((total_revenue - prev_revenue) / prev_revenue * 100) if prev_revenue > 0 else 0
-    transaction_growth = ((total_transactions - prev_count) / prev_count * 100) if prev_count > 0 else 0
-    
-    # Payment method breakdown
-    payment_methods = {}
-    for t in transactions:
-        method = t['payment_method']
-        payment_methods[method] = payment_methods.get(method, 0) + t['total']
-    
-    payment_breakdown = [{"method": k, "amount": v} for k, v in payment_methods.items()]
-    
-    # Get orders for the day
-    orders = await db.orders.find({
-        "created_at": {
-            "$gte": start_of_day.isoformat(),
-            "$lt": end_of_day.isoformat()
-        },
-        "status": "completed"
-    }, {"_id": 0}).to_list(10000)
-    
-    # Top selling items
-    item_sales = {}
-    order_type_count = {"dine-in": 0, "takeaway": 0}
-    
-    for order in orders:
-        order_type_count[order['order_type']] = order_type_count.get(order['order_type'], 0) + 1
-        for item in order['items']:
-            key = item['menu_item_name']
-            if key not in item_sales:
-                item_sales[key] = {'name': key, 'quantity': 0, 'revenue': 0}
-            item_sales[key]['quantity'] += item['quantity']
-            item_sales[key]['revenue'] += item['subtotal']
-    
-    top_items = sorted(item_sales.values(), key=lambda x: x['quantity'], reverse=True)[:10]
     
-    return {
-        "date": date,
-        "total_revenue": total_revenue,
-        "total_transactions": total_transactions,
-        "average_transaction": avg_transaction,
-        "revenue_growth": revenue_growth,
-        "transaction_growth": transaction_growth,
-        "payment_breakdown": payment_breakdown,
-        "order_type_breakdown": [{"type": k, "count": v} for k, v in order_type_count.items()],
-        "top_selling_items": top_items
-    }
+    return await cached_report(current_user.outlet_id, compute, "daily", start_of_day, end_of_day, date)
 
-@api_router.get("/reports/weekly")
+@api_router.get("/reports/weekly", dependencies=[Depends(fresh_archive_index)])
 async def get_weekly_report(start_date: str, current_user: User = Depends(get_current_user)):
     """
     Get weekly report starting from start_date
@@ -683,98 +3479,32 @@ async def get_weekly_report(start_date: str, current_user: User = Depends(get_cu
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
     
+    # The week, compared with the previous week
     week_end = week_start + timedelta(days=7)
     
-    # Previous week for comparison
-    prev_week_start = week_start - timedelta(days=7)
-    prev_week_end = week_start
-    
-    # Get transactions for the week
-    transactions = await db.transactions.find({
-        "created_at": {
-            "$gte": week_start.isoformat(),
-            "$lt": week_end.isoformat()
-        }
-    }, {"_id": 0}).to_list(10000)
-    
-    # Get previous week transactions
-    prev_transactions = await db.transactions.find({
-        "created_at": {
-            "$gte": prev_week_start.isoformat(),
-            "$lt": prev_week_end.isoformat()
+    async def compute():
+        report = await period_report(current_user.outlet_id, week_start, week_end)
+        
+        return {
+            "start_date": start_date,
+            "end_date": week_end.date().isoformat(),
+            "total_revenue": report["total_revenue"],
+            "total_transactions": report["total_transactions"],
+            "average_transaction": report["average_transaction"],
+            "revenue_growth": report["revenue_growth"],
+            "transaction_growth": report["transaction_growth"],
+            "daily_breakdown": [
+                {"date": d["bucket"], "revenue": d["revenue"], "transactions": d["transactions"]}
+                for d in report["series"]
+            ],
+            "payment_breakdown": report["payment_breakdown"],
+            "order_type_breakdown": await order_type_breakdown(current_user.outlet_id, week_start, week_end),
+            "top_selling_items": await top_selling_items(completed_orders_between(current_user.outlet_id, week_start, week_end), 10)
         }
-    }, {"_id": 0}).to_list(10000)
-    
-    # Calculate metrics
-    total_revenue = sum(t['total'] for t in transactions)
-    total_transactions = len(transactions)
-    avg_transaction = total_revenue / total_transactions if total_transactions > 0 else 0
-    
-    prev_revenue = sum(t['total'] for t in prev_transactions)
-    prev_count = len(prev_transactions)
-    
-    revenue_growth = ((total_revenue - prev_revenue) / prev_revenue * 100) if prev_revenue > 0 else 0
-    transaction_growth = ((total_transactions - prev_count) / prev_count * 100) if prev_count > 0 else 0
-    
-    # Daily breakdown
-    daily_data = {}
-    for t in transactions:
-        date_str = t['created_at'][:10]
-        if date_str not in daily_data:
-            daily_data[date_str] = {"revenue": 0, "transactions": 0}
-        daily_data[date_str]["revenue"] += t['total']
-        daily_data[date_str]["transactions"] += 1
-    
-    daily_breakdown = [{"date": k, "revenue": v["revenue"], "transactions": v["transactions"]} 
-                       for k, v in sorted(daily_data.items())]
-    
-    # Payment method breakdown
-    payment_methods = {}
-    for t in transactions:
-        method = t['payment_method']
-        payment_methods[method] = payment_methods.get(method, 0) + t['total']
-    
-    payment_breakdown = [{"method": k, "amount": v} for k, v in payment_methods.items()]
-    
-    # Get orders for the week
-    orders = await db.orders.find({
-        "created_at": {
-            "$gte": week_start.isoformat(),
-            "$lt": week_end.isoformat()
-        },
-        "status": "completed"
-    }, {"_id": 0}).to_list(10000)
-    
-    # Top selling items
-    item_sales = {}
-    order_type_count = {"dine-in": 0, "takeaway": 0}
     
-    for order in orders:
-        order_type_count[order['order_type']] = order_type_count.get(order['order_type'], 0) + 1
-        for item in order['items']:
-            key = item['menu_item_name']
-            if key not in item_sales:
-                item_sales[key] = {'name': key, 'quantity': 0, 'revenue': 0}
-            item_sales[key]['quantity'] += item['quantity']
-            item_sales[key]['revenue'] += item['subtotal']
-    
-    top_items = sorted(item_sales.values(), key=lambda x: x['quantity'], reverse=True)[:10]
-    
-    return {
-        "start_date": start_date,
-        "end_date": week_end.date().isoformat(),
-        "total_revenue": total_revenue,
-        "total_transactions": total_transactions,
-        "average_transaction": avg_transaction,
-        "revenue_growth": revenue_growth,
-        "transaction_growth": transaction_growth,
-        "daily_breakdown": daily_breakdown,
-        "payment_breakdown": payment_breakdown,
-        "order_type_breakdown": [{"type": k, "count": v} for k, v in order_type_count.items()],
-        "top_selling_items": top_items
-    }
+    return await cached_report(current_user.outlet_id, compute, "weekly", week_start, week_end, start_date)
 
-@api_router.get("/reports/monthly")
+@api_router.get("/reports/monthly", dependencies=[Depends(fresh_archive_index)])
 async def get_monthly_report(year: int, month: int, current_user: User = Depends(get_current_user)):
     """
     Get monthly report for a specific year and month
@@ -791,121 +3521,71 @@ async def get_monthly_report(year: int, month: int, current_user: User = Depends
     else:
         month_end = datetime(year, month + 1, 1, tzinfo=timezone.utc)
     
-    # Previous month for comparison
-    if month == 1:
-        prev_month_start = datetime(year - 1, 12, 1, tzinfo=timezone.utc)
-        prev_month_end = month_start
-    else:
-        prev_month_start = datetime(year, month - 1, 1, tzinfo=timezone.utc)
-        prev_month_end = month_start
-    
-    # Get transactions for the month
-    transactions = await db.transactions.find({
-        "created_at": {
-            "$gte": month_start.isoformat(),
-            "$lt": month_end.isoformat()
+    async def compute():
+        # Previous month for comparison
+        if month == 1:
+            prev_month_start = datetime(year - 1, 12, 1, tzinfo=timezone.utc)
+        else:
+            prev_month_start = datetime(year, month - 1, 1, tzinfo=timezone.utc)
+        
+        report = await period_report(current_user.outlet_id, month_start, month_end, prev_start=prev_month_start)
+        days = [
+            {"date": d["bucket"], "revenue": d["revenue"], "transactions": d["transactions"]}
+            for d in report["series"]
+        ]
+        
+        # Weekly breakdown, rolled up from the daily buckets
+        weekly_data = {}
+        for d in days:
+            week_num = datetime.fromisoformat(d['date']).isocalendar()[1]
+            week_key = f"Week {week_num}"
+            if week_key not in weekly_data:
+                weekly_data[week_key] = {"revenue": 0, "transactions": 0}
+            weekly_data[week_key]["revenue"] += d['revenue']
+            weekly_data[week_key]["transactions"] += d['transactions']
+        
+        weekly_breakdown = [{"week": k, "revenue": v["revenue"], "transactions": v["transactions"]} 
+                            for k, v in sorted(weekly_data.items())]
+        
+        return {
+            "year": year,
+            "month": month,
+            "month_name": month_start.strftime("%B"),
+            "total_revenue": report["total_revenue"],
+            "total_transactions": report["total_transactions"],
+            "average_transaction": report["average_transaction"],
+            "revenue_growth": report["revenue_growth"],
+            "transaction_growth": report["transaction_growth"],
+            "daily_breakdown": days,
+            "weekly_breakdown": weekly_breakdown,
+            "payment_breakdown": report["payment_breakdown"],
+            "order_type_breakdown": await order_type_breakdown(current_user.outlet_id, month_start, month_end),
+            "top_selling_items": await top_selling_items(completed_orders_between(current_user.outlet_id, month_start, month_end), 10)
         }
-    }, {"_id": 0}).to_list(10000)
-    
-    # Get previous month transactions
-    prev_transactions = await db.transactions.find({
-        "created_at": {
-            "$gte": prev_month_start.isoformat(),
-            "$lt": prev_month_end.isoformat()
-        }
-    }, {"_id": 0}).to_list(10000)
-    
-    # Calculate metrics
-    total_revenue = sum(t['total'] for t in transactions)
-    total_transactions = len(transactions)
-    avg_transaction = total_revenue / total_transactions if total_transactions > 0 else 0
-    
-    prev_revenue = sum(t['total'] for t in prev_transactions)
-    prev_count = len(prev_transactions)
-    
-    revenue_growth = ((total_revenue - prev_revenue) / prev_revenue * 100) if prev_revenue > 0 else 0
-    transaction_growth = ((total_transactions - prev_count) / prev_count * 100) if prev_count > 0 else 0
-    
-    # Daily breakdown
-    daily_data = {}
-    for t in transactions:
-        date_str = t['created_at'][:10]
-        if date_str not in daily_data:
-            daily_data[date_str] = {"revenue": 0, "transactions": 0}
-        daily_data[date_str]["revenue"] += t['total']
-        daily_data[date_str]["transactions"] += 1
-    
-    daily_breakdown = [{"date": k, "revenue": v["revenue"], "transactions": v["transactions"]} 
-                       for k, v in sorted(daily_data.items())]
-    
-    # Weekly breakdown
-    weekly_data = {}
-    for t in transactions:
-        trans_date = datetime.fromisoformat(t['created_at'])
-        # Get the week number
-        week_num = trans_date.isocalendar()[1]
-        week_key = f"Week {week_num}"
-        if week_key not in weekly_data:
-            weekly_data[week_key] = {"revenue": 0, "transactions": 0}
-        weekly_data[week_key]["revenue"] += t['total']
-        weekly_data[week_key]["transactions"] += 1
-    
-    weekly_breakdown = [{"week": k, "revenue": v["revenue"], "transactions": v["transactions"]} 
-                        for k, v in sorted(weekly_data.items())]
-    
-    # Payment method breakdown
-    payment_methods = {}
-    for t in transactions:
-        method = t['payment_method']
-        payment_methods[method] = payment_methods.get(method, 0) + t['total']
-    
-    payment_breakdown = [{"method": k, "amount": v} for k, v in payment_methods.items()]
-    
-    # Get orders for the month
-    orders = await db.orders.find({
-        "created_at": {
-            "$gte": month_start.isoformat(),
-            "$lt": month_end.isoformat()
-        },
-        "status": "completed"
-    }, {"_id": 0}).to_list(10000)
-    
-    # Top selling items
-    item_sales = {}
-    order_type_count = {"dine-in": 0, "takeaway": 0}
-    
-    for order in orders:
-        order_type_count[order['order_type']] = order_type_count.get(order['order_type'], 0) + 1
-        for item in order['items']:
-            key = item['menu_item_name']
-            if key not in item_sales:
-                item_sales[key] = {'name': key, 'quantity': 0, 'revenue': 0}
-            item_sales[key]['quantity'] += item['quantity']
-            item_sales[key]['revenue'] += item['subtotal']
-    
-    top_items = sorted(item_sales.values(), key=lambda x: x['quantity'], reverse=True)[:10]
     
+    return await cached_report(current_user.outlet_id, compute, "monthly", month_start, month_end)
+
+@api_router.get("/admin/cache-stats")
+async def get_cache_stats(current_user: User = Depends(get_admin_user)):
     return {
-        "year": year,
-        "month": month,
-        "month_name": month_start.strftime("%B"),
-        "total_revenue": total_revenue,
-        "total_transactions": total_transactions,
-        "average_transaction": avg_transaction,
-        "revenue_growth": revenue_growth,
-        "transaction_growth": transaction_growth,
-        "daily_breakdown": daily_breakdown,
-        "weekly_breakdown": weekly_breakdown,
-        "payment_breakdown": payment_breakdown,
-        "order_type_breakdown": [{"type": k, "count": v} for k, v in order_type_count.items()],
-        "top_selling_items": top_items
+        "reports": report_cache.stats(),
+        "receipts": receipt_cache.stats(),
+        "compression": compression_cache.stats(),
+        "analytics": {**analytics_cache.stats(), "outlets": {
+            outlet_id: columns.stats() for outlet_id, (columns, _) in analytics_cache.entries.items()
+        }}
     }
 
 # ==================== USER MANAGEMENT ROUTES ====================
 
 @api_router.get("/users", response_model=List[User])
-async def get_users(current_user: User = Depends(get_admin_user)):
-    users = await db.users.find({}, {"_id": 0, "hashed_password": 0}).to_list(1000)
+async def get_users(fields: Optional[str] = None, current_user: User = Depends(get_admin_user)):
+    selected = parse_fields(fields, User)
+    users = await db.users.find(
+        outlet_scope(current_user), field_projection(selected, {"_id": 0, "hashed_password": 0})
+    ).to_list(1000)
+    if selected:
+        return sparse_response(users, User, selected)
     for user in users:
         if isinstance(user['created_at'], str):
             user['created_at'] = datetime.fromisoformat(user['created_at'])
@@ -913,14 +3593,391 @@ async def get_users(current_user: User = Depends(get_admin_user)):
 
 @api_router.delete("/users/{user_id}")
 async def delete_user(user_id: str, current_user: User = Depends(get_admin_user)):
-    result = await db.users.delete_one({"id": user_id})
+    result = await db.users.delete_one(outlet_scope(current_user, {"id": user_id}))
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     return {"message": "User deleted successfully"}
 
+# ==================== COMPRESSION ====================
+
+# JSON and text responses of at least COMPRESSION_MIN_BYTES are gzip/brotli
+# encoded when the client accepts it, and always carry Vary: Accept-Encoding.
+# Other content types and HEAD requests stream through untouched; bodies of at
+# least COMPRESSION_THREADPOOL_BYTES are compressed off the event loop. Catalog payloads repeat byte-for-byte between writes, so
+# their encoded form is cached by content hash and compressed once per version.
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_THREADPOOL_BYTES = int(os.environ.get('COMPRESSION_THREADPOOL_BYTES', '65536'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+COMPRESSION_CACHED_PATHS = ("/api/menu-items", "/api/categories", "/api/settings")
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+compression_cache = LRUCache(int(os.environ.get('COMPRESSION_CACHE_SIZE', '64')))
+
+def negotiate_encoding(accept_encoding: str):
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.lower()] = q
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+def with_vary(headers):
+    """Add Accept-Encoding to the Vary header, keeping any existing entries."""
+    vary = [v for k, v in headers if k.lower() == b"vary"]
+    if any(b"accept-encoding" in v.lower() or v.strip() == b"*" for v in vary):
+        return headers
+    rest = [(k, v) for k, v in headers if k.lower() != b"vary"]
+    return rest + [(b"vary", b", ".join(vary + [b"Accept-Encoding"]))]
+
+async def compress_off_loop(body: bytes, encoding: str):
+    if len(body) >= COMPRESSION_THREADPOOL_BYTES:
+        return await run_in_threadpool(compress_body, body, encoding)
+    return compress_body(body, encoding)
+
+def compress_body(body: bytes, encoding: str):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+class CompressionMiddleware:
+    """ASGI middleware compressing JSON and text responses; others stream through."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        encoding = negotiate_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        
+        start, chunks, eligible = None, [], False
+        
+        async def compressing_send(message):
+            nonlocal start, eligible
+            if message["type"] == "http.response.start":
+                response_headers = {k.lower(): v for k, v in message["headers"]}
+                content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                eligible = (
+                    b"content-encoding" not in response_headers
+                    and content_type.startswith(COMPRESSIBLE_TYPES)
+                )
+                if not eligible:
+                    return await send(message)
+                start = {**message, "headers": with_vary(message["headers"])}
+                if encoding is None:
+                    return await send(start)
+                return
+            if message["type"] != "http.response.body" or not eligible or encoding is None:
+                return await send(message)
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            await send_compressed(b"".join(chunks))
+        
+        async def send_compressed(body):
+            if len(body) < COMPRESSION_MIN_BYTES:
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+            
+            if scope["path"].startswith(COMPRESSION_CACHED_PATHS):
+                key = (hashlib.sha256(body).digest(), encoding)
+                compressed = compression_cache.get(key)
+                if compressed is None:
+                    compressed = await compress_off_loop(body, encoding)
+                    compression_cache.put(key, compressed)
+            else:
+                compressed = await compress_off_loop(body, encoding)
+            
+            response_headers = [(k, v) for k, v in start["headers"] if k.lower() != b"content-length"]
+            response_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+            ]
+            await send({**start, "headers": response_headers})
+            await send({"type": "http.response.body", "body": compressed})
+        
+        await self.app(scope, receive, compressing_send)
+
+# ==================== PROFILING ====================
+
+# An admin can sample the next N requests of a live worker (POST /admin/profile)
+# or a single request sent with an `X-Profile: json|folded` header, whose
+# response is then replaced by its profile. A background thread samples the
+# event loop thread every PROFILE_INTERVAL_MS: when a profiled request is
+# running its Python stack is recorded, otherwise the coroutine chain it is
+# suspended in, ending in <await>. Each sample is weighted by the microseconds
+# since the previous one and filed under a phase (auth, validate, handler,
+# serialize, framework). With nothing armed, requests only pay for a header scan.
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '1'))
+PROFILE_MAX_REQUESTS = int(os.environ.get('PROFILE_MAX_REQUESTS', '200'))
+PROFILE_HEADER = b"x-profile"
+PROFILE_PATH = "/api/admin/profile"
+PROFILE_PHASES = ("auth", "validate", "handler", "serialize", "framework")
+AUTH_CODES = {get_current_user.__code__, get_admin_user.__code__}
+SERIALIZE_FRAMES = {
+    ("fastapi.routing", "serialize_response"),
+    ("fastapi.encoders", "jsonable_encoder"),
+    ("starlette.responses", "JSONResponse.render"),
+}
+VALIDATE_FRAMES = {
+    ("fastapi.dependencies.utils", "request_body_to_args"),
+    ("fastapi.dependencies.utils", "request_params_to_args"),
+    ("starlette.requests", "Request.json"),
+    ("starlette.requests", "Request.body"),
+}
+
+def frame_name(frame) -> tuple:
+    return frame.f_globals.get("__name__", "?"), frame.f_code.co_qualname
+
+def coroutine_frames(task) -> list:
+    """Frames of a suspended task, outermost first, following what each coroutine awaits."""
+    frames = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return frames
+
+def stack_phase(frames: list, endpoint_code) -> str:
+    names = [frame_name(frame) for frame in frames]
+    if any(frame.f_code in AUTH_CODES for frame in frames):
+        return "auth"
+    if any(frame.f_code is endpoint_code for frame in frames):
+        return "handler"
+    if any(name in SERIALIZE_FRAMES for name in names):
+        return "serialize"
+    if any(name in VALIDATE_FRAMES or name[0].startswith("pydantic") for name in names):
+        return "validate"
+    return "framework"
+
+class ProfiledRequest:
+    def __init__(self, scope: dict, task, frame):
+        self.scope = scope
+        self.task = task
+        self.frame = frame
+        self.stacks = Counter()
+        self.samples = 0
+        self.status = None
+        self.started = time.perf_counter()
+        self.duration = None
+    
+    def label(self) -> str:
+        route = self.scope.get("route")
+        return f"{self.scope['method']} {getattr(route, 'path', self.scope['path'])}"
+    
+    def endpoint_code(self):
+        endpoint = self.scope.get("endpoint")
+        return getattr(inspect.unwrap(endpoint), "__code__", None) if endpoint else None
+    
+    def record(self, running: list, weight: int):
+        """File one sample: the running stack if this request is on it, else where it is suspended."""
+        if any(frame is self.frame for frame in running):
+            frames = running[next(i for i, frame in enumerate(running) if frame is self.frame):]
+            leaf = []
+        else:
+            frames = coroutine_frames(self.task)
+            if not any(frame is self.frame for frame in frames):
+                return
+            frames = frames[next(i for i, frame in enumerate(frames) if frame is self.frame):]
+            leaf = ["<await>"]
+        names = [f"{module}:{qualname}" for module, qualname in map(frame_name, frames[1:])]
+        self.stacks[(stack_phase(frames, self.endpoint_code()), *names, *leaf)] += weight
+        self.samples += 1
+    
+    def summary(self) -> dict:
+        phases = dict.fromkeys(PROFILE_PHASES, 0)
+        for stack, weight in self.stacks.items():
+            phases[stack[0]] += weight
+        return {
+            "request": self.label(),
+            "status": self.status,
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            "samples": self.samples,
+            "phases_ms": {phase: round(us / 1000, 2) for phase, us in phases.items()}
+        }
+
+class ProfileSession:
+    """The next `count` requests the worker serves."""
+    
+    def __init__(self, count: int):
+        self.count = count
+        self.remaining = count
+        self.requests = []
+        self.done = asyncio.Event()
+    
+    def add(self, request: ProfiledRequest):
+        self.requests.append(request)
+        if len(self.requests) == self.count:
+            self.done.set()
+
+class SamplingProfiler:
+    def __init__(self):
+        self.session = None
+        self.in_flight = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.loop_thread = None
+    
+    def claim(self, scope: dict) -> Optional[ProfileSession]:
+        session = self.session
+        if session is None or session.remaining == 0 or scope["path"] == PROFILE_PATH:
+            return None
+        session.remaining -= 1
+        return session
+    
+    def start(self, scope: dict) -> ProfiledRequest:
+        request = ProfiledRequest(scope, asyncio.current_task(), sys._getframe(1))
+        with self.lock:
+            self.loop_thread = threading.get_ident()
+            self.in_flight.append(request)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.sample, name="profiler", daemon=True)
+                self.thread.start()
+        return request
+    
+    def stop(self, request: ProfiledRequest):
+        request.duration = time.perf_counter() - request.started
+        with self.lock:
+            self.in_flight.remove(request)
+    
+    def sample(self):
+        previous = time.perf_counter()
+        while True:
+            time.sleep(PROFILE_INTERVAL_MS / 1000)
+            with self.lock:
+                if not self.in_flight:
+                    self.thread = None
+                    return
+                in_flight = list(self.in_flight)
+            now = time.perf_counter()
+            weight, previous = round((now - previous) * 1e6), now
+            running = []
+            frame = sys._current_frames().get(self.loop_thread)
+            while frame is not None:
+                running.append(frame)
+                frame = frame.f_back
+            running.reverse()
+            for request in in_flight:
+                request.record(running, weight)
+
+profiler = SamplingProfiler()
+
+def profile_report(requests: list, output: str):
+    """JSON summary per request and phase, or collapsed stacks for flamegraph.pl / speedscope (weights in µs)."""
+    folded = Counter()
+    for request in requests:
+        for stack, weight in request.stacks.items():
+            folded[";".join((request.label(), *stack))] += weight
+    if output == "folded":
+        return PlainTextResponse("".join(f"{stack} {weight}\n" for stack, weight in folded.most_common()))
+    phases = dict.fromkeys(PROFILE_PHASES, 0.0)
+    summaries = [request.summary() for request in requests]
+    for summary in summaries:
+        for phase, ms in summary["phases_ms"].items():
+            phases[phase] = round(phases[phase] + ms, 2)
+    return JSONResponse({
+        "pid": os.getpid(),
+        "interval_ms": PROFILE_INTERVAL_MS,
+        "phases_ms": phases,
+        "requests": summaries,
+        "folded": [f"{stack} {weight}" for stack, weight in folded.most_common()]
+    })
+
+async def is_admin_request(scope: dict) -> bool:
+    scheme, _, token = dict(scope["headers"]).get(b"authorization", b"").decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        user = await get_current_user(HTTPAuthorizationCredentials(scheme=scheme, credentials=token))
+    except HTTPException:
+        return False
+    return user.role == "admin"
+
+class ProfilingMiddleware:
+    """ASGI middleware sampling requests claimed by a profile session or marked with X-Profile."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        session = profiler.claim(scope)
+        output = None
+        if session is None:
+            output = next((value.decode("latin-1") for name, value in scope["headers"] if name == PROFILE_HEADER), None)
+            if output is None or not await is_admin_request(scope):
+                return await self.app(scope, receive, send)
+        
+        async def profiled_send(message):
+            if message["type"] == "http.response.start":
+                request.status = message["status"]
+            if session is not None:
+                await send(message)
+        
+        request = profiler.start(scope)
+        try:
+            await self.app(scope, receive, profiled_send)
+        finally:
+            profiler.stop(request)
+            if session is not None:
+                session.add(request)
+        if session is None:
+            response = profile_report([request], output)
+            response.headers["X-Profiled-Status"] = str(request.status)
+            await response(scope, receive, send)
+
+@api_router.post("/admin/profile")
+async def profile_requests(
+    requests: int = Query(10, ge=1),
+    timeout: float = Query(60, gt=0, le=600),
+    output: str = Query("json", alias="format", pattern="^(json|folded)$"),
+    current_user: User = Depends(get_admin_user)
+):
+    """
+    Sample the next `requests` requests this worker serves (waiting at most
+    `timeout` seconds) and return their profile.
+    format: json (phases per request plus collapsed stacks) or folded (collapsed stacks only)
+    """
+    if requests > PROFILE_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"At most {PROFILE_MAX_REQUESTS} requests per profile")
+    if profiler.session is not None:
+        raise HTTPException(status_code=409, detail="A profile is already running on this worker")
+    session = profiler.session = ProfileSession(requests)
+    try:
+        await asyncio.wait_for(session.done.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        profiler.session = None
+    response = profile_report(session.requests, output)
+    response.headers["X-Profile-Complete"] = str(session.done.is_set()).lower()
+    return response
+
 # Include router in the main app
+# Every API request builds its report pipelines from a recent archive index
 app.include_router(api_router)
 
+app.add_middleware(CompressionMiddleware)
+
+app.add_middleware(ProfilingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -935,6 +3992,141 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def backfill_outlets():
+    """One-time migration: documents written before outlets existed belong to the default outlet."""
+    if await db.migrations.find_one({"id": "outlet_backfill"}):
+        return
+    archives = [
+        archive_collection_name(entry['collection'], entry['month'])
+        for entry in await db.archive_months.find({}, {"_id": 0}).to_list(10000)
+    ]
+    for collection in (*OUTLET_COLLECTIONS, *archives):
+        await db[collection].update_many(
+            {"outlet_id": {"$exists": False}}, {"$set": {"outlet_id": DEFAULT_OUTLET_ID}}
+        )
+    await db.migrations.insert_one({"id": "outlet_backfill", "applied_at": datetime.now(timezone.utc).isoformat()})
+
+@app.on_event("startup")
+async def backfill_versions():
+    """One-time migration: documents written before versioning start at version 1."""
+    if await db.migrations.find_one({"id": "version_backfill"}):
+        return
+    for collection in VERSIONED_COLLECTIONS:
+        await db[collection].update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+    await db.migrations.insert_one({"id": "version_backfill", "applied_at": datetime.now(timezone.utc).isoformat()})
+
+@app.on_event("startup")
+async def backfill_dwell_seconds():
+    """One-time migration: orders completed before dwell_seconds was stored get it from their timestamps."""
+    if await db.migrations.find_one({"id": "dwell_backfill"}):
+        return
+    archives = [
+        archive_collection_name(entry['collection'], entry['month'])
+        for entry in await db.archive_months.find({"collection": "orders"}, {"_id": 0}).to_list(10000)
+    ]
+    for collection in ("orders", *archives):
+        orders = await db[collection].find(
+            {"status": "completed", "completed_at": {"$ne": None}, "dwell_seconds": {"$exists": False}},
+            {"_id": 0, "id": 1, "created_at": 1, "completed_at": 1}
+        ).to_list(None)
+        if orders:
+            await db[collection].bulk_write([
+                UpdateOne({"id": order['id']}, {"$set": {"dwell_seconds": dwell_seconds(order['created_at'], order['completed_at'])}})
+                for order in orders
+            ], ordered=False)
+    await db.migrations.insert_one({"id": "dwell_backfill", "applied_at": datetime.now(timezone.utc).isoformat()})
+
+OUTLET_ID_COLLECTIONS = ("categories", "menu_items", "tables", "users", "ingredients")
+
+@app.on_event("startup")
+async def drop_single_field_indexes():
+    """One-time migration: the compound outlet indexes replace the single-field id/outlet_id ones."""
+    if STORAGE_BACKEND != 'mongo' or await db.migrations.find_one({"id": "outlet_index_cleanup"}):
+        return
+    for collection in OUTLET_ID_COLLECTIONS:
+        for name in ("id_1", "outlet_id_1"):
+            try:
+                await db[collection].drop_index(name)
+            except OperationFailure:
+                pass  # never created
+    await db.migrations.insert_one({"id": "outlet_index_cleanup", "applied_at": datetime.now(timezone.utc).isoformat()})
+
+@app.on_event("startup")
+async def drop_non_unique_indexes():
+    """One-time migration: usernames and per-outlet settings became unique indexes under the same keys."""
+    if STORAGE_BACKEND != 'mongo' or await db.migrations.find_one({"id": "unique_index_upgrade"}):
+        return
+    # Concurrent first reads of the settings could each insert defaults; keep the most edited copy
+    kept = set()
+    async for settings in db.settings.find({}, {"_id": 1, "outlet_id": 1}).sort("version", -1):
+        if settings.get('outlet_id') in kept:
+            await db.settings.delete_one({"_id": settings['_id']})
+        kept.add(settings.get('outlet_id'))
+    for collection, name in (("users", "username_1"), ("settings", "outlet_id_1")):
+        try:
+            await db[collection].drop_index(name)
+        except OperationFailure:
+            pass  # never created
+    await db.migrations.insert_one({"id": "unique_index_upgrade", "applied_at": datetime.now(timezone.utc).isoformat()})
+
+@app.on_event("startup")
+async def create_indexes():
+    for collection in ("orders", "transactions"):
+        await db[collection].create_index("id")
+        await db[collection].create_index([("outlet_id", 1), ("id", 1)], unique=True)
+        await db[collection].create_index("created_at")
+        await db[collection].create_index([("outlet_id", 1), ("created_at", 1)])
+    await db.orders.create_index("status")
+    await db.orders.create_index([("status", 1), ("created_at", 1)])
+    await db.orders.create_index([("outlet_id", 1), ("status", 1), ("created_at", 1)])
+    # Every query on these is scoped to an outlet (outlet_scope), so the outlet leads
+    for collection in OUTLET_ID_COLLECTIONS:
+        await db[collection].create_index([("outlet_id", 1), ("id", 1)], unique=True)
+    # Items that use an ingredient, when it runs out or comes back
+    await db.menu_items.create_index([("outlet_id", 1), ("recipe.ingredient_id", 1)])
+    await db.settings.create_index([("outlet_id", 1)], unique=True)
+    await db.counters.create_index([("outlet_id", 1), ("name", 1)], unique=True)
+    await db.transactions.create_index([("cashier", 1), ("created_at", 1)])
+    await db.shifts.create_index("id")
+    await db.shifts.create_index([("outlet_id", 1), ("username", 1), ("status", 1)])
+    await db.shifts.create_index([("outlet_id", 1), ("opened_at", 1)])
+    await db.users.create_index("username", unique=True)
+    await db.archive_months.create_index([("collection", 1), ("month", 1)])
+    await db.idempotency_keys.create_index("key", unique=True)
+    await db.synced_payments.create_index([("outlet_id", 1), ("id", 1)], unique=True)
+    await db.idempotency_keys.create_index("created_at", expireAfterSeconds=int(IDEMPOTENCY_TTL_HOURS * 3600))
+    await db.outbox.create_index("id")
+    await db.outbox.create_index([("status", 1), ("run_after", 1)])
+    await db.outbox.create_index("finished_at", expireAfterSeconds=int(JOB_RETENTION_HOURS * 3600))
+    await db.report_invalidations.create_index([("outlet_id", 1), ("at", 1)])
+    # Older invalidations can only concern cache entries that have expired anyway
+    await db.report_invalidations.create_index("at", expireAfterSeconds=int(REPORT_CACHE_CLOSED_SECONDS) + 60)
+
+@app.on_event("startup")
+async def start_archival():
+    await load_archive_index()
+    if ARCHIVE_INTERVAL_HOURS > 0:
+        app.state.archival_task = asyncio.create_task(archival_loop())
+
+@app.on_event("startup")
+async def start_export():
+    if pa is not None and EXPORT_INTERVAL_HOURS > 0:
+        app.state.export_task = asyncio.create_task(export_loop())
+
+@app.on_event("startup")
+async def start_job_workers():
+    app.state.job_tasks = [asyncio.create_task(job_worker()) for _ in range(JOB_WORKERS)]
+    app.state.job_tasks.append(asyncio.create_task(job_poller()))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if getattr(app.state, 'archival_task', None):
+        app.state.archival_task.cancel()
+    if getattr(app.state, 'export_task', None):
+        app.state.export_task.cancel()
+    for task in getattr(app.state, 'job_tasks', []):
+        task.cancel()
+    if image_pool is not None:
+        image_pool.shutdown(wait=False, cancel_futures=True)
     client.close()
\ No newline at end of file
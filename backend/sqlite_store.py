@@ -0,0 +1,1028 @@
+"""
+Embedded SQLite storage backend.
+
+Exposes the subset of the Motor API that server.py uses (find, find_one,
+insert_one, update_one, find_one_and_update, delete_one, bulk_write,
+count_documents, create_index and an aggregation subset) on top of a
+single SQLite file in WAL mode.  Leading $match/$unionWith/$unwind/$group/
+$sort/$skip/$limit stages compile to one SQL statement; $lookup/$project
+and anything after them run in Python.  Each collection is a table holding
+one JSON document per row; indexes are expression indexes over
+json_extract so the query planner can use them for the generated WHERE /
+ORDER BY clauses.
+
+Selected with STORAGE_BACKEND=sqlite (see server.py).
+"""
+import asyncio
+import copy
+import json
+import queue
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+# How often a TTL index (expireAfterSeconds) purges expired documents
+TTL_PURGE_INTERVAL_SECONDS = 60
+
+_FIELD_RE = re.compile(r"^[A-Za-z0-9_.]+$")
+_NAME_RE = re.compile(r"^[A-Za-z0-9_]+$")
+
+# Aggregation stages _compile_pipeline translates to SQL
+SQL_STAGES = {"$match", "$unionWith", "$project", "$unwind", "$group", "$sort", "$skip", "$limit"}
+
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class UpdateResult:
+    def __init__(self, matched_count, modified_count, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+
+
+class DeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+class BulkWriteResult:
+    def __init__(self):
+        self.inserted_count = 0
+        self.matched_count = 0
+        self.modified_count = 0
+        self.deleted_count = 0
+        self.upserted_count = 0
+        self.upserted_ids = {}
+
+
+# ==================== JSON / VALUE HELPERS ====================
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _dumps(doc):
+    return json.dumps(doc, default=_json_default, separators=(",", ":"))
+
+
+def _param(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return _dumps(value)
+    return value
+
+
+def _bulk_error(errors, result):
+    """The BulkWriteError pymongo raises when unique indexes rejected some writes (index, exc)."""
+    details = {
+        "writeErrors": [{"index": index, "code": 11000, "errmsg": str(exc)} for index, exc in errors],
+        "writeConcernErrors": [],
+        "nInserted": result.inserted_count, "nUpserted": result.upserted_count,
+        "nMatched": result.matched_count, "nModified": result.modified_count,
+        "nRemoved": result.deleted_count,
+        "upserted": [{"index": index, "_id": _id} for index, _id in result.upserted_ids.items()],
+    }
+    return BulkWriteError(details)
+
+
+def _check_field(path):
+    if not _FIELD_RE.match(path):
+        raise ValueError(f"Unsupported field path for SQLite backend: {path!r}")
+    return path
+
+
+def _get_path(doc, path):
+    current = doc
+    for part in path.split("."):
+        if isinstance(current, dict):
+            current = current.get(part)
+        elif isinstance(current, list) and part.isdigit() and int(part) < len(current):
+            current = current[int(part)]
+        else:
+            return None
+    return current
+
+
+def _set_path(doc, path, value):
+    parts = path.split(".")
+    current = doc
+    for part in parts[:-1]:
+        current = current[int(part)] if isinstance(current, list) else current.setdefault(part, {})
+    if isinstance(current, list):
+        current[int(parts[-1])] = value
+    else:
+        current[parts[-1]] = value
+
+
+def _unset_path(doc, path):
+    parts = path.split(".")
+    current = doc
+    for part in parts[:-1]:
+        current = current.get(part)
+        if not isinstance(current, dict):
+            return
+    current.pop(parts[-1], None)
+
+
+def _matches(value, condition):
+    """Python-side matcher used for $pull conditions."""
+    if isinstance(condition, dict) and isinstance(value, dict):
+        return all(_get_path(value, k) == v for k, v in condition.items())
+    return value == condition
+
+
+# ==================== PROJECTION ====================
+
+def _project_value(value, spec):
+    if isinstance(value, list):
+        return [_project_value(v, spec) for v in value if isinstance(v, dict)]
+    if not isinstance(value, dict):
+        return value
+    out = {}
+    for key, sub in spec.items():
+        if key not in value:
+            continue
+        out[key] = value[key] if sub is True else _project_value(value[key], sub)
+    return out
+
+
+def _apply_projection(doc, projection):
+    if not projection:
+        return doc
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    exclude = {k for k, v in projection.items() if not v and k != "_id"}
+    keep_id = projection.get("_id", 1)
+
+    if include:
+        spec = {}
+        for path in include:
+            parts = path.split(".")
+            node = spec
+            for part in parts[:-1]:
+                child = node.get(part)
+                if child is True:
+                    break
+                node = node.setdefault(part, {})
+            else:
+                node[parts[-1]] = True
+        result = _project_value(doc, spec)
+        if keep_id and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+
+    result = dict(doc)
+    for path in exclude:
+        _unset_path(result, path)
+    if not keep_id:
+        result.pop("_id", None)
+    return result
+
+
+# ==================== QUERY COMPILER ====================
+
+class _Scope:
+    """Resolves "$field" references to SQL expressions.
+
+    After an $unwind, references under the unwound array resolve against the
+    json_each() row instead of the document.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.unwound = None
+
+    def field(self, path):
+        _check_field(path)
+        if self.unwound and (path == self.unwound or path.startswith(self.unwound + ".")):
+            rest = path[len(self.unwound) + 1:]
+            return f"json_extract(u.value, '$.{rest}')" if rest else "u.value"
+        return f"json_extract(doc, '$.{path}')"
+
+
+class _ElementScope(_Scope):
+    """Resolves fields of one array element inside an $elemMatch."""
+
+    def __init__(self, alias):
+        super().__init__(None)
+        self.alias = alias
+
+    def field(self, path):
+        _check_field(path)
+        return f"json_extract({self.alias}.value, '$.{path}')"
+
+
+def _compile_filter(filter_doc, scope):
+    clauses, params = [], []
+    for key, condition in (filter_doc or {}).items():
+        if key in ("$and", "$or"):
+            parts = []
+            for sub in condition:
+                sql, sub_params = _compile_filter(sub, scope)
+                parts.append(f"({sql})")
+                params.extend(sub_params)
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append(f"({joiner.join(parts) or '1'})")
+            continue
+
+        expr = scope.field(key)
+        if isinstance(condition, dict) and "$elemMatch" in condition:
+            sql, sub_params = _compile_filter(condition["$elemMatch"], _ElementScope("e"))
+            clauses.append(f"EXISTS (SELECT 1 FROM json_each({expr}) AS e WHERE {sql})")
+            params.extend(sub_params)
+        elif isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+            for op, value in condition.items():
+                sql, op_params = _compile_operator(expr, op, value)
+                clauses.append(sql)
+                params.extend(op_params)
+        elif condition is None:
+            clauses.append(f"{expr} IS NULL")
+        else:
+            clauses.append(f"{expr} = ?")
+            params.append(_param(condition))
+    return " AND ".join(clauses) or "1", params
+
+
+def _compile_operator(expr, op, value):
+    comparisons = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+    if op in comparisons:
+        return f"{expr} {comparisons[op]} ?", [_param(value)]
+    if op == "$eq":
+        if value is None:
+            return f"{expr} IS NULL", []
+        return f"{expr} = ?", [_param(value)]
+    if op == "$ne":
+        if value is None:
+            return f"{expr} IS NOT NULL", []
+        return f"({expr} IS NULL OR {expr} != ?)", [_param(value)]
+    if op in ("$in", "$nin"):
+        values = [_param(v) for v in value]
+        if not values:
+            return ("0" if op == "$in" else "1"), []
+        marks = ", ".join("?" for _ in values)
+        if op == "$in":
+            return f"{expr} IN ({marks})", values
+        return f"({expr} IS NULL OR {expr} NOT IN ({marks}))", values
+    if op == "$exists":
+        return (f"{expr} IS NOT NULL" if value else f"{expr} IS NULL"), []
+    raise NotImplementedError(f"Query operator {op} is not supported by the SQLite backend")
+
+
+def _compile_expression(expr, scope, params):
+    """Compile an aggregation expression ("$field", literal or operator)."""
+    if isinstance(expr, str) and expr.startswith("$"):
+        return scope.field(expr[1:])
+    if isinstance(expr, (int, float)) and not isinstance(expr, bool):
+        return repr(expr)
+    if isinstance(expr, dict) and len(expr) == 1:
+        op, args = next(iter(expr.items()))
+        if op in ("$substr", "$substrBytes", "$substrCP"):
+            source, start, length = args
+            inner = _compile_expression(source, scope, params)
+            return f"substr({inner}, {int(start) + 1}, {int(length)})"
+        arithmetic = {"$add": "+", "$subtract": "-", "$multiply": "*", "$divide": "/"}
+        if op in arithmetic:
+            parts = [_compile_expression(a, scope, params) for a in args]
+            return "(" + f" {arithmetic[op]} ".join(parts) + ")"
+        if op == "$ifNull":
+            parts = [_compile_expression(a, scope, params) for a in args]
+            return f"COALESCE({', '.join(parts)})"
+    if expr is None or isinstance(expr, (str, bool)):
+        params.append(expr)
+        return "?"
+    raise NotImplementedError(f"Expression {expr!r} is not supported by the SQLite backend")
+
+
+def _order_by(sort_spec, resolve):
+    parts = []
+    for key, direction in sort_spec:
+        parts.append(f"{resolve(key)} {'DESC' if direction < 0 else 'ASC'}")
+    return " ORDER BY " + ", ".join(parts) if parts else ""
+
+
+def _normalize_sort(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return list(key_or_list)
+
+
+# ==================== UPDATE OPERATORS ====================
+
+def _positional(doc, path, filter_doc):
+    """Resolve "array.$.field" to the index of the element the filter's $elemMatch matched."""
+    if ".$" not in path:
+        return path
+    prefix, rest = path.split(".$", 1)
+    condition = (filter_doc or {}).get(prefix)
+    if not (isinstance(condition, dict) and "$elemMatch" in condition):
+        raise NotImplementedError("The positional $ operator needs an $elemMatch on the array in the filter")
+    for index, element in enumerate(_get_path(doc, prefix) or []):
+        if _matches(element, condition["$elemMatch"]):
+            return f"{prefix}.{index}{rest}"
+    raise ValueError(f"No element of {prefix} matches the filter")
+
+
+def _apply_update(doc, update, inserting=False, filter_doc=None):
+    update = {
+        op: {_positional(doc, path, filter_doc): value for path, value in fields.items()}
+        if isinstance(fields, dict) else fields
+        for op, fields in update.items()
+    }
+    for op, fields in update.items():
+        if op == "$set":
+            for path, value in fields.items():
+                _set_path(doc, path, copy.deepcopy(value))
+        elif op == "$setOnInsert":
+            if inserting:
+                for path, value in fields.items():
+                    _set_path(doc, path, copy.deepcopy(value))
+        elif op == "$unset":
+            for path in fields:
+                _unset_path(doc, path)
+        elif op == "$inc":
+            for path, amount in fields.items():
+                _set_path(doc, path, (_get_path(doc, path) or 0) + amount)
+        elif op in ("$min", "$max"):
+            for path, value in fields.items():
+                current = _get_path(doc, path)
+                if current is None or (value < current if op == "$min" else value > current):
+                    _set_path(doc, path, value)
+        elif op in ("$push", "$addToSet"):
+            for path, value in fields.items():
+                values = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                target = _get_path(doc, path)
+                if target is None:
+                    target = []
+                    _set_path(doc, path, target)
+                for v in values:
+                    if op == "$push" or v not in target:
+                        target.append(copy.deepcopy(v))
+        elif op == "$pull":
+            for path, condition in fields.items():
+                target = _get_path(doc, path)
+                if isinstance(target, list):
+                    _set_path(doc, path, [v for v in target if not _matches(v, condition)])
+        else:
+            raise NotImplementedError(f"Update operator {op} is not supported by the SQLite backend")
+    return doc
+
+
+def _upsert_seed(filter_doc):
+    seed = {}
+    for key, value in (filter_doc or {}).items():
+        if key.startswith("$"):
+            continue
+        if isinstance(value, dict) and any(k.startswith("$") for k in value):
+            if "$eq" in value:
+                _set_path(seed, key, value["$eq"])
+            continue
+        _set_path(seed, key, value)
+    return seed
+
+
+# ==================== CONNECTION POOL ====================
+
+class _ConnectionPool:
+    """Fixed-size pool of sqlite3 connections shared by executor threads.
+
+    Readers run concurrently thanks to WAL; writers are serialized through a
+    lock so they never hit SQLITE_BUSY.
+    """
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self._idle = queue.Queue()
+        self._created = 0
+        self._create_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-4096")
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._create_lock:
+            if self._created < self.size:
+                self._created += 1
+                return self._connect()
+        return self._idle.get()
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# ==================== CURSORS ====================
+
+class SQLiteCursor:
+    def __init__(self, collection, filter_doc, projection):
+        self._collection = collection
+        self._filter = filter_doc
+        self._projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    async def to_list(self, length=None):
+        limit = self._limit
+        if length:
+            limit = min(limit, length) if limit else length
+        return await self._collection._find(self._filter, self._projection, self._sort, self._skip, limit)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in await self.to_list(None):
+            yield doc
+
+
+class SQLiteAggregateCursor:
+    def __init__(self, collection, pipeline):
+        self._collection = collection
+        self._pipeline = pipeline
+
+    async def to_list(self, length=None):
+        rows = await self._collection._aggregate(self._pipeline)
+        return rows[:length] if length else rows
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for row in await self.to_list(None):
+            yield row
+
+
+# ==================== COLLECTION / DATABASE / CLIENT ====================
+
+class SQLiteCollection:
+    def __init__(self, database, name):
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Invalid collection name: {name!r}")
+        self.database = database
+        self.name = name
+        self._table = f'"{name}"'
+        self._ready = False
+        self._ttl = None
+        self._ttl_purged_at = 0.0
+
+    def _ensure_table(self, conn):
+        if not self._ready:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self._table} (_id INTEGER PRIMARY KEY, doc TEXT NOT NULL)")
+            self._ready = True
+
+    async def _run(self, fn, write=False):
+        return await self.database.client._run(lambda conn: (self._ensure_table(conn), fn(conn))[1], write)
+
+    @staticmethod
+    def _load(row):
+        doc = json.loads(row[1])
+        doc["_id"] = row[0]
+        return doc
+
+    # ---- reads ----
+
+    def _select(self, conn, filter_doc, sort=None, skip=0, limit=0):
+        where, params = _compile_filter(filter_doc, _Scope(self.name))
+        scope = _Scope(self.name)
+        sql = f"SELECT _id, doc FROM {self._table} WHERE {where}"
+        sql += _order_by(sort or [], lambda k: "_id" if k == "_id" else scope.field(k))
+        if limit or skip:
+            sql += " LIMIT ? OFFSET ?"
+            params = params + [limit or -1, skip]
+        return conn.execute(sql, params).fetchall()
+
+    async def _find(self, filter_doc, projection, sort, skip, limit):
+        rows = await self._run(lambda conn: self._select(conn, filter_doc, sort, skip, limit))
+        return [_apply_projection(self._load(row), projection) for row in rows]
+
+    def find(self, filter=None, projection=None, **kwargs):
+        cursor = SQLiteCursor(self, filter or {}, projection)
+        if kwargs.get("sort"):
+            cursor.sort(kwargs["sort"])
+        return cursor
+
+    async def find_one(self, filter=None, projection=None, **kwargs):
+        sort = _normalize_sort(kwargs["sort"]) if kwargs.get("sort") else []
+        docs = await self._find(filter or {}, projection, sort, 0, 1)
+        return docs[0] if docs else None
+
+    async def count_documents(self, filter=None, **kwargs):
+        where, params = _compile_filter(filter or {}, _Scope(self.name))
+        sql = f"SELECT COUNT(*) FROM {self._table} WHERE {where}"
+        return await self._run(lambda conn: conn.execute(sql, params).fetchone()[0])
+
+    async def estimated_document_count(self):
+        return await self.count_documents({})
+
+    # ---- writes ----
+
+    def _purge_expired(self, conn):
+        """Emulate a Mongo TTL index by deleting expired rows at most once a minute."""
+        if not self._ttl or time.monotonic() - self._ttl_purged_at < TTL_PURGE_INTERVAL_SECONDS:
+            return
+        field, seconds = self._ttl
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=seconds)).isoformat()
+        conn.execute(f"DELETE FROM {self._table} WHERE {_Scope(self.name).field(field)} < ?", (cutoff,))
+        self._ttl_purged_at = time.monotonic()
+
+    async def insert_one(self, document):
+        payload = _dumps({k: v for k, v in document.items() if k != "_id"})
+
+        def op(conn):
+            self._purge_expired(conn)
+            try:
+                return conn.execute(f"INSERT INTO {self._table} (doc) VALUES (?)", (payload,)).lastrowid
+            except sqlite3.IntegrityError as exc:
+                raise DuplicateKeyError(str(exc), 11000)
+
+        inserted_id = await self._run(op, write=True)
+        document.setdefault("_id", inserted_id)
+        return InsertOneResult(inserted_id)
+
+    async def insert_many(self, documents, ordered=True):
+        await self.bulk_write([InsertOne(d) for d in documents], ordered=ordered)
+
+    def _update(self, conn, filter_doc, update, upsert, many):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._select(conn, filter_doc, limit=0 if many else 1)
+            modified = 0
+            for row in rows:
+                doc = json.loads(row[1])
+                new_doc = _apply_update(copy.deepcopy(doc), update, filter_doc=filter_doc)
+                if new_doc != doc:
+                    conn.execute(f"UPDATE {self._table} SET doc = ? WHERE _id = ?", (_dumps(new_doc), row[0]))
+                    modified += 1
+            upserted_id = None
+            if not rows and upsert:
+                doc = _apply_update(_upsert_seed(filter_doc), update, inserting=True)
+                upserted_id = conn.execute(
+                    f"INSERT INTO {self._table} (doc) VALUES (?)", (_dumps(doc),)
+                ).lastrowid
+            conn.execute("COMMIT")
+        except sqlite3.IntegrityError as exc:
+            conn.execute("ROLLBACK")
+            raise DuplicateKeyError(str(exc), 11000)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return UpdateResult(len(rows), modified, upserted_id)
+
+    async def update_one(self, filter, update, upsert=False, **kwargs):
+        return await self._run(lambda conn: self._update(conn, filter, update, upsert, False), write=True)
+
+    async def update_many(self, filter, update, upsert=False, **kwargs):
+        return await self._run(lambda conn: self._update(conn, filter, update, upsert, True), write=True)
+
+    def _find_one_and_update(self, conn, filter_doc, update, projection, sort, return_after, upsert):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._select(conn, filter_doc, sort=sort, limit=1)
+            result = None
+            if rows:
+                doc = self._load(rows[0])
+                new_doc = _apply_update(copy.deepcopy(doc), update, filter_doc=filter_doc)
+                if new_doc != doc:
+                    stored = {k: v for k, v in new_doc.items() if k != "_id"}
+                    conn.execute(f"UPDATE {self._table} SET doc = ? WHERE _id = ?", (_dumps(stored), rows[0][0]))
+                result = new_doc if return_after else doc
+            elif upsert:
+                doc = _apply_update(_upsert_seed(filter_doc), update, inserting=True)
+                doc["_id"] = conn.execute(f"INSERT INTO {self._table} (doc) VALUES (?)", (_dumps(doc),)).lastrowid
+                result = doc if return_after else None
+            conn.execute("COMMIT")
+        except sqlite3.IntegrityError as exc:
+            conn.execute("ROLLBACK")
+            raise DuplicateKeyError(str(exc), 11000)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return _apply_projection(result, projection) if result is not None else None
+
+    async def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                                  return_document=False, **kwargs):
+        """return_document: pymongo's ReturnDocument.BEFORE (False) or AFTER (True)."""
+        sort = _normalize_sort(sort) if sort else []
+        return await self._run(
+            lambda conn: self._find_one_and_update(conn, filter, update, projection, sort, bool(return_document), upsert),
+            write=True
+        )
+
+    def _bulk_write(self, conn, requests, ordered):
+        """
+        Like Mongo, an ordered bulk stops at the first rejected write and keeps
+        the ones before it; an unordered bulk attempts every write.  Each write
+        runs under a savepoint so a rejected one leaves nothing behind.
+        """
+        # pymongo's request classes keep their arguments in private attributes
+        result = BulkWriteResult()
+        errors = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for index, request in enumerate(requests):
+                conn.execute("SAVEPOINT request")
+                try:
+                    self._apply_request(conn, index, request, result)
+                except sqlite3.IntegrityError as exc:
+                    conn.execute("ROLLBACK TO request")
+                    errors.append((index, exc))
+                    if ordered:
+                        break
+                finally:
+                    conn.execute("RELEASE request")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if errors:
+            raise _bulk_error(errors, result)
+        return result
+
+    def _apply_request(self, conn, index, request, result):
+        kind = type(request).__name__
+        if kind == "InsertOne":
+            payload = _dumps({k: v for k, v in request._doc.items() if k != "_id"})
+            conn.execute(f"INSERT INTO {self._table} (doc) VALUES (?)", (payload,))
+            result.inserted_count += 1
+        elif kind in ("UpdateOne", "UpdateMany", "ReplaceOne"):
+            rows = self._select(conn, request._filter, limit=0 if kind == "UpdateMany" else 1)
+            modified = 0
+            for row in rows:
+                doc = json.loads(row[1])
+                if kind == "ReplaceOne":
+                    new_doc = {k: v for k, v in request._doc.items() if k != "_id"}
+                else:
+                    new_doc = _apply_update(copy.deepcopy(doc), request._doc, filter_doc=request._filter)
+                if new_doc != doc:
+                    conn.execute(f"UPDATE {self._table} SET doc = ? WHERE _id = ?", (_dumps(new_doc), row[0]))
+                    modified += 1
+            if not rows and request._upsert:
+                if kind == "ReplaceOne":
+                    doc = {k: v for k, v in request._doc.items() if k != "_id"}
+                else:
+                    doc = _apply_update(_upsert_seed(request._filter), request._doc, inserting=True)
+                result.upserted_ids[index] = conn.execute(
+                    f"INSERT INTO {self._table} (doc) VALUES (?)", (_dumps(doc),)
+                ).lastrowid
+                result.upserted_count += 1
+            # Counted only once the write went through
+            result.matched_count += len(rows)
+            result.modified_count += modified
+        elif kind in ("DeleteOne", "DeleteMany"):
+            result.deleted_count += self._delete(conn, request._filter, kind == "DeleteMany").deleted_count
+        else:
+            raise NotImplementedError(f"Bulk operation {kind} is not supported by the SQLite backend")
+
+    async def bulk_write(self, requests, ordered=True, **kwargs):
+        return await self._run(lambda conn: self._bulk_write(conn, list(requests), ordered), write=True)
+
+    def _delete(self, conn, filter_doc, many):
+        where, params = _compile_filter(filter_doc, _Scope(self.name))
+        if many:
+            sql = f"DELETE FROM {self._table} WHERE {where}"
+        else:
+            sql = f"DELETE FROM {self._table} WHERE _id = (SELECT _id FROM {self._table} WHERE {where} LIMIT 1)"
+        return DeleteResult(conn.execute(sql, params).rowcount)
+
+    async def delete_one(self, filter, **kwargs):
+        return await self._run(lambda conn: self._delete(conn, filter, False), write=True)
+
+    async def delete_many(self, filter, **kwargs):
+        return await self._run(lambda conn: self._delete(conn, filter, True), write=True)
+
+    # ---- indexes ----
+
+    async def create_index(self, keys, unique=False, name=None, expireAfterSeconds=None, **kwargs):
+        keys = _normalize_sort(keys, 1)
+        if expireAfterSeconds is not None:
+            self._ttl = (keys[0][0], expireAfterSeconds)
+        scope = _Scope(self.name)
+        columns = ", ".join(scope.field(k) for k, _ in keys)
+        index_name = name or "_".join(f"{k.replace('.', '_')}_{d}" for k, d in keys)
+        index_name = f"ix_{self.name}_{index_name}".replace("-", "m")
+        sql = (
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS \"{index_name}\" "
+            f"ON {self._table} ({columns})"
+        )
+        await self._run(lambda conn: conn.execute(sql), write=True)
+        return index_name
+
+    # ---- aggregation ----
+
+    def aggregate(self, pipeline, **kwargs):
+        return SQLiteAggregateCursor(self, pipeline)
+
+    def _compile_pipeline(self, pipeline):
+        """Translate a $match/$unionWith/$unwind/$group/$sort/$skip/$limit pipeline to SQL.
+
+        Returns (sql, params, grouped, outputs, arrays, collections) where
+        arrays names the outputs that come back as JSON ($push) and collections
+        lists every table the statement reads.
+        """
+        scope = _Scope(self.name)
+        source = self._table
+        joins, where = "", []
+        select, group_by, outputs, arrays = None, [], [], set()
+        order_by, limit, skip = "", None, None
+        group_keys = {}
+        select_params, source_params, where_params = [], [], []
+        branches = None
+        collections = [self]
+
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == "$match" and select is None:
+                sql, match_params = _compile_filter(spec, scope)
+                where.append(sql)
+                where_params.extend(match_params)
+            elif name == "$unionWith" and select is None and not scope.unwound:
+                # Each branch keeps its own WHERE so the per-table indexes apply.
+                if branches is None:
+                    branches = [(self._table, " AND ".join(where) or "1", where_params)]
+                    where, where_params = [], []
+                spec = {"coll": spec} if isinstance(spec, str) else spec
+                other = self.database[spec["coll"]]
+                collections.append(other)
+                branch_where, branch_params = [], []
+                for sub in spec.get("pipeline", []):
+                    (sub_name, sub_spec), = sub.items()
+                    if sub_name == "$project":
+                        continue
+                    if sub_name != "$match":
+                        raise NotImplementedError("Only $match and $project are supported inside $unionWith by the SQLite backend")
+                    sql, match_params = _compile_filter(sub_spec, _Scope(other.name))
+                    branch_where.append(sql)
+                    branch_params.extend(match_params)
+                branches.append((other._table, " AND ".join(branch_where) or "1", branch_params))
+            elif name == "$project" and select is None:
+                # A $group's SQL reads just the fields it uses; ungrouped rows are projected by the caller
+                continue
+            elif name == "$unwind" and select is None and not scope.unwound:
+                path = spec["path"] if isinstance(spec, dict) else spec
+                path = _check_field(path.lstrip("$"))
+                joins = f", json_each(src.doc, '$.{path}') AS u"
+                scope.unwound = path
+            elif name == "$group" and select is None:
+                key = spec["_id"]
+                columns = []
+                if isinstance(key, dict) and not any(k.startswith("$") for k in key):
+                    for sub, expr in key.items():
+                        sql = _compile_expression(expr, scope, select_params)
+                        alias = f"_id.{sub}"
+                        columns.append(f'{sql} AS "{alias}"')
+                        group_by.append(sql)
+                        group_keys[alias] = f'"{alias}"'
+                        outputs.append(alias)
+                elif key is not None:
+                    sql = _compile_expression(key, scope, select_params)
+                    columns.append(f'{sql} AS "_id"')
+                    group_by.append(sql)
+                    group_keys["_id"] = '"_id"'
+                    outputs.append("_id")
+                for field, accumulator in spec.items():
+                    if field == "_id":
+                        continue
+                    (op, arg), = accumulator.items()
+                    if op == "$sum" and isinstance(arg, (int, float)) and not isinstance(arg, bool):
+                        sql = f"COUNT(*) * {arg!r}" if arg != 1 else "COUNT(*)"
+                    elif op in ("$sum", "$avg", "$min", "$max"):
+                        inner = _compile_expression(arg, scope, select_params)
+                        sql = {"$sum": "COALESCE(SUM({}), 0)", "$avg": "AVG({})",
+                               "$min": "MIN({})", "$max": "MAX({})"}[op].format(inner)
+                    elif op == "$push":
+                        sql = f"json_group_array({_compile_expression(arg, scope, select_params)})"
+                        arrays.add(field)
+                    else:
+                        raise NotImplementedError(f"Accumulator {op} is not supported by the SQLite backend")
+                    columns.append(f'{sql} AS "{field}"')
+                    group_keys[field] = f'"{field}"'
+                    outputs.append(field)
+                if key is None:
+                    # SQL aggregates over no rows still yield one row; Mongo yields none.
+                    columns.append('COUNT(*) AS "__rows"')
+                    outputs.append("__rows")
+                select = ", ".join(columns)
+            elif name == "$sort":
+                if select is None:
+                    order_by = _order_by(_normalize_sort(spec), scope.field)
+                else:
+                    order_by = _order_by(_normalize_sort(spec), lambda k: group_keys[k])
+            elif name == "$skip":
+                skip = int(spec)
+            elif name == "$limit":
+                limit = int(spec)
+            else:
+                raise NotImplementedError(f"Aggregation stage {name} is not supported by the SQLite backend")
+
+        if branches:
+            source = "(" + " UNION ALL ".join(
+                f"SELECT _id, doc FROM {table} WHERE {branch_where}" for table, branch_where, _ in branches
+            ) + ")"
+            for _, _, branch_params in branches:
+                source_params.extend(branch_params)
+
+        sql = f"SELECT {select or 'src._id, src.doc'} FROM {source} AS src{joins}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if group_by:
+            sql += " GROUP BY " + ", ".join(group_by)
+        sql += order_by
+        params = select_params + source_params + where_params
+        if limit is not None or skip is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit if limit is not None else -1, skip or 0])
+        return sql, params, select is not None, outputs, arrays, collections
+
+    def _rows_to_docs(self, rows, grouped, outputs, arrays):
+        if not grouped:
+            return [self._load(row) for row in rows]
+
+        results = []
+        for row in rows:
+            doc = {} if "_id" in outputs or any(a.startswith("_id.") for a in outputs) else {"_id": None}
+            for alias, value in zip(outputs, row):
+                if alias.startswith("_id."):
+                    doc.setdefault("_id", {})[alias[4:]] = value
+                elif alias in arrays:
+                    doc[alias] = json.loads(value)
+                else:
+                    doc[alias] = value
+            if "__rows" in doc and not doc.pop("__rows"):
+                continue
+            results.append(doc)
+        return results
+
+    def _run_tail(self, conn, docs, stages):
+        """Evaluate $lookup/$unwind/$project/$skip/$limit stages in Python.
+
+        Each $lookup is a single batched IN query on the same connection.
+        """
+        for stage in stages:
+            (name, spec), = stage.items()
+            if name == "$lookup":
+                other = self.database[spec["from"]]
+                other._ensure_table(conn)
+                local, foreign = spec["localField"], spec["foreignField"]
+                keys = list({_get_path(d, local) for d in docs if _get_path(d, local) is not None})
+                matches = {}
+                if keys:
+                    for row in other._select(conn, {foreign: {"$in": keys}}):
+                        doc = other._load(row)
+                        matches.setdefault(_get_path(doc, foreign), []).append(doc)
+                for d in docs:
+                    _set_path(d, spec["as"], copy.deepcopy(matches.get(_get_path(d, local), [])))
+            elif name == "$unwind":
+                path = spec["path"] if isinstance(spec, dict) else spec
+                path = path.lstrip("$")
+                keep_empty = isinstance(spec, dict) and spec.get("preserveNullAndEmptyArrays")
+                unwound = []
+                for d in docs:
+                    values = _get_path(d, path)
+                    if not isinstance(values, list):
+                        values = [] if values is None else [values]
+                    if not values and keep_empty:
+                        doc = dict(d)
+                        _unset_path(doc, path)
+                        unwound.append(doc)
+                    for value in values:
+                        doc = dict(d)
+                        _set_path(doc, path, value)
+                        unwound.append(doc)
+                docs = unwound
+            elif name == "$project":
+                docs = [_apply_projection(d, spec) for d in docs]
+            elif name == "$skip":
+                docs = docs[int(spec):]
+            elif name == "$limit":
+                docs = docs[:int(spec)]
+            else:
+                raise NotImplementedError(f"Aggregation stage {name} is not supported after $lookup by the SQLite backend")
+        return docs
+
+    async def _aggregate(self, pipeline):
+        # The SQL prefix runs up to the first $lookup, an $unwind whose rows are
+        # returned as documents, a $project after a $group, or anything the
+        # compiler does not know; the rest runs in Python. $project stages in
+        # the prefix only trim fields, so ungrouped output is projected here.
+        stages = [next(iter(stage)) for stage in pipeline]
+        split = next(
+            (i for i, name in enumerate(stages)
+             if name not in SQL_STAGES
+             or name == "$lookup"
+             or (name == "$unwind" and "$group" not in stages[i + 1:])
+             or (name == "$project" and "$group" in stages[:i])),
+            len(pipeline)
+        )
+        head, tail = pipeline[:split], pipeline[split:]
+        sql, params, grouped, outputs, arrays, collections = self._compile_pipeline(head)
+        projections = [] if grouped else [stage["$project"] for stage in head if "$project" in stage]
+
+        def op(conn):
+            for collection in collections:
+                collection._ensure_table(conn)
+            docs = self._rows_to_docs(conn.execute(sql, params).fetchall(), grouped, outputs, arrays)
+            for spec in projections:
+                docs = [_apply_projection(d, spec) for d in docs]
+            return self._run_tail(conn, docs, tail) if tail else docs
+
+        return await self._run(op)
+
+
+class SQLiteDatabase:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._collections = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = SQLiteCollection(self, name)
+        return self._collections[name]
+
+    async def command(self, name, **kwargs):
+        if name == "ping":
+            return {"ok": 1}
+        raise NotImplementedError(f"Command {name} is not supported by the SQLite backend")
+
+
+class SQLiteClient:
+    """Drop-in replacement for AsyncIOMotorClient backed by one SQLite file."""
+
+    def __init__(self, path, pool_size=4):
+        self._pool = _ConnectionPool(str(path), pool_size)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="sqlite")
+        self._databases = {}
+
+    def __getitem__(self, name):
+        if name not in self._databases:
+            self._databases[name] = SQLiteDatabase(self, name)
+        return self._databases[name]
+
+    def _call(self, fn, write):
+        conn = self._pool.acquire()
+        try:
+            if write:
+                with self._pool.write_lock:
+                    return fn(conn)
+            return fn(conn)
+        finally:
+            self._pool.release(conn)
+
+    async def _run(self, fn, write=False):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, write)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._pool.close()
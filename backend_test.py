@@ -226,6 +226,16 @@ class RestaurantPOSAPITester:
                     headers=headers
                 )
 
+            # Search menu item, with a typo
+            if item_id:
+                self.run_api_test(
+                    "Search Menu Items",
+                    "GET",
+                    "menu-items/search?q=updted",
+                    200,
+                    headers=headers
+                )
+
             # Delete menu item
             if item_id:
                 self.run_api_test(
@@ -380,6 +390,16 @@ class RestaurantPOSAPITester:
             headers=headers
         )
 
+        # Open a shift so the payment lands on its running totals
+        self.run_api_test(
+            "Open Shift",
+            "POST",
+            "shifts/open",
+            200,
+            data={"opening_cash": 100000},
+            headers=headers
+        )
+
         # Create transaction
         if order_id:
             success, transaction = self.run_api_test(
@@ -406,6 +426,34 @@ class RestaurantPOSAPITester:
             headers=headers
         )
 
+        # Get transaction history with embedded orders
+        success, history = self.run_api_test(
+            "Get Transaction History With Orders",
+            "GET",
+            "transactions/history?include_order=true&limit=10",
+            200,
+            headers=headers
+        )
+        if success and isinstance(history, dict):
+            items = history.get('items', [])
+            if items and 'order' in items[0]:
+                self.log_test("Transaction History Embedded Order", True, "Order embedded in history items")
+            else:
+                self.log_test("Transaction History Embedded Order", bool('has_more' in history and not items), "No items or missing order")
+
+        # Close the shift and check the drawer reconciliation
+        success, shift = self.run_api_test(
+            "Close Shift",
+            "POST",
+            "shifts/close",
+            200,
+            data={"counted_cash": 100000 + (total if order_id else 0)},
+            headers=headers
+        )
+        if success and isinstance(shift, dict):
+            self.log_test("Shift Cash Reconciled", shift.get('cash_difference') == 0,
+                          f"Expected {shift.get('expected_cash')}, difference {shift.get('cash_difference')}")
+
     def test_dashboard_stats(self):
         """Test dashboard statistics"""
         print("\n📊 Testing Dashboard Stats...")
@@ -658,6 +706,25 @@ class RestaurantPOSAPITester:
             headers=headers
         )
         
+        # Test ad-hoc group-by over the analytics cache
+        success, group_by = self.run_api_test(
+            "Group-by Report - Item x Payment Method",
+            "GET",
+            f"reports/group-by?from={monday_str}&to={today:%Y-%m-%d}&by=item,payment_method&sort=quantity",
+            200,
+            headers=headers
+        )
+        if success:
+            print(f"   Groups: {group_by.get('groups')} from {group_by.get('rows_scanned')} rows in {group_by.get('elapsed_ms')} ms")
+        
+        success, bad_dimension = self.run_api_test(
+            "Group-by Report - Unknown Dimension",
+            "GET",
+            f"reports/group-by?from={monday_str}&to={today:%Y-%m-%d}&dataset=transactions&by=item",
+            400,
+            headers=headers
+        )
+        
         # Test kasir access to reports (should work)
         if self.kasir_token:
             kasir_headers = {'Authorization': f'Bearer {self.kasir_token}'}
@@ -2,11 +2,26 @@ import React from 'react';
 import { Printer } from 'lucide-react';
 import { Button } from '@/components/ui/button';
 import { toast } from 'sonner';
+import axios from 'axios';
 
 const ReceiptPrint = ({ data }) => {
   const { transaction, order, settings, change } = data;
 
-  const printReceipt = () => {
+  const printReceipt = async () => {
+    // Prefer the server-rendered (and server-cached) ESC/POS receipt
+    if (transaction.id) {
+      try {
+        const response = await axios.get(`/transactions/${transaction.id}/receipt`, {
+          params: { format: 'escpos' },
+          responseType: 'arraybuffer'
+        });
+        printViaBluetooth(new Uint8Array(response.data));
+        return;
+      } catch (error) {
+        console.error('Server receipt unavailable, building locally:', error);
+      }
+    }
+
     // ESC/POS commands for thermal printer
     const ESC = '\x1B';
     const GS = '\x1D';
@@ -90,8 +105,7 @@ const ReceiptPrint = ({ data }) => {
       const characteristic = await service.getCharacteristic('00002af1-0000-1000-8000-00805f9b34fb');
 
       // Convert string to bytes
-      const encoder = new TextEncoder();
-      const bytes = encoder.encode(data);
+      const bytes = typeof data === 'string' ? new TextEncoder().encode(data) : data;
       
       // Send data in chunks
       const chunkSize = 20;
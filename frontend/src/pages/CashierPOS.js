@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import { toast } from 'sonner';
 import CashierLayout from '@/components/CashierLayout';
@@ -10,12 +10,21 @@ import { ScrollArea } from '@/components/ui/scroll-area';
 import { ShoppingCart, Plus, Minus, Trash2, CreditCard, DollarSign, Printer } from 'lucide-react';
 import ReceiptPrint from '@/components/ReceiptPrint';
 
+// Checkouts made while the uplink is down are queued here and pushed to
+// /sync/batch in one request when the terminal is back online.
+const SYNC_QUEUE_KEY = 'pos_sync_queue';
+const loadSyncQueue = () => JSON.parse(localStorage.getItem(SYNC_QUEUE_KEY) || '[]');
+const saveSyncQueue = (queue) => localStorage.setItem(SYNC_QUEUE_KEY, JSON.stringify(queue));
+const entryId = (entry) => (entry.payment || entry.order).id;
+
 const CashierPOS = ({ user, onLogout }) => {
   const [categories, setCategories] = useState([]);
   const [menuItems, setMenuItems] = useState([]);
   const [tables, setTables] = useState([]);
   const [cart, setCart] = useState([]);
   const [selectedCategory, setSelectedCategory] = useState('all');
+  const [searchQuery, setSearchQuery] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
   const [orderType, setOrderType] = useState('dine-in');
   const [selectedTable, setSelectedTable] = useState(null);
   const [showPayment, setShowPayment] = useState(false);
@@ -24,17 +33,70 @@ const CashierPOS = ({ user, onLogout }) => {
   const [settings, setSettings] = useState(null);
   const [receiptData, setReceiptData] = useState(null);
   const [showReceipt, setShowReceipt] = useState(false);
+  // One Idempotency-Key per checkout, so pressing "Bayar" again after a
+  // failed attempt cannot create a second order or payment
+  const checkoutKey = useRef(null);
 
   useEffect(() => {
     fetchData();
+    flushSyncQueue();
+    window.addEventListener('online', flushSyncQueue);
+    return () => window.removeEventListener('online', flushSyncQueue);
   }, []);
 
+  useEffect(() => {
+    if (!searchQuery.trim()) {
+      setSearchResults(null);
+      return;
+    }
+    const timer = setTimeout(searchMenu, 150);
+    return () => clearTimeout(timer);
+  }, [searchQuery, selectedCategory]);
+
+  const searchMenu = async () => {
+    try {
+      const response = await axios.get('/menu-items/search', {
+        params: {
+          q: searchQuery,
+          category_id: selectedCategory === 'all' ? undefined : selectedCategory,
+          limit: 100
+        }
+      });
+      setSearchResults(response.data);
+    } catch (error) {
+      // Offline: fall back to matching the names already loaded
+      const query = searchQuery.toLowerCase();
+      setSearchResults(menuItems.filter(item =>
+        item.name.toLowerCase().includes(query) &&
+        (selectedCategory === 'all' || item.category_id === selectedCategory)
+      ));
+    }
+  };
+
+  const flushSyncQueue = async () => {
+    const queue = loadSyncQueue();
+    if (queue.length === 0) return;
+    try {
+      const response = await axios.post('/sync/batch', { entries: queue });
+      const sent = new Set(queue.map(entryId));
+      saveSyncQueue(loadSyncQueue().filter(entry => !sent.has(entryId(entry))));
+      if (response.data.applied > 0) {
+        toast.success(`${response.data.applied} transaksi offline berhasil disinkronkan`);
+      }
+      if (response.data.errors > 0) {
+        console.error('Offline sync errors:', response.data.results.filter(r => r.status === 'error'));
+      }
+    } catch (error) {
+      // Still offline; retried on the next 'online' event
+    }
+  };
+
   const fetchData = async () => {
     try {
       const [categoriesRes, menuRes, tablesRes, settingsRes] = await Promise.all([
         axios.get('/categories'),
-        axios.get('/menu-items'),
-        axios.get('/tables'),
+        axios.get('/menu-items/search', { params: { limit: 1000 } }),
+        axios.get('/tables', { params: { fields: 'table_number,capacity,status' } }),
         axios.get('/settings')
       ]);
       setCategories(categoriesRes.data);
@@ -97,6 +159,7 @@ const CashierPOS = ({ user, onLogout }) => {
       toast.error('Pilih meja terlebih dahulu!');
       return;
     }
+    checkoutKey.current = crypto.randomUUID();
     setShowPayment(true);
   };
 
@@ -109,19 +172,23 @@ const CashierPOS = ({ user, onLogout }) => {
       return;
     }
 
+    // Create order
+    const orderData = {
+      table_id: selectedTable?.id || null,
+      table_number: selectedTable?.table_number || null,
+      order_type: orderType,
+      items: cart,
+      subtotal,
+      tax,
+      total
+    };
+    let createdOrder = null;
+
     try {
-      // Create order
-      const orderData = {
-        table_id: selectedTable?.id || null,
-        table_number: selectedTable?.table_number || null,
-        order_type: orderType,
-        items: cart,
-        subtotal,
-        tax,
-        total
-      };
-      
-      const orderRes = await axios.post('/orders', orderData);
+      const orderRes = await axios.post('/orders', orderData, {
+        headers: { 'Idempotency-Key': `${checkoutKey.current}:order` }
+      });
+      createdOrder = orderRes.data;
       
       // Create transaction
       const transactionData = {
@@ -132,7 +199,9 @@ const CashierPOS = ({ user, onLogout }) => {
         total
       };
       
-      const transRes = await axios.post('/transactions', transactionData);
+      const transRes = await axios.post('/transactions', transactionData, {
+        headers: { 'Idempotency-Key': `${checkoutKey.current}:payment` }
+      });
       
       // Prepare receipt data
       setReceiptData({
@@ -143,22 +212,54 @@ const CashierPOS = ({ user, onLogout }) => {
       });
       
       toast.success('Pembayaran berhasil!');
-      setShowPayment(false);
-      setShowReceipt(true);
-      
-      // Reset
-      setCart([]);
-      setSelectedTable(null);
-      setAmountPaid('');
+      resetCheckout();
       fetchData();
     } catch (error) {
+      if (!error.response) {
+        queueOfflineCheckout(orderData, createdOrder, paid, total);
+        return;
+      }
       toast.error('Pembayaran gagal!');
     }
   };
 
-  const filteredItems = selectedCategory === 'all' 
-    ? menuItems.filter(item => item.available)
-    : menuItems.filter(item => item.category_id === selectedCategory && item.available);
+  const queueOfflineCheckout = (orderData, createdOrder, paid, total) => {
+    const now = new Date().toISOString();
+    const payment = {
+      id: crypto.randomUUID(),
+      payment_method: paymentMethod,
+      amount_paid: paid,
+      change_amount: paid - total,
+      total,
+      created_at: now
+    };
+    // If the order already reached the server, only the payment is queued
+    const entry = createdOrder
+      ? { payment: { ...payment, order_id: createdOrder.id } }
+      : { order: { ...orderData, id: crypto.randomUUID(), created_at: now }, payment };
+    saveSyncQueue([...loadSyncQueue(), entry]);
+
+    setReceiptData({
+      transaction: { ...payment, transaction_number: 'OFFLINE', cashier: user.full_name },
+      order: createdOrder || { ...entry.order, order_number: 'OFFLINE' },
+      settings: settings,
+      change: paid - total
+    });
+    toast.warning('Koneksi terputus. Transaksi disimpan dan akan disinkronkan otomatis.');
+    resetCheckout();
+  };
+
+  const resetCheckout = () => {
+    setShowPayment(false);
+    setShowReceipt(true);
+    setCart([]);
+    setSelectedTable(null);
+    setAmountPaid('');
+  };
+
+  const filteredItems = searchResults || (selectedCategory === 'all'
+    ? menuItems
+    : menuItems.filter(item => item.category_id === selectedCategory));
 
   const { subtotal, tax, total } = calculateTotals();
   const changeAmount = amountPaid ? parseFloat(amountPaid) - total : 0;
@@ -212,8 +313,15 @@ const CashierPOS = ({ user, onLogout }) => {
             </div>
           </div>
 
-          {/* Category Filter */}
-          <div className="soft-card rounded-2xl p-4">
+          {/* Search & Category Filter */}
+          <div className="soft-card rounded-2xl p-4 space-y-3">
+            <Input
+              placeholder="Cari menu..."
+              value={searchQuery}
+              onChange={(e) => setSearchQuery(e.target.value)}
+              className="rounded-xl h-11"
+              data-testid="menu-search-input"
+            />
             <div className="flex gap-2 overflow-x-auto">
               <Button
                 onClick={() => setSelectedCategory('all')}
@@ -238,7 +346,7 @@ const CashierPOS = ({ user, onLogout }) => {
           </div>
 
           {/* Menu Items */}
-          <ScrollArea className="h-[calc(100vh-360px)]">
+          <ScrollArea className="h-[calc(100vh-420px)]">
             <div className="grid grid-cols-2 md:grid-cols-3 gap-4">
               {filteredItems.map(item => (
                 <div
@@ -247,8 +355,20 @@ const CashierPOS = ({ user, onLogout }) => {
                   className="soft-card rounded-2xl p-4 cursor-pointer hover:shadow-lg transition-all"
                   data-testid={`menu-item-${item.id}`}
                 >
-                  <div className="aspect-square rounded-xl bg-gradient-to-br from-teal-100 to-cyan-100 mb-3 flex items-center justify-center">
-                    <ShoppingCart className="w-12 h-12 text-teal-600" />
+                  <div className="aspect-square rounded-xl bg-gradient-to-br from-teal-100 to-cyan-100 mb-3 flex items-center justify-center overflow-hidden">
+                    {item.thumbnail_url ? (
+                      <img
+                        src={`${process.env.REACT_APP_BACKEND_URL}${item.thumbnail_url}`}
+                        alt={item.name}
+                        width={160}
+                        height={160}
+                        loading="lazy"
+                        decoding="async"
+                        className="w-full h-full object-cover"
+                      />
+                    ) : (
+                      <ShoppingCart className="w-12 h-12 text-teal-600" />
+                    )}
                   </div>
                   <h3 className="font-semibold text-gray-800 mb-1">{item.name}</h3>
                   <p className="text-lg font-bold text-teal-600">
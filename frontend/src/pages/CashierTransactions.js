@@ -49,11 +49,12 @@ function CashierTransactions({ user, onLogout }) {
     setLoading(true);
     try {
       const token = localStorage.getItem('token');
-      const response = await axios.get(`${API_URL}/api/transactions`, {
-        headers: { Authorization: `Bearer ${token}` }
+      const response = await axios.get(`${API_URL}/api/transactions/history`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { include_order: true, limit: 500 }
       });
-      setTransactions(response.data);
-      setFilteredTransactions(response.data);
+      setTransactions(response.data.items);
+      setFilteredTransactions(response.data.items);
     } catch (error) {
       console.error('Error fetching transactions:', error);
       if (error.response?.status === 401) {
@@ -100,14 +101,19 @@ function CashierTransactions({ user, onLogout }) {
 
   const handleViewReceipt = async (transaction) => {
     try {
-      const token = localStorage.getItem('token');
-      const orderResponse = await axios.get(`${API_URL}/api/orders/${transaction.order_id}`, {
-        headers: { Authorization: `Bearer ${token}` }
-      });
+      // The history endpoint embeds the order; only fall back to a fetch if it is missing
+      let order = transaction.order;
+      if (!order) {
+        const token = localStorage.getItem('token');
+        const orderResponse = await axios.get(`${API_URL}/api/orders/${transaction.order_id}`, {
+          headers: { Authorization: `Bearer ${token}` }
+        });
+        order = orderResponse.data;
+      }
 
       setSelectedTransaction({
         transaction,
-        order: orderResponse.data
+        order
       });
       setShowReceipt(true);
     } catch (error) {
@@ -16,12 +16,14 @@ const MenuManagement = ({ user, onLogout }) => {
   const [showItemDialog, setShowItemDialog] = useState(false);
   const [editingCategory, setEditingCategory] = useState(null);
   const [editingItem, setEditingItem] = useState(null);
+  const [imageFile, setImageFile] = useState(null);
   const [categoryForm, setCategoryForm] = useState({ name: '', description: '' });
   const [itemForm, setItemForm] = useState({
     name: '',
     category_id: '',
     price: '',
     description: '',
+    stock: '',
     available: true
   });
 
@@ -45,7 +47,7 @@ const MenuManagement = ({ user, onLogout }) => {
   const handleSaveCategory = async () => {
     try {
       if (editingCategory) {
-        await axios.put(`/categories/${editingCategory.id}`, categoryForm);
+        await axios.put(`/categories/${editingCategory.id}`, { ...categoryForm, version: editingCategory.version });
         toast.success('Kategori berhasil diupdate');
       } else {
         await axios.post('/categories', categoryForm);
@@ -56,7 +58,12 @@ const MenuManagement = ({ user, onLogout }) => {
       setEditingCategory(null);
       fetchData();
     } catch (error) {
-      toast.error('Gagal menyimpan kategori');
+      if (error.response?.status === 409) {
+        toast.error('Kategori sudah diubah di layar lain, data dimuat ulang');
+        fetchData();
+      } else {
+        toast.error('Gagal menyimpan kategori');
+      }
     }
   };
 
@@ -75,22 +82,36 @@ const MenuManagement = ({ user, onLogout }) => {
     try {
       const data = {
         ...itemForm,
-        price: parseFloat(itemForm.price)
+        price: parseFloat(itemForm.price),
+        // An empty stock field means the item's stock is not tracked
+        stock: itemForm.stock === '' ? null : parseFloat(itemForm.stock)
       };
       
+      let itemId = editingItem?.id;
       if (editingItem) {
-        await axios.put(`/menu-items/${editingItem.id}`, data);
-        toast.success('Item berhasil diupdate');
+        await axios.put(`/menu-items/${editingItem.id}`, { ...data, version: editingItem.version });
       } else {
-        await axios.post('/menu-items', data);
-        toast.success('Item berhasil ditambahkan');
+        const response = await axios.post('/menu-items', data);
+        itemId = response.data.id;
       }
+      if (imageFile) {
+        const upload = new FormData();
+        upload.append('file', imageFile);
+        await axios.post(`/menu-items/${itemId}/image`, upload);
+      }
+      toast.success(editingItem ? 'Item berhasil diupdate' : 'Item berhasil ditambahkan');
       setShowItemDialog(false);
-      setItemForm({ name: '', category_id: '', price: '', description: '', available: true });
+      setItemForm({ name: '', category_id: '', price: '', description: '', stock: '', available: true });
       setEditingItem(null);
+      setImageFile(null);
       fetchData();
     } catch (error) {
-      toast.error('Gagal menyimpan item');
+      if (error.response?.status === 409) {
+        toast.error('Item sudah diubah di layar lain, data dimuat ulang');
+        fetchData();
+      } else {
+        toast.error('Gagal menyimpan item');
+      }
     }
   };
 
@@ -118,8 +139,10 @@ const MenuManagement = ({ user, onLogout }) => {
       category_id: item.category_id,
       price: item.price.toString(),
       description: item.description || '',
+      stock: item.stock === null || item.stock === undefined ? '' : item.stock.toString(),
       available: item.available
     });
+    setImageFile(null);
     setShowItemDialog(true);
   };
 
@@ -197,7 +220,8 @@ const MenuManagement = ({ user, onLogout }) => {
             <Button
               onClick={() => {
                 setEditingItem(null);
-                setItemForm({ name: '', category_id: '', price: '', description: '', available: true });
+                setItemForm({ name: '', category_id: '', price: '', description: '', stock: '', available: true });
+                setImageFile(null);
                 setShowItemDialog(true);
               }}
               className="rounded-xl bg-gradient-to-r from-teal-500 to-cyan-500 hover:from-teal-600 hover:to-cyan-600"
@@ -255,6 +279,14 @@ const MenuManagement = ({ user, onLogout }) => {
                         {item.available ? 'Tersedia' : 'Tidak Tersedia'}
                       </span>
                     </div>
+                    {item.stock !== null && item.stock !== undefined && (
+                      <div className="flex justify-between items-center">
+                        <span className="text-sm text-gray-600">Stok:</span>
+                        <span className={`font-semibold ${item.stock > 0 ? 'text-gray-800' : 'text-red-600'}`}>
+                          {item.stock.toLocaleString('id-ID')}
+                        </span>
+                      </div>
+                    )}
                   </div>
                 </div>
               );
@@ -350,6 +382,27 @@ const MenuManagement = ({ user, onLogout }) => {
                 data-testid="item-description-input"
               />
             </div>
+            <div>
+              <Label>Stok</Label>
+              <Input
+                type="number"
+                value={itemForm.stock}
+                onChange={(e) => setItemForm({ ...itemForm, stock: e.target.value })}
+                placeholder="Kosongkan jika stok tidak dilacak"
+                className="rounded-xl mt-2"
+                data-testid="item-stock-input"
+              />
+            </div>
+            <div>
+              <Label>Gambar</Label>
+              <Input
+                type="file"
+                accept="image/*"
+                onChange={(e) => setImageFile(e.target.files[0] || null)}
+                className="rounded-xl mt-2"
+                data-testid="item-image-input"
+              />
+            </div>
             <div className="flex items-center gap-2">
               <input
                 type="checkbox"
@@ -29,7 +29,8 @@ const Settings = ({ user, onLogout }) => {
         address: response.data.address,
         phone: response.data.phone,
         tax_percentage: response.data.tax_percentage.toString(),
-        logo_url: response.data.logo_url || ''
+        logo_url: response.data.logo_url || '',
+        version: response.data.version
       });
     } catch (error) {
       toast.error('Gagal memuat pengaturan');
@@ -44,10 +45,16 @@ const Settings = ({ user, onLogout }) => {
         ...form,
         tax_percentage: parseFloat(form.tax_percentage)
       };
-      await axios.put('/settings', data);
+      const response = await axios.put('/settings', data);
+      setForm({ ...form, version: response.data.version });
       toast.success('Pengaturan berhasil disimpan');
     } catch (error) {
-      toast.error('Gagal menyimpan pengaturan');
+      if (error.response?.status === 409) {
+        toast.error('Pengaturan sudah diubah di layar lain, data dimuat ulang');
+        fetchSettings();
+      } else {
+        toast.error('Gagal menyimpan pengaturan');
+      }
     }
   };
 
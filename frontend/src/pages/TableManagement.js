@@ -40,7 +40,7 @@ const TableManagement = ({ user, onLogout }) => {
       };
       
       if (editingTable) {
-        await axios.put(`/tables/${editingTable.id}`, data);
+        await axios.put(`/tables/${editingTable.id}`, { ...data, version: editingTable.version });
         toast.success('Meja berhasil diupdate');
       } else {
         await axios.post('/tables', data);
@@ -51,7 +51,12 @@ const TableManagement = ({ user, onLogout }) => {
       setEditingTable(null);
       fetchTables();
     } catch (error) {
-      toast.error('Gagal menyimpan meja');
+      if (error.response?.status === 409) {
+        toast.error('Meja sudah diubah di layar lain, data dimuat ulang');
+        fetchTables();
+      } else {
+        toast.error('Gagal menyimpan meja');
+      }
     }
   };
 
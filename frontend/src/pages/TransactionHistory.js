@@ -7,9 +7,11 @@ import { Receipt, Eye } from 'lucide-react';
 import AdminLayout from '@/components/AdminLayout';
 import { Button } from '@/components/ui/button';
 
+const PAGE_SIZE = 100;
+
 const TransactionHistory = ({ user, onLogout }) => {
   const [transactions, setTransactions] = useState([]);
-  const [orders, setOrders] = useState([]);
+  const [hasMore, setHasMore] = useState(false);
   const [selectedTransaction, setSelectedTransaction] = useState(null);
   const [showDetail, setShowDetail] = useState(false);
   const [loading, setLoading] = useState(true);
@@ -18,14 +20,13 @@ const TransactionHistory = ({ user, onLogout }) => {
     fetchData();
   }, []);
 
-  const fetchData = async () => {
+  const fetchData = async (skip = 0) => {
     try {
-      const [transRes, ordersRes] = await Promise.all([
-        axios.get('/transactions'),
-        axios.get('/orders')
-      ]);
-      setTransactions(transRes.data);
-      setOrders(ordersRes.data);
+      const response = await axios.get('/transactions/history', {
+        params: { include_order: true, skip, limit: PAGE_SIZE }
+      });
+      setTransactions(prev => (skip ? [...prev, ...response.data.items] : response.data.items));
+      setHasMore(response.data.has_more);
     } catch (error) {
       toast.error('Gagal memuat data transaksi');
     } finally {
@@ -34,8 +35,7 @@ const TransactionHistory = ({ user, onLogout }) => {
   };
 
   const viewDetail = (transaction) => {
-    const order = orders.find(o => o.id === transaction.order_id);
-    setSelectedTransaction({ ...transaction, order });
+    setSelectedTransaction(transaction);
     setShowDetail(true);
   };
 
@@ -61,7 +61,7 @@ const TransactionHistory = ({ user, onLogout }) => {
           <ScrollArea className="h-[calc(100vh-250px)]">
             <div className="space-y-3">
               {transactions.map(trans => {
-                const order = orders.find(o => o.id === trans.order_id);
+                const order = trans.order;
                 return (
                   <div
                     key={trans.id}
@@ -115,6 +115,13 @@ const TransactionHistory = ({ user, onLogout }) => {
                   <p className="text-gray-500">Belum ada transaksi</p>
                 </div>
               )}
+              {hasMore && (
+                <div className="text-center pt-2">
+                  <Button variant="outline" onClick={() => fetchData(transactions.length)} data-testid="load-more-transactions">
+                    Muat lebih banyak
+                  </Button>
+                </div>
+              )}
             </div>
           </ScrollArea>
         </div>
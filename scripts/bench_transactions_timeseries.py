@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Compare the regular and time-series layouts of transactions.
+
+Generates the same synthetic transactions into a regular collection (with the
+server's indexes) and a time-series collection (ts/meta as written with
+TRANSACTIONS_TIMESERIES=true) in a scratch database, then prints storage
+size and the latency of the range-report aggregation (revenue per day and
+payment method, as in /reports/range) for several range lengths.
+
+Usage:
+    python scripts/bench_transactions_timeseries.py --docs 1000000 --days 365
+
+Needs MongoDB 7.0+ at MONGO_URL. The scratch database is dropped afterwards
+unless --keep is given.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import MongoClient
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+BENCH_DB = 'kasir_timeseries_bench'
+PAYMENT_METHODS = ("cash", "debit", "credit")
+CASHIERS = ("Kasir Satu", "Kasir Dua", "Kasir Tiga", "Kasir Empat")
+RANGES_DAYS = (1, 7, 30, 90, 365)
+
+
+def generate(count, days, outlets, end):
+    start = end - timedelta(days=days)
+    step = (end - start) / count
+    for n in range(count):
+        created_at = start + step * n + timedelta(seconds=random.random())
+        total = float(random.randrange(10, 500) * 1000)
+        yield {
+            "id": str(uuid.uuid4()),
+            "transaction_number": f"TRX-{created_at.strftime('%Y%m%d')}-{n + 1:04d}",
+            "order_id": str(uuid.uuid4()),
+            "payment_method": random.choice(PAYMENT_METHODS),
+            "amount_paid": total,
+            "change_amount": 0.0,
+            "total": total,
+            "cashier": random.choice(CASHIERS),
+            "outlet_id": f"outlet-{n % outlets}",
+            "created_at": created_at.isoformat()
+        }
+
+
+def load(db, args, end):
+    regular = db.regular
+    for keys in ("id", "created_at", [("outlet_id", 1), ("created_at", 1)], [("cashier", 1), ("created_at", 1)]):
+        regular.create_index(keys)
+    db.create_collection("timeseries", timeseries={"timeField": "ts", "metaField": "meta", "granularity": "minutes"})
+    timeseries = db.timeseries
+    for keys in ("id", "created_at", [("outlet_id", 1), ("created_at", 1)], [("cashier", 1), ("created_at", 1)]):
+        timeseries.create_index(keys)
+
+    batch = []
+    for doc in generate(args.docs, args.days, args.outlets, end):
+        batch.append(doc)
+        if len(batch) == args.batch_size:
+            insert(regular, timeseries, batch)
+            batch = []
+    if batch:
+        insert(regular, timeseries, batch)
+
+
+def insert(regular, timeseries, batch):
+    regular.insert_many([dict(doc) for doc in batch], ordered=False)
+    timeseries.insert_many([
+        {**doc, "ts": datetime.fromisoformat(doc['created_at']),
+         "meta": {"outlet_id": doc['outlet_id'], "payment_method": doc['payment_method'], "cashier": doc['cashier']}}
+        for doc in batch
+    ], ordered=False)
+
+
+def storage(collection):
+    stats = next(collection.aggregate([{"$collStats": {"storageStats": {}}}]))['storageStats']
+    return stats.get('storageSize', 0), stats.get('totalIndexSize', 0)
+
+
+def report_pipeline(start, end, outlet_id, timeseries):
+    stages = []
+    if timeseries:
+        stages.append({"$match": {"ts": {"$gte": start, "$lt": end}, "meta.outlet_id": outlet_id}})
+    stages += [
+        {"$match": {"outlet_id": outlet_id, "created_at": {"$gte": start.isoformat(), "$lt": end.isoformat()}}},
+        {"$project": {"_id": 0, "created_at": 1, "total": 1, "payment_method": 1}},
+        {"$group": {
+            "_id": {"bucket": {"$substr": ["$created_at", 0, 10]}, "method": "$payment_method"},
+            "revenue": {"$sum": "$total"},
+            "transactions": {"$sum": 1}
+        }}
+    ]
+    return stages
+
+
+def latency_ms(collection, pipeline, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        list(collection.aggregate(pipeline))
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--docs', type=int, default=200000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--outlets', type=int, default=3)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--keep', action='store_true', help="keep the scratch database")
+    args = parser.parse_args()
+
+    client = MongoClient(MONGO_URL)
+    client.drop_database(BENCH_DB)
+    db = client[BENCH_DB]
+    end = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    print(f"Loading {args.docs} transactions over {args.days} days...")
+    load(db, args, end)
+
+    print("")
+    print("| layout | storage MB | index MB |")
+    print("|---|---|---|")
+    for name in ("regular", "timeseries"):
+        data, index = storage(db[name])
+        print(f"| {name} | {data / 2**20:.1f} | {index / 2**20:.1f} |")
+
+    print("")
+    print(f"Range report, median of {args.runs} runs (ms)")
+    print("| range | regular | timeseries |")
+    print("|---|---|---|")
+    for days in RANGES_DAYS:
+        if days > args.days:
+            continue
+        start = end - timedelta(days=days)
+        regular = latency_ms(db.regular, report_pipeline(start, end, "outlet-0", False), args.runs)
+        timeseries = latency_ms(db.timeseries, report_pipeline(start, end, "outlet-0", True), args.runs)
+        print(f"| {days}d | {regular:.1f} | {timeseries:.1f} |")
+
+    if not args.keep:
+        client.drop_database(BENCH_DB)
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
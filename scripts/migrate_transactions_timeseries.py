@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Move the transactions collection to a MongoDB time-series collection (or back).
+
+Stop the API servers first, run this script, then start them again with
+TRANSACTIONS_TIMESERIES=true. The current collection is renamed to
+transactions_pre_timeseries and copied into a new time-series transactions
+collection in _id order, adding the ts/meta fields the server writes. An
+interrupted run can simply be started again; it resumes after the last
+copied document. The old collection is kept for --rollback until it is
+dropped with --drop-legacy.
+
+Usage:
+    python scripts/migrate_transactions_timeseries.py
+    python scripts/migrate_transactions_timeseries.py --rollback
+    python scripts/migrate_transactions_timeseries.py --drop-legacy
+
+MONGO_URL and DB_NAME are read from the environment (see backend/env.txt).
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from pymongo import MongoClient
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'kasir_restoran')
+LEGACY = 'transactions_pre_timeseries'
+TIMESERIES_OPTIONS = {
+    "timeField": "ts",
+    "metaField": "meta",
+    "granularity": os.environ.get('TRANSACTIONS_TIMESERIES_GRANULARITY', 'minutes')
+}
+
+
+def collection_type(db, name):
+    info = list(db.list_collections(filter={"name": name}))
+    return info[0].get("type", "collection") if info else None
+
+
+def with_timeseries_fields(doc):
+    doc['ts'] = datetime.fromisoformat(doc['created_at'])
+    doc['meta'] = {
+        "outlet_id": doc.get('outlet_id'),
+        "payment_method": doc.get('payment_method'),
+        "cashier": doc.get('cashier')
+    }
+    return doc
+
+
+def migrate(db, batch_size):
+    current = collection_type(db, 'transactions')
+    if current == 'timeseries' and collection_type(db, LEGACY) is None:
+        print("✓ transactions is already a time-series collection")
+        return
+    if current == 'collection':
+        if collection_type(db, LEGACY) is not None:
+            sys.exit(f"✗ Both transactions and {LEGACY} exist as regular collections; resolve by hand")
+        db.transactions.rename(LEGACY)
+        print(f"✓ Renamed transactions to {LEGACY}")
+    if collection_type(db, 'transactions') is None:
+        db.create_collection('transactions', timeseries=TIMESERIES_OPTIONS)
+        print("✓ Created time-series collection transactions")
+
+    # Resume after the last document already copied
+    last = list(db.transactions.aggregate([{"$group": {"_id": None, "last": {"$max": "$_id"}}}]))
+    query = {"_id": {"$gt": last[0]['last']}} if last else {}
+    copied = 0
+    batch = []
+    for doc in db[LEGACY].find(query).sort("_id", 1).batch_size(batch_size):
+        batch.append(with_timeseries_fields(doc))
+        if len(batch) == batch_size:
+            db.transactions.insert_many(batch, ordered=True)
+            copied += len(batch)
+            batch = []
+            print(f"  copied {copied}")
+    if batch:
+        db.transactions.insert_many(batch, ordered=True)
+        copied += len(batch)
+
+    legacy_count = db[LEGACY].count_documents({})
+    new_count = db.transactions.count_documents({})
+    print(f"✓ Copied {copied} documents ({new_count} in transactions, {legacy_count} in {LEGACY})")
+    if new_count != legacy_count:
+        sys.exit("✗ Counts differ; re-run the script before starting the servers")
+    print("Start the servers with TRANSACTIONS_TIMESERIES=true.")
+
+
+def rollback(db, batch_size):
+    if collection_type(db, LEGACY) is None:
+        sys.exit(f"✗ {LEGACY} not found; nothing to roll back to")
+    if collection_type(db, 'transactions') == 'timeseries':
+        # Keep transactions written since the migration
+        known = set(db[LEGACY].distinct("id"))
+        batch = []
+        restored = 0
+        for doc in db.transactions.find({}, {"ts": 0, "meta": 0}).batch_size(batch_size):
+            if doc['id'] in known:
+                continue
+            doc.pop('_id', None)
+            batch.append(doc)
+            if len(batch) == batch_size:
+                db[LEGACY].insert_many(batch)
+                restored += len(batch)
+                batch = []
+        if batch:
+            db[LEGACY].insert_many(batch)
+            restored += len(batch)
+        print(f"✓ Carried {restored} newer transactions back")
+        db.transactions.drop()
+    db[LEGACY].rename('transactions')
+    print("✓ transactions is a regular collection again; start the servers without TRANSACTIONS_TIMESERIES.")
+
+
+def drop_legacy(db):
+    if collection_type(db, 'transactions') != 'timeseries':
+        sys.exit("✗ transactions is not a time-series collection; refusing to drop the legacy copy")
+    db[LEGACY].drop()
+    print(f"✓ Dropped {LEGACY}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--rollback', action='store_true', help="go back to the regular collection")
+    group.add_argument('--drop-legacy', action='store_true', help=f"drop {LEGACY} once satisfied")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    client = MongoClient(MONGO_URL)
+    db = client[DB_NAME]
+    if args.rollback:
+        rollback(db, args.batch_size)
+    elif args.drop_legacy:
+        drop_legacy(db)
+    else:
+        migrate(db, args.batch_size)
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
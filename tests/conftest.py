@@ -0,0 +1,57 @@
+"""
+Shared fixtures: the API server on a throwaway SQLite file (STORAGE_BACKEND=sqlite).
+
+The server module reads its configuration at import time, so it is imported
+fresh per test module and removed from sys.modules afterwards.
+"""
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from tests.factories import add_user
+
+BACKEND_DIR = Path(__file__).parent.parent / 'backend'
+
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp('kasir')
+    saved = dict(os.environ)
+    os.environ.update({
+        'STORAGE_BACKEND': 'sqlite',
+        'SQLITE_PATH': str(tmp / 'kasir.db'),
+        'DB_NAME': 'kasir_test',
+        'ARCHIVE_INTERVAL_HOURS': '0',
+        'EXPORT_INTERVAL_HOURS': '0',
+        'EXPORT_DIR': str(tmp / 'exports'),
+        'MEDIA_DIR': str(tmp / 'media'),
+    })
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    sys.modules.pop('server', None)
+    import server as module
+    yield module
+    sys.modules.pop('server', None)
+    os.environ.clear()
+    os.environ.update(saved)
+
+
+@pytest.fixture(scope='module')
+def client(server):
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope='module')
+def admin(server, client):
+    return add_user(server, client, f'admin_{uuid.uuid4().hex[:6]}')
+
+
+@pytest.fixture
+def cashier(server, client):
+    """Admin of an outlet of its own, so stock and orders start empty."""
+    return add_user(server, client, f'outlet_admin_{uuid.uuid4().hex[:6]}', outlet_id=uuid.uuid4().hex[:8])
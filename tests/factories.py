@@ -0,0 +1,79 @@
+"""Documents and users as the server stores them, for seeding tests directly."""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+
+def add_user(server, client, username, role='admin', outlet_id=None):
+    """Insert a user directly and return Authorization headers for it."""
+    doc = server.User(
+        username=username, full_name=username.title(), role=role,
+        outlet_id=outlet_id or server.DEFAULT_OUTLET_ID
+    ).model_dump()
+    doc['hashed_password'] = server.get_password_hash('secret')
+    doc['created_at'] = doc['created_at'].isoformat()
+    client.portal.call(server.db.users.insert_one, doc)
+    token = client.post('/api/auth/login', json={'username': username, 'password': 'secret'}).json()['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def make_order(server, created_at, items, outlet_id=None, status='completed', table_id=None):
+    """Order document as the server stores it, optionally completed an hour later."""
+    subtotal = sum(line['subtotal'] for line in items)
+    return {
+        'id': str(uuid.uuid4()),
+        'order_number': f"ORD-{created_at:%Y%m%d}-{uuid.uuid4().hex[:4]}",
+        'table_id': table_id,
+        'table_number': '1' if table_id else None,
+        'order_type': 'dine-in' if table_id else 'takeaway',
+        'items': [{'line_id': str(uuid.uuid4()), 'notes': None, **line} for line in items],
+        'subtotal': subtotal, 'tax': 0.0, 'total': subtotal,
+        'status': status,
+        'created_by': 'admin',
+        'outlet_id': outlet_id or server.DEFAULT_OUTLET_ID,
+        'created_at': created_at.isoformat(),
+        'completed_at': (created_at + timedelta(hours=1)).isoformat() if status == 'completed' else None,
+        'dwell_seconds': 3600.0 if status == 'completed' else None,
+    }
+
+
+def make_transaction(server, order, method='cash'):
+    created_at = datetime.fromisoformat(order['completed_at'] or order['created_at']).astimezone(timezone.utc)
+    return server.stored_transaction({
+        'id': str(uuid.uuid4()),
+        'transaction_number': f"TRX-{created_at:%Y%m%d}-{uuid.uuid4().hex[:4]}",
+        'order_id': order['id'],
+        'payment_method': method,
+        'amount_paid': order['total'], 'change_amount': 0.0, 'total': order['total'],
+        'cashier': 'Admin',
+        'outlet_id': order['outlet_id'],
+        'created_at': created_at.isoformat(),
+    })
+
+
+# ---- through the API ----
+
+def menu_item(client, headers, name='Kopi Susu', price=10000.0, **extra):
+    category = client.post('/api/categories', headers=headers, json={'name': 'Minuman'}).json()
+    response = client.post('/api/menu-items', headers=headers, json={
+        'name': name, 'category_id': category['id'], 'price': price, **extra
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def line(item, quantity=1):
+    return {'menu_item_id': item['id'], 'menu_item_name': item['name'], 'quantity': quantity,
+            'price': item['price'], 'subtotal': item['price'] * quantity}
+
+
+def order_body(*lines):
+    subtotal = sum(entry['subtotal'] for entry in lines)
+    return {'order_type': 'takeaway', 'items': list(lines), 'subtotal': subtotal, 'tax': 0.0, 'total': subtotal}
+
+
+def place(client, headers, *lines, **extra_headers):
+    return client.post('/api/orders', headers={**headers, **extra_headers}, json=order_body(*lines))
+
+
+def stock_of(client, headers, item):
+    return next(i for i in client.get('/api/menu-items', headers=headers).json() if i['id'] == item['id'])
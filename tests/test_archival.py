@@ -0,0 +1,89 @@
+"""Archiving closed months of orders and transactions (user-028) on the SQLite backend."""
+from datetime import datetime, timezone
+
+import pytest
+
+from tests.factories import make_order, make_transaction
+
+NASI = {'menu_item_id': 'nasi', 'menu_item_name': 'Nasi Goreng', 'quantity': 2, 'price': 20000.0, 'subtotal': 40000.0}
+
+
+@pytest.fixture(scope='module')
+def archived(server, client, admin):
+    """Two 2024 table orders and their payments, moved into monthly archives."""
+    orders = [
+        make_order(server, datetime(2024, 3, 5, 12, tzinfo=timezone.utc), [NASI], table_id='t1'),
+        make_order(server, datetime(2024, 4, 9, 19, tzinfo=timezone.utc), [NASI], table_id='t1'),
+    ]
+    client.portal.call(server.db.orders.insert_many, orders)
+    client.portal.call(server.db.transactions.insert_many, [make_transaction(server, o) for o in orders])
+    response = client.post('/api/admin/archive', headers=admin)
+    assert response.status_code == 200
+    assert response.json()['orders'] == 2 and response.json()['transactions'] == 2
+    return orders
+
+
+def test_archived_documents_leave_the_hot_collections(server, client, archived):
+    assert client.portal.call(server.db.orders.count_documents, {}) == 0
+    assert client.portal.call(server.db.orders_archive_2024_03.count_documents, {}) == 1
+
+
+def test_daily_report_includes_archives(client, admin, archived):
+    response = client.get('/api/reports/daily?date=2024-03-05', headers=admin)
+    assert response.status_code == 200, response.text
+    assert response.json()['total_transactions'] == 1
+
+
+def test_range_report_includes_archives(client, admin, archived):
+    response = client.get('/api/reports/range?from=2024-03-01&to=2024-04-30', headers=admin)
+    assert response.status_code == 200
+    report = response.json()
+    assert report['total_transactions'] == 2
+    assert report['total_revenue'] == 80000.0
+    assert report['top_selling_items'][0]['quantity'] == 4
+
+
+def test_table_turnover_reads_archives(client, admin, archived):
+    response = client.get('/api/reports/table-turnover?from=2024-03-01&to=2024-04-30', headers=admin)
+    assert response.status_code == 200, response.text
+    assert sum(table['turns'] for table in response.json()['tables']) == 2
+
+
+def test_group_by_report_includes_archives(client, admin, archived):
+    response = client.get('/api/reports/group-by?from=2024-01-01&to=2024-12-31&by=item,payment_method', headers=admin)
+    assert response.status_code == 200, response.text
+    assert response.json()['rows'] == [
+        {'item': 'Nasi Goreng', 'payment_method': 'cash', 'revenue': 80000.0, 'count': 2, 'quantity': 4}
+    ]
+
+
+def test_archives_written_by_another_worker_are_picked_up(server, client, admin, archived, monkeypatch):
+    """Another worker archived June 2023; this process never touched its index."""
+    order = make_order(server, datetime(2023, 6, 10, 9, tzinfo=timezone.utc), [NASI])
+    client.portal.call(server.db.orders_archive_2023_06.insert_one, order)
+    client.portal.call(server.db.transactions_archive_2023_06.insert_one, make_transaction(server, order))
+    for collection in ('orders', 'transactions'):
+        client.portal.call(
+            server.db.archive_months.insert_one, {'collection': collection, 'month': '2023-06', 'count': 1}
+        )
+    monkeypatch.setattr(server, 'ARCHIVE_INDEX_TTL_SECONDS', 0)
+
+    report = client.get('/api/reports/range?from=2023-06-01&to=2023-06-30', headers=admin).json()
+    assert report['total_transactions'] == 1
+    assert client.portal.call(server.archived_count, 'transactions', server.DEFAULT_OUTLET_ID) == 3
+
+
+def test_only_archive_readers_refresh_the_index(server, client, admin, monkeypatch):
+    reloads = []
+    real_load = server.load_archive_index
+
+    async def counting_load():
+        reloads.append(1)
+        await real_load()
+
+    monkeypatch.setattr(server, 'load_archive_index', counting_load)
+    monkeypatch.setattr(server, 'ARCHIVE_INDEX_TTL_SECONDS', 0)
+    assert client.get('/api/categories', headers=admin).status_code == 200
+    assert reloads == []
+    assert client.get('/api/reports/daily?date=2024-03-05', headers=admin).status_code == 200
+    assert reloads
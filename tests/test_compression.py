@@ -0,0 +1,128 @@
+"""Response compression middleware (user-038)."""
+import asyncio
+import gzip
+import json
+
+import pytest
+
+
+def big_json(size=4096):
+    return json.dumps({'items': ['kopi susu'] * (size // 10)}).encode()
+
+
+def run(server, app, method='GET', accept='gzip', path='/api/reports/sales'):
+    """Drive the middleware around a raw ASGI app and return the sent messages."""
+    messages = []
+    scope = {
+        'type': 'http', 'method': method, 'path': path,
+        'headers': [(b'accept-encoding', accept.encode())] if accept else [],
+    }
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(server.CompressionMiddleware(app)(scope, receive, send))
+    return messages
+
+
+def respond(content_type, *chunks, extra_headers=()):
+    async def app(scope, receive, send):
+        headers = [(b'content-type', content_type.encode()), *extra_headers]
+        if len(chunks) == 1:
+            headers.append((b'content-length', str(len(chunks[0])).encode()))
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        for i, chunk in enumerate(chunks):
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': i < len(chunks) - 1})
+    return app
+
+
+def header(message, name):
+    values = [v for k, v in message['headers'] if k.lower() == name]
+    return values[0] if values else None
+
+
+def test_large_json_is_gzipped_with_vary(server):
+    body = big_json()
+    start, sent = run(server, respond('application/json', body))
+    assert header(start, b'content-encoding') == b'gzip'
+    assert header(start, b'vary') == b'Accept-Encoding'
+    assert gzip.decompress(sent['body']) == body
+    assert header(start, b'content-length') == str(len(sent['body'])).encode()
+
+
+@pytest.mark.parametrize('accept, expected', [
+    ('br, gzip', 'gzip'), ('gzip;q=0.5', 'gzip'), ('*', 'gzip'), ('gzip;q=0', None), ('identity', None), ('', None),
+])
+def test_negotiation_honours_q_values(server, monkeypatch, accept, expected):
+    monkeypatch.setattr(server, 'brotli', None)
+    assert server.negotiate_encoding(accept) == expected
+
+
+def test_catalog_bodies_are_compressed_once(server):
+    body = big_json()
+    hits = server.compression_cache.hits
+    for _ in range(2):
+        _, sent = run(server, respond('application/json', body), path='/api/menu-items')
+        assert gzip.decompress(sent['body']) == body
+    assert server.compression_cache.hits == hits + 1
+
+
+def test_binary_responses_are_not_encoded(server):
+    body = b'\x1b@' + b'\x00' * 4000 + b'\x1dVA\x03'
+    messages = run(server, respond('application/octet-stream', body))
+    assert header(messages[0], b'content-encoding') is None
+    assert b''.join(m['body'] for m in messages[1:]) == body
+
+
+@pytest.mark.parametrize('accept', ['gzip', None])
+def test_small_or_unaccepted_json_still_varies(server, accept):
+    body = big_json(100) if accept else big_json()
+    start, sent = run(server, respond('application/json', body), accept=accept)
+    assert header(start, b'content-encoding') is None
+    assert header(start, b'vary') == b'Accept-Encoding'
+    assert sent['body'] == body
+
+
+def test_existing_vary_is_extended(server):
+    app = respond('application/json', big_json(), extra_headers=[(b'vary', b'Origin')])
+    start, _ = run(server, app)
+    assert header(start, b'vary') == b'Origin, Accept-Encoding'
+
+
+def test_images_stream_through_unbuffered(server):
+    chunks = [b'RIFF' + b'\x00' * 4000, b'\x01' * 4000, b'\x02' * 10]
+    messages = run(server, respond('image/webp', *chunks))
+    assert messages[0]['headers'] == [(b'content-type', b'image/webp')]
+    assert [m['body'] for m in messages[1:]] == chunks
+    assert [m['more_body'] for m in messages[1:]] == [True, True, False]
+
+
+def test_head_is_left_alone(server):
+    async def app(scope, receive, send):
+        headers = [(b'content-type', b'application/json'), (b'content-length', b'5000')]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    start, sent = run(server, app, method='HEAD')
+    assert header(start, b'content-length') == b'5000'
+    assert header(start, b'content-encoding') is None
+    assert sent['body'] == b''
+
+
+def test_large_bodies_compress_in_the_threadpool(server, monkeypatch):
+    offloaded = []
+
+    async def spy(func, *args):
+        offloaded.append(len(args[0]))
+        return func(*args)
+
+    monkeypatch.setattr(server, 'run_in_threadpool', spy)
+    run(server, respond('application/json', big_json()))
+    assert offloaded == []
+    large = big_json(server.COMPRESSION_THREADPOOL_BYTES + 1)
+    start, sent = run(server, respond('application/json', large))
+    assert offloaded == [len(large)]
+    assert gzip.decompress(sent['body']) == large
@@ -0,0 +1,54 @@
+"""Parquet export of closed days (user-048)."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tests.factories import make_order, make_transaction
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.dataset as ds  # noqa: E402
+
+NASI = {'menu_item_id': 'nasi', 'menu_item_name': 'Nasi Goreng', 'quantity': 2, 'price': 20000.0, 'subtotal': 40000.0}
+
+
+@pytest.fixture(scope='module')
+def sales(server, client):
+    """Orders ten days and three days ago; nothing in between."""
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    orders = [make_order(server, today - timedelta(days=days, hours=-9), [NASI]) for days in (10, 3)]
+    client.portal.call(server.db.orders.insert_many, orders)
+    client.portal.call(server.db.transactions.insert_many, [make_transaction(server, o) for o in orders])
+    return orders
+
+
+def exported_days(server, dataset):
+    outlet_dir = server.EXPORT_DIR / dataset / f'outlet_id={server.DEFAULT_OUTLET_ID}'
+    return sorted(p.name for p in outlet_dir.glob('date=*')) if outlet_dir.is_dir() else []
+
+
+def test_only_days_with_rows_are_written(server, client, admin, sales):
+    response = client.post('/api/admin/export', headers=admin)
+    assert response.status_code == 200
+    assert response.json()['days_written'] == {server.DEFAULT_OUTLET_ID: 2}
+    for dataset in server.EXPORT_DATASETS:
+        assert len(exported_days(server, dataset)) == 2
+
+
+def test_files_read_back_as_partitioned_dataset(server, client, admin, sales):
+    client.post('/api/admin/export', headers=admin)
+    orders = ds.dataset(server.EXPORT_DIR / 'orders', format='parquet', partitioning='hive').to_table()
+    items = ds.dataset(server.EXPORT_DIR / 'order_items', format='parquet', partitioning='hive').to_table()
+    assert orders.num_rows == 2 and items.num_rows == 2
+    assert sum(items.column('quantity').to_pylist()) == 4
+
+
+def test_second_run_writes_nothing(server, client, admin, sales):
+    client.post('/api/admin/export', headers=admin)
+    assert client.post('/api/admin/export', headers=admin).json()['days_written'] == {server.DEFAULT_OUTLET_ID: 0}
+
+
+def test_invalidation_drops_only_days_from_since(server, client, admin, sales):
+    client.post('/api/admin/export', headers=admin)
+    server.invalidate_exports(server.DEFAULT_OUTLET_ID, datetime.fromisoformat(sales[1]['created_at']))
+    assert exported_days(server, 'orders') == [f"date={sales[0]['created_at'][:10]}"]
+    assert client.post('/api/admin/export', headers=admin).json()['days_written'] == {server.DEFAULT_OUTLET_ID: 1}
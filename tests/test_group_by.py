@@ -0,0 +1,70 @@
+"""Ad-hoc group-by over the in-memory sales columns (user-049)."""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tests.factories import add_user, make_order, make_transaction
+
+pytest.importorskip('numpy')
+
+KOPI = {'menu_item_id': 'kopi', 'menu_item_name': 'Kopi Susu', 'quantity': 2, 'price': 10000.0, 'subtotal': 20000.0}
+TEH = {'menu_item_id': 'teh', 'menu_item_name': 'Es Teh', 'quantity': 1, 'price': 5000.0, 'subtotal': 5000.0}
+
+
+def sell(server, client, outlet_id, created_at, items, method, cashier):
+    order = make_order(server, created_at, items, outlet_id=outlet_id)
+    transaction = {**make_transaction(server, order, method), 'cashier': cashier}
+    client.portal.call(server.db.orders.insert_one, order)
+    client.portal.call(server.db.transactions.insert_one, transaction)
+
+
+@pytest.fixture
+def outlet(server, client):
+    outlet_id = uuid.uuid4().hex[:8]
+    # Paid at 10:00 and 11:00 UTC, 17:00 and 18:00 in Jakarta
+    sell(server, client, outlet_id, datetime(2025, 7, 7, 9, tzinfo=timezone.utc), [KOPI, TEH], 'cash', 'Sari')
+    sell(server, client, outlet_id, datetime(2025, 7, 7, 10, tzinfo=timezone.utc), [KOPI], 'qris', 'Budi')
+    return outlet_id, add_user(server, client, f'analytics_{outlet_id}', outlet_id=outlet_id)
+
+
+def group_by(client, headers, **params):
+    response = client.get('/api/reports/group-by', headers=headers, params={'from': '2025-07-01', 'to': '2025-07-31', **params})
+    assert response.status_code == 200, response.text
+    return response.json()['rows']
+
+
+def test_lines_by_item(client, outlet):
+    _, headers = outlet
+    assert group_by(client, headers, by='item') == [
+        {'item': 'Kopi Susu', 'revenue': 40000.0, 'quantity': 4, 'count': 2},
+        {'item': 'Es Teh', 'revenue': 5000.0, 'quantity': 1, 'count': 1},
+    ]
+
+
+def test_transactions_by_cashier_and_local_hour(client, outlet):
+    _, headers = outlet
+    rows = group_by(client, headers, by='cashier,hour', dataset='transactions')
+    assert sorted((r['cashier'], r['hour'], r['revenue']) for r in rows) == [('Budi', 18, 20000.0), ('Sari', 17, 25000.0)]
+    assert group_by(client, headers, by='item', payment_method='qris') == [
+        {'item': 'Kopi Susu', 'revenue': 20000.0, 'quantity': 2, 'count': 1}
+    ]
+
+
+def test_new_sales_are_appended(server, client, outlet):
+    outlet_id, headers = outlet
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    params = {'from': today, 'to': today, 'by': 'payment_method', 'dataset': 'transactions'}
+    assert client.get('/api/reports/group-by', headers=headers, params=params).json()['rows'] == []
+    # Paid an hour after it was opened, i.e. now
+    opened = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=1)
+    sell(server, client, outlet_id, opened, [TEH], 'cash', 'Sari')
+    rows = client.get('/api/reports/group-by', headers=headers, params=params).json()['rows']
+    assert [(r['payment_method'], r['count']) for r in rows] == [('cash', 1)]
+
+
+def test_unknown_dimensions_are_rejected(client, outlet):
+    _, headers = outlet
+    response = client.get('/api/reports/group-by', headers=headers,
+                          params={'from': '2025-07-01', 'to': '2025-07-31', 'by': 'item', 'dataset': 'transactions'})
+    assert response.status_code == 400
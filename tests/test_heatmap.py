@@ -0,0 +1,28 @@
+"""Weekday x hour peak-load heatmap (user-035)."""
+import uuid
+from datetime import datetime, timezone
+
+from tests.factories import add_user, make_order, make_transaction
+
+KOPI = {'menu_item_id': 'kopi', 'menu_item_name': 'Kopi Susu', 'quantity': 1, 'price': 10000.0, 'subtotal': 10000.0}
+
+
+def test_cells_are_in_the_report_timezone(server, client):
+    outlet_id = uuid.uuid4().hex[:8]
+    # Paid an hour after creation: Monday 12:00 twice and Monday 03:00 in Jakarta
+    for created_at in (datetime(2025, 6, 2, 4, tzinfo=timezone.utc), datetime(2025, 6, 2, 4, 30, tzinfo=timezone.utc),
+                       datetime(2025, 6, 1, 19, tzinfo=timezone.utc)):
+        order = make_order(server, created_at, [KOPI], outlet_id=outlet_id)
+        client.portal.call(server.db.orders.insert_one, order)
+        client.portal.call(server.db.transactions.insert_one, make_transaction(server, order))
+    headers = add_user(server, client, f'heatmap_{outlet_id}', outlet_id=outlet_id)
+
+    report = client.get('/api/reports/heatmap?from=2025-06-01&to=2025-06-07', headers=headers).json()
+    assert report['timezone'] == 'Asia/Jakarta'
+    assert report['transactions'][0][12] == 2 and report['transactions'][0][3] == 1
+    assert sum(map(sum, report['revenue'])) == 30000
+    assert report['peak'] == {'weekday': 'Monday', 'hour': 12, 'transactions': 2, 'revenue': 20000}
+
+
+def test_bad_dates_are_rejected(client, admin):
+    assert client.get('/api/reports/heatmap?from=2025-06-07&to=2025-06-01', headers=admin).status_code == 400
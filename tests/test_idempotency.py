@@ -0,0 +1,76 @@
+"""Idempotency-Key on POST /orders and POST /transactions (user-032)."""
+import uuid
+
+from fastapi import HTTPException
+
+
+def line(quantity=1):
+    return {'line_id': str(uuid.uuid4()), 'menu_item_id': 'teh', 'menu_item_name': 'Es Teh',
+            'quantity': quantity, 'price': 5000.0, 'subtotal': 5000.0 * quantity}
+
+
+def order_body(*lines):
+    lines = lines or (line(),)
+    subtotal = sum(entry['subtotal'] for entry in lines)
+    return {'order_type': 'takeaway', 'items': list(lines), 'subtotal': subtotal, 'tax': 0.0, 'total': subtotal}
+
+
+def count(server, client, collection):
+    return client.portal.call(server.db[collection].count_documents, {})
+
+
+def keyed(headers):
+    return {**headers, 'Idempotency-Key': str(uuid.uuid4())}
+
+
+def test_retried_order_is_created_once(server, client, admin):
+    headers, body = keyed(admin), order_body()
+    before = count(server, client, 'orders')
+    first = client.post('/api/orders', headers=headers, json=body)
+    second = client.post('/api/orders', headers=headers, json=body)
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert count(server, client, 'orders') == before + 1
+
+
+def test_retried_payment_is_recorded_once(server, client, admin):
+    order = client.post('/api/orders', headers=admin, json=order_body()).json()
+    headers = keyed(admin)
+    body = {'order_id': order['id'], 'payment_method': 'cash', 'amount_paid': 5000.0,
+            'change_amount': 0.0, 'total': 5000.0}
+    before = count(server, client, 'transactions')
+    first = client.post('/api/transactions', headers=headers, json=body)
+    second = client.post('/api/transactions', headers=headers, json=body)
+    assert first.status_code == second.status_code == 200
+    assert first.json()['id'] == second.json()['id']
+    assert count(server, client, 'transactions') == before + 1
+
+
+def test_reused_key_with_another_body_is_rejected(client, admin):
+    headers = keyed(admin)
+    assert client.post('/api/orders', headers=headers, json=order_body(line())).status_code == 200
+    assert client.post('/api/orders', headers=headers, json=order_body(line(2))).status_code == 422
+
+
+def test_failed_request_frees_its_key(server, client, admin, monkeypatch):
+    async def unavailable(*args):
+        raise HTTPException(status_code=503, detail='Database unavailable')
+
+    headers, body = keyed(admin), order_body()
+    with monkeypatch.context() as patch:
+        patch.setattr(server, 'insert_order', unavailable)
+        assert client.post('/api/orders', headers=headers, json=body).status_code == 503
+    assert client.post('/api/orders', headers=headers, json=body).status_code == 200
+
+
+def test_retry_without_line_ids_replays_the_stored_response(server, client, admin):
+    """Generated line ids must not make a byte-identical retry look like another body."""
+    headers = keyed(admin)
+    body = order_body(line())
+    del body['items'][0]['line_id']
+    before = count(server, client, 'orders')
+    first = client.post('/api/orders', headers=headers, json=body)
+    second = client.post('/api/orders', headers=headers, json=body)
+    assert first.status_code == second.status_code == 200, second.text
+    assert second.json() == first.json()
+    assert count(server, client, 'orders') == before + 1
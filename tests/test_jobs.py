@@ -0,0 +1,63 @@
+"""Outbox job queue for post-checkout side effects (user-040)."""
+import time
+from datetime import datetime, timezone
+
+LINE = {'menu_item_id': 'teh', 'menu_item_name': 'Es Teh', 'quantity': 1, 'price': 5000.0, 'subtotal': 5000.0}
+
+
+def wait_for(check, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not check() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return check()
+
+
+def outbox_job(server, client, job_id):
+    return client.portal.call(server.db.outbox.find_one, {'id': job_id}, {'_id': 0})
+
+
+def test_payment_frees_the_table_after_the_response(server, client, admin):
+    table = client.post('/api/tables', headers=admin, json={'table_number': '7', 'capacity': 4}).json()
+    order = client.post('/api/orders', headers=admin, json={
+        'table_id': table['id'], 'table_number': '7', 'order_type': 'dine-in', 'items': [LINE],
+        'subtotal': 5000.0, 'tax': 0.0, 'total': 5000.0
+    }).json()
+    table_status = lambda: next(t['status'] for t in client.get('/api/tables', headers=admin).json() if t['id'] == table['id'])
+    assert table_status() == 'occupied'
+
+    paid = client.post('/api/transactions', headers=admin, json={
+        'order_id': order['id'], 'payment_method': 'cash', 'amount_paid': 5000.0, 'change_amount': 0.0, 'total': 5000.0
+    }).json()
+    assert wait_for(lambda: table_status() == 'available')
+    job = client.portal.call(server.db.outbox.find_one, {'payload.transaction_id': paid['id']}, {'_id': 0})
+    assert wait_for(lambda: outbox_job(server, client, job['id'])['status'] == 'done')
+    stats = client.get('/api/admin/jobs', headers=admin).json()
+    assert stats['completed'] >= 1 and stats['backlog'] == 0
+
+
+def test_failed_jobs_back_off_then_give_up(server, client, admin, monkeypatch):
+    calls = []
+
+    @server.job_handler('test.flaky')
+    async def flaky(payload):
+        calls.append(payload)
+        raise RuntimeError('printer offline')
+
+    job = client.portal.call(server.enqueue_job, 'test.flaky', {'n': 1})
+    client.portal.call(server.run_job, job['id'])
+    retried = outbox_job(server, client, job['id'])
+    assert (retried['status'], retried['attempts']) == ('pending', 1)
+    assert retried['run_after'] > datetime.now(timezone.utc).isoformat()
+    assert 'printer offline' in retried['last_error']
+
+    # Not due yet: nobody may claim it
+    client.portal.call(server.run_job, job['id'])
+    assert len(calls) == 1
+
+    monkeypatch.setattr(server, 'JOB_MAX_ATTEMPTS', 2)
+    client.portal.call(server.db.outbox.update_one, {'id': job['id']},
+                       {'$set': {'run_after': datetime.now(timezone.utc).isoformat()}})
+    client.portal.call(server.run_job, job['id'])
+    assert outbox_job(server, client, job['id'])['status'] == 'failed'
+    assert len(calls) == 2
+    assert client.get('/api/admin/jobs', headers=admin).json()['failed_jobs'] >= 1
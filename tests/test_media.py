@@ -0,0 +1,86 @@
+"""Menu image storage (user-039)."""
+import hashlib
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture(scope='module')
+def uploaded(client, admin):
+    """A menu item with a 640x480 PNG uploaded as its picture."""
+    category = client.post('/api/categories', headers=admin, json={'name': 'Makanan'}).json()
+    item = client.post('/api/menu-items', headers=admin, json={
+        'name': 'Nasi Goreng', 'category_id': category['id'], 'price': 20000.0
+    }).json()
+    png = io.BytesIO()
+    Image.new('RGB', (640, 480), (200, 120, 40)).save(png, 'PNG')
+    response = client.post(f"/api/menu-items/{item['id']}/image", headers=admin,
+                           files={'file': ('nasi.png', png.getvalue(), 'image/png')})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_upload_renders_square_webp_thumbnails(client, uploaded):
+    for url, size in ((uploaded['thumbnail_url'], 160), (uploaded['image_url'], 480)):
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers['content-type'] == 'image/webp'
+        assert response.headers['cache-control'] == 'public, max-age=31536000, immutable'
+        assert Image.open(io.BytesIO(response.content)).size == (size, size)
+
+
+def test_etag_and_byte_ranges(client, uploaded):
+    url = uploaded['thumbnail_url']
+    full = client.get(url)
+    assert client.get(url, headers={'If-None-Match': full.headers['etag']}).status_code == 304
+
+    head = client.get(url, headers={'Range': 'bytes=0-3'})
+    assert head.status_code == 206 and head.content == b'RIFF'
+    assert head.headers['content-range'] == f"bytes 0-3/{len(full.content)}"
+    tail = client.get(url, headers={'Range': 'bytes=-4'})
+    assert tail.status_code == 206 and tail.content == full.content[-4:]
+    assert client.get(url, headers={'Range': f"bytes={len(full.content)}-"}).status_code == 416
+
+
+@pytest.mark.parametrize('value', ['bytes=0-1,4-5', 'bytes=-', 'items=0-3', 'bytes=5-2', 'bytes=abc'])
+def test_unparseable_ranges_get_the_whole_image(client, uploaded, value):
+    full = client.get(uploaded['thumbnail_url'])
+    response = client.get(uploaded['thumbnail_url'], headers={'Range': value})
+    assert response.status_code == 200 and response.content == full.content
+
+
+def test_bad_uploads_and_names_are_refused(client, admin, uploaded):
+    response = client.post(f"/api/menu-items/{uploaded['id']}/image", headers=admin,
+                           files={'file': ('broken.png', b'not an image', 'image/png')})
+    assert response.status_code == 400
+    assert client.get('/api/media/menu/../../server.py').status_code == 404
+    assert client.get('/api/media/menu/0123.webp').status_code == 404
+
+
+def test_concurrent_writes_of_one_image_do_not_collide(server):
+    folder = server.MEDIA_DIR / 'menu'
+    for round_ in range(20):
+        data = round_.to_bytes(2, 'big') + bytes(range(256)) * 4000
+        barrier = threading.Barrier(8)
+
+        def store(_):
+            barrier.wait()
+            return server.store_media(data)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            urls = set(pool.map(store, range(8)))
+        name = f"{hashlib.sha256(data).hexdigest()[:32]}.webp"
+        assert urls == {f'/api/media/menu/{name}'}
+        assert (folder / name).read_bytes() == data
+    assert not list(folder.glob('*.tmp'))
+
+
+def test_stored_image_is_served(server, client):
+    url = server.store_media(b'RIFF-served-image')
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == b'RIFF-served-image'
@@ -0,0 +1,71 @@
+"""Menu search over the per-outlet token index (user-037)."""
+import uuid
+
+import pytest
+
+from tests.factories import add_user
+
+
+@pytest.fixture(scope='module')
+def outlet(server, client):
+    """Admin of an outlet with a small menu, and its items by name."""
+    outlet_id = uuid.uuid4().hex[:8]
+    headers = add_user(server, client, f'search_{outlet_id}', outlet_id=outlet_id)
+    category = client.post('/api/categories', headers=headers, json={'name': 'Minuman'}).json()
+    items = {}
+    for name, description, available in [
+        ('Kopi Susu', 'Espresso dengan susu segar', True),
+        ('Kopi Hitam', None, True),
+        ('Es Teh Manis', 'Teh melati dengan gula', True),
+        ('Café Latte', 'Kopi dan susu', False),
+    ]:
+        items[name] = client.post('/api/menu-items', headers=headers, json={
+            'name': name, 'description': description, 'category_id': category['id'], 'price': 15000.0,
+            'available': available
+        }).json()
+    return headers, category, items
+
+
+def search(client, headers, q, **params):
+    response = client.get('/api/menu-items/search', headers=headers, params={'q': q, **params})
+    assert response.status_code == 200, response.text
+    return [hit['name'] for hit in response.json()]
+
+
+def test_prefixes_typos_and_accents_match(client, outlet):
+    headers, _, _ = outlet
+    assert search(client, headers, 'kop') == ['Kopi Hitam', 'Kopi Susu']
+    assert search(client, headers, 'kopu hitam') == ['Kopi Hitam']
+    assert search(client, headers, 'cafe', include_unavailable=True) == ['Café Latte']
+
+
+def test_names_outrank_descriptions_and_every_term_must_match(client, outlet):
+    headers, _, _ = outlet
+    assert search(client, headers, 'susu', include_unavailable=True) == ['Kopi Susu', 'Café Latte']
+    assert search(client, headers, 'teh susu') == []
+
+
+def test_hits_are_lean_and_hide_unavailable_items(client, outlet):
+    headers, category, _ = outlet
+    hits = client.get('/api/menu-items/search', headers=headers, params={'category_id': category['id']}).json()
+    assert [hit['name'] for hit in hits] == ['Es Teh Manis', 'Kopi Hitam', 'Kopi Susu']
+    assert {'id', 'name', 'category_id', 'price', 'available'} <= set(hits[0])
+    assert 'description' not in hits[0] and 'created_at' not in hits[0]
+
+
+def test_menu_writes_update_the_index(client, outlet):
+    headers, category, items = outlet
+    tea = items['Es Teh Manis']
+    renamed = client.put(f"/api/menu-items/{tea['id']}", headers=headers, json={
+        'name': 'Es Jeruk', 'category_id': category['id'], 'price': 12000.0
+    })
+    assert renamed.status_code == 200
+    assert search(client, headers, 'jeruk') == ['Es Jeruk']
+    assert search(client, headers, 'manis') == []
+    assert client.delete(f"/api/menu-items/{tea['id']}", headers=headers).status_code == 200
+    assert search(client, headers, 'jeruk') == []
+
+
+def test_other_outlets_have_their_own_index(server, client, outlet):
+    other = add_user(server, client, f'search_{uuid.uuid4().hex[:8]}', outlet_id=uuid.uuid4().hex[:8])
+    assert search(client, other, 'kopi') == []
@@ -0,0 +1,32 @@
+"""Adding, changing and removing lines of a pending order (user-045)."""
+from tests.factories import line, menu_item, place, stock_of
+
+
+def test_line_edits_move_totals_and_stock(client, cashier):
+    item = menu_item(client, cashier, stock=10)
+    order = place(client, cashier, line(item)).json()
+
+    added = client.post(f"/api/orders/{order['id']}/items", headers=cashier, json={'items': [line(item, 2)]})
+    assert added.status_code == 200
+    line_id = added.json()['line_ids'][0]
+    assert added.json()['totals_change']['subtotal'] == 20000
+
+    changed = client.patch(f"/api/orders/{order['id']}/items/{line_id}", headers=cashier, json={'quantity': 4})
+    assert changed.status_code == 200 and changed.json()['totals_change']['subtotal'] == 20000
+    assert stock_of(client, cashier, item)['stock'] == 5
+
+    removed = client.delete(f"/api/orders/{order['id']}/items/{line_id}", headers=cashier)
+    assert removed.status_code == 200 and removed.json()['totals_change']['subtotal'] == -40000
+    assert stock_of(client, cashier, item)['stock'] == 9
+
+    stored = client.get(f"/api/orders/{order['id']}", headers=cashier).json()
+    assert len(stored['items']) == 1 and stored['subtotal'] == 10000
+
+
+def test_line_edits_need_a_pending_order(client, cashier):
+    item = menu_item(client, cashier)
+    order = place(client, cashier, line(item)).json()
+    line_id = order['items'][0]['line_id']
+    assert client.put(f"/api/orders/{order['id']}/complete", headers=cashier).status_code == 200
+    response = client.patch(f"/api/orders/{order['id']}/items/{line_id}", headers=cashier, json={'quantity': 2})
+    assert response.status_code == 404
@@ -0,0 +1,49 @@
+"""On-demand request profiling (user-050)."""
+import threading
+import time
+
+from tests.factories import add_user
+
+
+def test_x_profile_replaces_the_response_with_its_profile(client, admin):
+    response = client.get('/api/categories', headers={**admin, 'X-Profile': 'json'})
+    assert response.status_code == 200
+    assert response.headers['X-Profiled-Status'] == '200'
+    profile = response.json()
+    assert set(profile['phases_ms']) == {'auth', 'validate', 'handler', 'serialize', 'framework'}
+    assert [r['request'] for r in profile['requests']] == ['GET /api/categories']
+
+
+def test_folded_output_is_plain_text(client, admin):
+    response = client.get('/api/categories', headers={**admin, 'X-Profile': 'folded'})
+    assert response.headers['content-type'].startswith('text/plain')
+    assert all(line.startswith('GET /api/categories') for line in response.text.splitlines())
+
+
+def test_x_profile_is_ignored_for_non_admins(server, client):
+    kasir = add_user(server, client, 'kasir_profile', role='kasir')
+    response = client.get('/api/categories', headers={**kasir, 'X-Profile': 'json'})
+    assert 'X-Profiled-Status' not in response.headers
+    assert isinstance(response.json(), list)
+
+
+def test_session_samples_the_next_requests(server, client, admin):
+    result = {}
+    profiling = threading.Thread(target=lambda: result.update(
+        response=client.post('/api/admin/profile?requests=2&timeout=10', headers=admin)
+    ))
+    profiling.start()
+    deadline = time.monotonic() + 5
+    while server.profiler.session is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    client.get('/api/categories', headers=admin)
+    client.get('/api/tables', headers=admin)
+    profiling.join(10)
+    response = result['response']
+    assert response.headers['X-Profile-Complete'] == 'true'
+    assert [r['request'] for r in response.json()['requests']] == ['GET /api/categories', 'GET /api/tables']
+
+
+def test_session_size_is_capped(server, client, admin):
+    response = client.post(f'/api/admin/profile?requests={server.PROFILE_MAX_REQUESTS + 1}', headers=admin)
+    assert response.status_code == 400
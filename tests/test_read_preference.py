@@ -0,0 +1,104 @@
+"""
+Read-preference routing against a local three-node replica set.
+
+Start one with, e.g.:
+    mongod --replSet rs0 --port 27017 --dbpath /tmp/rs0-0
+    mongod --replSet rs0 --port 27018 --dbpath /tmp/rs0-1
+    mongod --replSet rs0 --port 27019 --dbpath /tmp/rs0-2
+    mongosh --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27017"},
+        {_id: 1, host: "localhost:27018"},
+        {_id: 2, host: "localhost:27019"}]})'
+
+The tests are skipped when the replica set is not reachable.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+from pymongo.read_preferences import SecondaryPreferred
+
+REPLICA_SET_URL = os.environ.get(
+    'REPLICA_SET_URL',
+    'mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0'
+)
+DB_NAME = 'kasir_read_preference_test'
+
+
+class CommandRecorder(monitoring.CommandListener):
+    def __init__(self):
+        self.events = []
+
+    def started(self, event):
+        self.events.append(event)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server_module():
+    try:
+        probe = MongoClient(REPLICA_SET_URL, serverSelectionTimeoutMS=2000)
+        hello = probe.admin.command('hello')
+        if len(hello.get('hosts', [])) < 3:
+            pytest.skip('replica set has fewer than three members')
+        probe.close()
+    except PyMongoError:
+        pytest.skip('local three-node replica set not reachable')
+
+    os.environ.update({
+        'MONGO_URL': REPLICA_SET_URL,
+        'DB_NAME': DB_NAME,
+        'STORAGE_BACKEND': 'mongo',
+        'REPORTS_READ_PREFERENCE': 'secondaryPreferred',
+        'REPORTS_MAX_STALENESS_SECONDS': '120',
+    })
+    sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+    import server
+    yield server
+    MongoClient(REPLICA_SET_URL).drop_database(DB_NAME)
+
+
+def test_reports_db_uses_configured_read_preference(server_module):
+    assert server_module.reports_db.read_preference == SecondaryPreferred(max_staleness=120)
+    assert server_module.db.read_preference.mongos_mode == 'primary'
+
+
+def test_report_aggregation_is_routed_to_a_secondary(server_module):
+    recorder = CommandRecorder()
+    client = MongoClient(REPLICA_SET_URL, event_listeners=[recorder], w=3)
+    try:
+        client[DB_NAME].transactions.insert_one({
+            'id': 'trx-1', 'payment_method': 'cash', 'total': 1000.0,
+            'created_at': '2025-01-01T10:00:00+00:00'
+        })
+        reports = client.get_database(DB_NAME, read_preference=server_module.analytics_read_preference())
+        rows = list(reports.transactions.aggregate([
+            {'$group': {'_id': '$payment_method', 'amount': {'$sum': '$total'}}}
+        ]))
+        assert rows == [{'_id': 'cash', 'amount': 1000.0}]
+
+        secondaries = client.secondaries
+        aggregate = [e for e in recorder.events if e.command_name == 'aggregate']
+        assert aggregate and aggregate[-1].connection_id in secondaries
+    finally:
+        client.close()
+
+
+def test_report_helpers_run_against_replica_set(server_module):
+    from datetime import datetime, timezone
+
+    async def run():
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        end = datetime(2025, 1, 2, tzinfo=timezone.utc)
+        return await server_module.period_report(server_module.DEFAULT_OUTLET_ID, start, end)
+
+    assert isinstance(asyncio.run(run())["series"], list)
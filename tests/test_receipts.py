@@ -0,0 +1,54 @@
+"""Server-rendered receipts (user-030)."""
+from datetime import datetime, timezone
+
+import pytest
+
+from tests.factories import make_order, make_transaction
+
+ES_TEH = {'menu_item_id': 'teh', 'menu_item_name': 'Es Teh', 'quantity': 2, 'price': 5000.0, 'subtotal': 10000.0}
+
+
+@pytest.fixture(scope='module')
+def paid(server, client):
+    order = make_order(server, datetime(2025, 5, 1, 3, tzinfo=timezone.utc), [ES_TEH])
+    transaction = make_transaction(server, order, method='qris')
+    client.portal.call(server.db.orders.insert_one, order)
+    client.portal.call(server.db.transactions.insert_one, transaction)
+    return transaction
+
+
+def test_text_receipt(client, admin, paid):
+    response = client.get(f"/api/transactions/{paid['id']}/receipt", headers=admin)
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert f"No. Transaksi: {paid['transaction_number']}" in lines
+    assert 'Tanggal: 01/05/2025 11.00.00' in lines
+    assert '  2 x Rp 5.000 = Rp 10.000' in lines
+    assert 'TOTAL: Rp 10.000' in lines and 'Metode: QRIS' in lines
+
+
+def test_escpos_receipt(client, admin, paid):
+    response = client.get(f"/api/transactions/{paid['id']}/receipt?format=escpos", headers=admin)
+    assert response.headers['content-type'] == 'application/octet-stream'
+    assert response.content.startswith(b'\x1b@')
+    assert response.content.endswith(b'\x1dVA\x03')
+    assert b'TOTAL: Rp 10.000' in response.content
+
+
+def test_unchanged_receipt_is_not_modified(client, admin, paid):
+    url = f"/api/transactions/{paid['id']}/receipt"
+    etag = client.get(url, headers=admin).headers['ETag']
+    assert client.get(url, headers={**admin, 'If-None-Match': etag}).status_code == 304
+
+
+def test_settings_change_renders_a_new_receipt(client, admin, paid):
+    url = f"/api/transactions/{paid['id']}/receipt"
+    etag = client.get(url, headers=admin).headers['ETag']
+    assert client.put('/api/settings', headers=admin, json={'restaurant_name': 'Warung Baru'}).status_code == 200
+    response = client.get(url, headers={**admin, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.text.splitlines()[0].strip() == 'Warung Baru'
+
+
+def test_unknown_transaction(client, admin):
+    assert client.get('/api/transactions/nope/receipt', headers=admin).status_code == 404
@@ -0,0 +1,99 @@
+"""Report caching and its invalidation across workers (user-036)."""
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from tests.factories import add_user, make_order, make_transaction
+
+NASI = {'menu_item_id': 'nasi', 'menu_item_name': 'Nasi Goreng', 'quantity': 1, 'price': 20000.0, 'subtotal': 20000.0}
+
+
+def yesterday_report(client, headers):
+    day = (datetime.now(timezone.utc) - timedelta(days=1)).strftime('%Y-%m-%d')
+    return client.get(f'/api/reports/range?from={day}&to={day}', headers=headers).json()
+
+
+def outlet_admin(server, client):
+    outlet_id = uuid.uuid4().hex[:8]
+    return outlet_id, add_user(server, client, f'cache_{outlet_id}', outlet_id=outlet_id)
+
+
+def test_repeated_report_is_served_from_the_cache(server, client):
+    _, headers = outlet_admin(server, client)
+    first = yesterday_report(client, headers)
+    hits = client.get('/api/admin/cache-stats', headers=headers).json()['reports']['hits']
+    assert yesterday_report(client, headers) == first
+    assert client.get('/api/admin/cache-stats', headers=headers).json()['reports']['hits'] == hits + 1
+
+
+def test_paying_a_backdated_order_refreshes_its_report(server, client):
+    outlet_id, headers = outlet_admin(server, client)
+    opened = (datetime.now(timezone.utc) - timedelta(days=1)).replace(hour=10)
+    order = make_order(server, opened, [NASI], outlet_id=outlet_id, status='pending')
+    client.portal.call(server.db.orders.insert_one, order)
+    assert yesterday_report(client, headers)['top_selling_items'] == []
+
+    paid = client.post('/api/transactions', headers=headers, json={
+        'order_id': order['id'], 'payment_method': 'cash', 'amount_paid': 20000.0, 'change_amount': 0.0, 'total': 20000.0
+    })
+    assert paid.status_code == 200
+    # Side effects of a payment may run after the response
+    deadline = time.monotonic() + 5
+    while not yesterday_report(client, headers)['top_selling_items'] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert yesterday_report(client, headers)['top_selling_items'][0]['quantity'] == 1
+
+
+def test_backfill_seen_by_other_workers(server, client, admin):
+    assert yesterday_report(client, admin)['total_transactions'] == 0
+
+    # Another worker syncs an offline sale from yesterday: only the database changes here
+    order = make_order(server, datetime.now(timezone.utc) - timedelta(days=1, hours=2), [NASI])
+    client.portal.call(server.db.orders.insert_one, order)
+    client.portal.call(server.db.transactions.insert_one, make_transaction(server, order))
+    assert yesterday_report(client, admin)['total_transactions'] == 0
+
+    other_worker_cache = server.report_cache.entries.copy()
+    client.portal.call(server.invalidate_reports, server.DEFAULT_OUTLET_ID, datetime.fromisoformat(order['created_at']))
+    server.report_cache.entries.update(other_worker_cache)
+    assert yesterday_report(client, admin)['total_transactions'] == 1
+
+
+def test_changes_today_are_not_persisted(server, client):
+    before = client.portal.call(server.db.report_invalidations.count_documents, {})
+    client.portal.call(server.invalidate_reports, server.DEFAULT_OUTLET_ID, datetime.now(timezone.utc))
+    assert client.portal.call(server.db.report_invalidations.count_documents, {}) == before
+
+
+def test_closed_entries_expire(server, client, admin):
+    yesterday_report(client, admin)
+    closed = [expires_at for (_, _, closed), expires_at in server.report_cache.entries.values() if closed]
+    assert closed and all(expires_at is not None for expires_at in closed)
+
+
+def test_closed_hits_read_invalidations_at_most_once_per_interval(server, client, monkeypatch):
+    outlet_id, headers = outlet_admin(server, client)
+    reads = []
+    collection = server.db.report_invalidations
+    real_find = collection.find
+
+    def counting_find(*args, **kwargs):
+        reads.append(args)
+        return real_find(*args, **kwargs)
+
+    monkeypatch.setattr(collection, 'find', counting_find)
+    first = yesterday_report(client, headers)
+    for _ in range(3):
+        assert yesterday_report(client, headers) == first
+    assert len(reads) == 1
+
+    # Another worker's change is picked up once the interval has passed
+    order = make_order(server, datetime.now(timezone.utc) - timedelta(days=1, hours=2), [NASI], outlet_id=outlet_id)
+    client.portal.call(server.db.orders.insert_one, order)
+    client.portal.call(server.db.transactions.insert_one, make_transaction(server, order))
+    client.portal.call(collection.insert_one, {
+        'outlet_id': outlet_id, 'since': order['created_at'], 'at': datetime.now(timezone.utc)
+    })
+    assert yesterday_report(client, headers)['total_transactions'] == 0
+    monkeypatch.setattr(server, 'REPORT_INVALIDATION_CHECK_SECONDS', 0)
+    assert yesterday_report(client, headers)['total_transactions'] == 1
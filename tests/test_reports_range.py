@@ -0,0 +1,64 @@
+"""Range reports with hour/day/week/month buckets (user-034)."""
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from tests.factories import add_user, make_order, make_transaction
+
+KOPI = {'menu_item_id': 'kopi', 'menu_item_name': 'Kopi Susu', 'quantity': 1, 'price': 10000.0, 'subtotal': 10000.0}
+
+
+@pytest.fixture(scope='module')
+def owner(server, client):
+    """Admin of an outlet with one payment before the range and two inside it."""
+    outlet_id = uuid.uuid4().hex[:8]
+    payments = [
+        (datetime(2025, 5, 31, 9, tzinfo=timezone.utc), 1, 'cash'),
+        (datetime(2025, 6, 1, 9, tzinfo=timezone.utc), 1, 'cash'),
+        (datetime(2025, 6, 2, 12, tzinfo=timezone.utc), 2, 'qris'),
+    ]
+    for created_at, quantity, method in payments:
+        line = {**KOPI, 'quantity': quantity, 'subtotal': KOPI['price'] * quantity}
+        order = make_order(server, created_at, [line], outlet_id=outlet_id)
+        client.portal.call(server.db.orders.insert_one, order)
+        client.portal.call(server.db.transactions.insert_one, make_transaction(server, order, method))
+    return add_user(server, client, f'range_{outlet_id}', outlet_id=outlet_id)
+
+
+def range_report(client, headers, granularity='day', start='2025-06-01', end='2025-06-02'):
+    return client.get(f'/api/reports/range?from={start}&to={end}&granularity={granularity}', headers=headers)
+
+
+def test_daily_buckets_and_previous_period(client, owner):
+    report = range_report(client, owner).json()
+    assert (report['total_revenue'], report['total_transactions']) == (30000, 2)
+    assert report['previous']['total_revenue'] == 10000
+    assert report['revenue_growth'] == 200
+    assert [(b['bucket'], b['revenue'], b['transactions']) for b in report['series']] == [
+        ('2025-06-01', 10000, 1), ('2025-06-02', 20000, 1)
+    ]
+    assert report['payment_breakdown'] == [{'method': 'cash', 'amount': 10000}, {'method': 'qris', 'amount': 20000}]
+    assert report['top_selling_items'][0]['quantity'] == 3
+
+
+def test_weeks_roll_up_from_days(client, owner):
+    # 2025-06-01 is a Sunday, so the range spans two weeks
+    series = range_report(client, owner, 'week').json()['series']
+    assert [(b['bucket'], b['revenue']) for b in series] == [('2025-05-26', 10000), ('2025-06-02', 20000)]
+
+
+def test_hours_are_zero_filled(client, owner):
+    series = range_report(client, owner, 'hour').json()['series']
+    assert len(series) == 48
+    assert [b['bucket'] for b in series if b['revenue']] == ['2025-06-01T10:00', '2025-06-02T13:00']
+
+
+@pytest.mark.parametrize('granularity, start, end, status', [
+    ('day', '01-06-2025', '2025-06-02', 400),
+    ('day', '2025-06-02', '2025-06-01', 400),
+    ('hour', '2025-01-01', '2025-03-01', 400),
+    ('year', '2025-06-01', '2025-06-02', 422),
+])
+def test_bad_ranges_are_rejected(client, owner, granularity, start, end, status):
+    assert range_report(client, owner, granularity, start, end).status_code == status
@@ -0,0 +1,49 @@
+"""Cashier shifts and drawer reconciliation (user-042)."""
+import uuid
+
+from tests.factories import add_user
+
+LINE = {'menu_item_id': 'teh', 'menu_item_name': 'Es Teh', 'quantity': 1, 'price': 5000.0, 'subtotal': 5000.0}
+
+
+def pay(client, headers, method, quantity=1):
+    line = {**LINE, 'quantity': quantity, 'subtotal': LINE['price'] * quantity}
+    order = client.post('/api/orders', headers=headers, json={
+        'order_type': 'takeaway', 'items': [line], 'subtotal': line['subtotal'], 'tax': 0.0, 'total': line['subtotal']
+    }).json()
+    response = client.post('/api/transactions', headers=headers, json={
+        'order_id': order['id'], 'payment_method': method, 'amount_paid': line['subtotal'],
+        'change_amount': 0.0, 'total': line['subtotal']
+    })
+    assert response.status_code == 200, response.text
+
+
+def test_shift_totals_and_close_out(server, client):
+    kasir = add_user(server, client, f'kasir_{uuid.uuid4().hex[:6]}', role='kasir', outlet_id=uuid.uuid4().hex[:8])
+    assert client.get('/api/shifts/current', headers=kasir).status_code == 404
+    shift = client.post('/api/shifts/open', headers=kasir, json={'opening_cash': 100000}).json()
+    assert client.post('/api/shifts/open', headers=kasir, json={}).status_code == 409
+
+    pay(client, kasir, 'cash')
+    pay(client, kasir, 'qris', 2)
+    current = client.get('/api/shifts/current', headers=kasir).json()
+    assert current['totals'] == {'cash': 5000, 'qris': 10000} and current['transaction_count'] == 2
+
+    closed = client.post('/api/shifts/close', headers=kasir, json={'counted_cash': 104000, 'note': 'kurang'}).json()
+    assert (closed['status'], closed['expected_cash'], closed['cash_difference']) == ('closed', 105000, -1000)
+    assert client.post('/api/shifts/close', headers=kasir, json={'counted_cash': 0}).status_code == 404
+
+    report = client.get(f"/api/shifts/{shift['id']}?include_transactions=true", headers=kasir).json()
+    assert sorted(t['payment_method'] for t in report['transactions']) == ['cash', 'qris']
+
+
+def test_cashiers_only_see_their_own_shifts(server, client):
+    outlet_id = uuid.uuid4().hex[:8]
+    first = add_user(server, client, f'kasir_{uuid.uuid4().hex[:6]}', role='kasir', outlet_id=outlet_id)
+    second = add_user(server, client, f'kasir_{uuid.uuid4().hex[:6]}', role='kasir', outlet_id=outlet_id)
+    manager = add_user(server, client, f'admin_{uuid.uuid4().hex[:6]}', outlet_id=outlet_id)
+    shift = client.post('/api/shifts/open', headers=first, json={}).json()
+    client.post('/api/shifts/open', headers=second, json={})
+    assert [s['id'] for s in client.get('/api/shifts', headers=first).json()] == [shift['id']]
+    assert client.get(f"/api/shifts/{shift['id']}", headers=second).status_code == 404
+    assert len(client.get('/api/shifts?status=open', headers=manager).json()) == 2
@@ -0,0 +1,24 @@
+"""Sparse fieldsets on list endpoints (user-041)."""
+import uuid
+
+from tests.factories import add_user
+
+
+def test_only_requested_fields_and_id_are_returned(server, client):
+    outlet_id = uuid.uuid4().hex[:8]
+    headers = add_user(server, client, f'fields_{outlet_id}', outlet_id=outlet_id)
+    table = client.post('/api/tables', headers=headers, json={'table_number': '3', 'capacity': 2}).json()
+    response = client.get('/api/tables?fields=table_number,status', headers=headers)
+    assert response.status_code == 200
+    assert response.json() == [{'id': table['id'], 'table_number': '3', 'status': 'available'}]
+
+
+def test_full_documents_without_fields(client, admin):
+    client.post('/api/categories', headers=admin, json={'name': 'Snack'})
+    categories = client.get('/api/categories', headers=admin).json()
+    assert categories and {'id', 'name', 'created_at'} <= set(categories[0])
+
+
+def test_unknown_fields_are_rejected(client, admin):
+    response = client.get('/api/orders?fields=total,password', headers=admin)
+    assert response.status_code == 400 and 'password' in response.json()['detail']
@@ -0,0 +1,315 @@
+"""Mongo-to-SQLite translation in sqlite_store (user-026)."""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from pymongo import DeleteOne, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+import sqlite_store  # noqa: E402
+from sqlite_store import SQLiteClient  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    client = SQLiteClient(tmp_path / 'store.db')
+    yield client['kasir']
+    client.close()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def seed(db):
+    await db.orders.insert_many([
+        {'id': 'o1', 'outlet_id': 'a', 'status': 'completed', 'total': 30000,
+         'created_at': '2026-01-01T09:00:00+00:00',
+         'items': [{'menu_item_id': 'kopi', 'quantity': 2, 'subtotal': 20000},
+                   {'menu_item_id': 'teh', 'quantity': 1, 'subtotal': 10000}]},
+        {'id': 'o2', 'outlet_id': 'a', 'status': 'pending', 'total': 10000,
+         'created_at': '2026-01-02T09:00:00+00:00',
+         'items': [{'menu_item_id': 'kopi', 'quantity': 1, 'subtotal': 10000}]},
+        {'id': 'o3', 'outlet_id': 'b', 'status': 'completed', 'total': 5000,
+         'created_at': '2026-01-02T10:00:00+00:00', 'notes': None,
+         'items': [{'menu_item_id': 'teh', 'quantity': 1, 'subtotal': 5000}]},
+    ])
+
+
+def ids(docs):
+    return sorted(d['id'] for d in docs)
+
+
+def test_query_operators(db):
+    async def scenario():
+        await seed(db)
+        assert ids(await db.orders.find({'outlet_id': 'a'}).to_list(None)) == ['o1', 'o2']
+        assert ids(await db.orders.find({'total': {'$gte': 10000, '$lt': 30000}}).to_list(None)) == ['o2']
+        assert ids(await db.orders.find({'id': {'$in': ['o1', 'o3']}}).to_list(None)) == ['o1', 'o3']
+        assert ids(await db.orders.find({'status': {'$ne': 'pending'}}).to_list(None)) == ['o1', 'o3']
+        assert ids(await db.orders.find({'$or': [{'outlet_id': 'b'}, {'total': 30000}]}).to_list(None)) == ['o1', 'o3']
+        assert ids(await db.orders.find({'notes': {'$exists': True}}).to_list(None)) == []
+        newest = await db.orders.find({}, {'_id': 0, 'id': 1}).sort('created_at', -1).skip(1).limit(1).to_list(None)
+        assert newest == [{'id': 'o2'}]
+        assert await db.orders.count_documents({'outlet_id': 'a'}) == 2
+        assert await db.orders.find_one({'id': 'missing'}) is None
+
+    run(scenario())
+
+
+def test_update_operators_and_upsert(db):
+    async def scenario():
+        await seed(db)
+        result = await db.orders.update_one(
+            {'id': 'o2'}, {'$set': {'status': 'completed'}, '$inc': {'total': 500}, '$push': {'tags': 'late'}}
+        )
+        assert (result.matched_count, result.modified_count) == (1, 1)
+        order = await db.orders.find_one({'id': 'o2'}, {'_id': 0})
+        assert (order['status'], order['total'], order['tags']) == ('completed', 10500, ['late'])
+
+        await db.orders.update_one({'id': 'o2'}, {'$push': {'tags': {'$each': ['vip', 'late']}}, '$unset': {'total': ''}})
+        order = await db.orders.find_one({'id': 'o2'})
+        assert order['tags'] == ['late', 'vip', 'late'] and 'total' not in order
+
+        result = await db.orders.update_many({'outlet_id': 'a'}, {'$set': {'synced': True}})
+        assert result.modified_count == 2
+
+        result = await db.counters.update_one(
+            {'outlet_id': 'a', 'day': '2026-01-01'}, {'$inc': {'seq': 1}, '$setOnInsert': {'created': 1}}, upsert=True
+        )
+        assert result.upserted_id is not None
+        await db.counters.update_one({'outlet_id': 'a', 'day': '2026-01-01'}, {'$inc': {'seq': 1}}, upsert=True)
+        counter = await db.counters.find_one({'outlet_id': 'a'}, {'_id': 0})
+        assert counter == {'outlet_id': 'a', 'day': '2026-01-01', 'seq': 2, 'created': 1}
+
+    run(scenario())
+
+
+def test_aggregate_groups_in_sql(db):
+    async def scenario():
+        await seed(db)
+        per_day = await db.orders.aggregate([
+            {'$match': {'status': 'completed'}},
+            {'$group': {'_id': {'$substr': ['$created_at', 0, 10]}, 'revenue': {'$sum': '$total'}, 'count': {'$sum': 1}}},
+            {'$sort': {'_id': 1}},
+        ]).to_list(None)
+        assert per_day == [
+            {'_id': '2026-01-01', 'revenue': 30000, 'count': 1},
+            {'_id': '2026-01-02', 'revenue': 5000, 'count': 1},
+        ]
+        per_item = await db.orders.aggregate([
+            {'$match': {'outlet_id': 'a'}},
+            {'$unwind': '$items'},
+            {'$group': {'_id': {'item': '$items.menu_item_id'}, 'quantity': {'$sum': '$items.quantity'}}},
+            {'$sort': {'quantity': -1}},
+        ]).to_list(None)
+        assert per_item == [{'_id': {'item': 'kopi'}, 'quantity': 3}, {'_id': {'item': 'teh'}, 'quantity': 1}]
+        totals = await db.orders.aggregate([
+            {'$group': {'_id': '$outlet_id', 'totals': {'$push': '$total'}}},
+            {'$sort': {'_id': 1}},
+        ]).to_list(None)
+        assert totals == [{'_id': 'a', 'totals': [30000, 10000]}, {'_id': 'b', 'totals': [5000]}]
+        empty = await db.orders.aggregate([
+            {'$match': {'outlet_id': 'zzz'}},
+            {'$group': {'_id': None, 'total': {'$sum': '$total'}}},
+        ]).to_list(None)
+        assert empty == []
+
+    run(scenario())
+
+
+def test_union_with_reads_archive_tables(db):
+    async def scenario():
+        await seed(db)
+        await db.orders_archive_2025_12.insert_one(
+            {'id': 'old', 'outlet_id': 'a', 'status': 'completed', 'total': 1, 'created_at': '2025-12-31T09:00:00+00:00'}
+        )
+        rows = await db.orders.aggregate([
+            {'$match': {'outlet_id': 'a'}},
+            {'$unionWith': {'coll': 'orders_archive_2025_12', 'pipeline': [{'$match': {'outlet_id': 'a'}}]}},
+            {'$group': {'_id': None, 'revenue': {'$sum': '$total'}, 'count': {'$sum': 1}}},
+        ]).to_list(None)
+        assert rows == [{'_id': None, 'revenue': 40001, 'count': 3}]
+        empty_archive = await db.orders.aggregate([
+            {'$match': {'outlet_id': 'b'}},
+            {'$unionWith': 'orders_archive_2025_11'},
+            {'$sort': {'created_at': 1}},
+        ]).to_list(None)
+        assert ids(empty_archive) == ['o3']
+
+    run(scenario())
+
+
+def test_lookup_joins_transaction_history(db):
+    async def scenario():
+        await seed(db)
+        await db.transactions.insert_many([
+            {'id': 't1', 'order_id': 'o1', 'created_at': '2026-01-01T10:00:00+00:00'},
+            {'id': 't2', 'order_id': 'gone', 'created_at': '2026-01-02T10:00:00+00:00'},
+        ])
+        history = await db.transactions.aggregate([
+            {'$match': {}},
+            {'$sort': {'created_at': -1}},
+            {'$skip': 0},
+            {'$limit': 10},
+            {'$lookup': {'from': 'orders', 'localField': 'order_id', 'foreignField': 'id', 'as': 'order'}},
+            {'$unwind': {'path': '$order', 'preserveNullAndEmptyArrays': True}},
+            {'$project': {'_id': 0, 'order._id': 0}},
+        ]).to_list(None)
+        assert [t['id'] for t in history] == ['t2', 't1']
+        assert 'order' not in history[0]
+        assert history[1]['order']['total'] == 30000 and '_id' not in history[1]['order']
+
+    run(scenario())
+
+
+def test_bulk_write_applies_every_operation(db):
+    async def scenario():
+        await seed(db)
+        result = await db.orders.bulk_write([
+            InsertOne({'id': 'o4', 'outlet_id': 'a'}),
+            UpdateOne({'id': 'o1'}, {'$set': {'status': 'void'}}),
+            UpdateOne({'id': 'o9'}, {'$set': {'status': 'new'}}, upsert=True),
+            DeleteOne({'id': 'o3'}),
+        ])
+        assert (result.inserted_count, result.modified_count, result.upserted_count, result.deleted_count) == (1, 1, 1, 1)
+        assert ids(await db.orders.find().to_list(None)) == ['o1', 'o2', 'o4', 'o9']
+        assert (await db.orders.find_one({'id': 'o9'}))['status'] == 'new'
+
+    run(scenario())
+
+
+def test_unique_indexes_reject_duplicates(db):
+    async def scenario():
+        await db.users.create_index([('outlet_id', 1), ('id', 1)], unique=True)
+        await db.users.insert_one({'outlet_id': 'a', 'id': 'u1'})
+        await db.users.insert_one({'outlet_id': 'b', 'id': 'u1'})
+        with pytest.raises(DuplicateKeyError):
+            await db.users.insert_one({'outlet_id': 'a', 'id': 'u1'})
+
+    run(scenario())
+
+
+def test_ttl_index_purges_expired_documents(db, monkeypatch):
+    monkeypatch.setattr(sqlite_store, 'TTL_PURGE_INTERVAL_SECONDS', 0)
+
+    async def scenario():
+        await db.keys.create_index('created_at', expireAfterSeconds=3600)
+        now = datetime.now(timezone.utc)
+        await db.keys.insert_one({'key': 'old', 'created_at': (now - timedelta(hours=2)).isoformat()})
+        await db.keys.insert_one({'key': 'new', 'created_at': now.isoformat()})
+        assert [k['key'] for k in await db.keys.find().to_list(None)] == ['new']
+
+    run(scenario())
+
+
+def test_project_ahead_of_group_compiles_to_sql(db):
+    async def scenario():
+        await seed(db)
+        await db.orders_archive_2025_12.insert_one({'id': 'old', 'outlet_id': 'a', 'total': 1})
+        rows = await db.orders.aggregate([
+            {'$match': {'outlet_id': 'a'}},
+            {'$unionWith': {'coll': 'orders_archive_2025_12', 'pipeline': [
+                {'$match': {'outlet_id': 'a'}}, {'$project': {'total': 1}}
+            ]}},
+            {'$project': {'total': 1}},
+            {'$group': {'_id': None, 'revenue': {'$sum': '$total'}}},
+        ]).to_list(None)
+        assert rows == [{'_id': None, 'revenue': 40001}]
+
+    run(scenario())
+
+
+def test_elem_match_and_positional_update(db):
+    async def scenario():
+        await seed(db)
+        assert ids(await db.orders.find(
+            {'items': {'$elemMatch': {'menu_item_id': 'teh', 'quantity': {'$gte': 1}}}}
+        ).to_list(None)) == ['o1', 'o3']
+        await db.orders.update_one(
+            {'id': 'o1', 'items': {'$elemMatch': {'menu_item_id': 'teh'}}},
+            {'$set': {'items.$.quantity': 3, 'items.$.subtotal': 30000}}
+        )
+        items = (await db.orders.find_one({'id': 'o1'}))['items']
+        assert [(i['menu_item_id'], i['quantity'], i['subtotal']) for i in items] == [
+            ('kopi', 2, 20000), ('teh', 3, 30000)
+        ]
+        await db.orders.update_one({'id': 'o1'}, {'$pull': {'items': {'menu_item_id': 'kopi'}}})
+        assert [i['menu_item_id'] for i in (await db.orders.find_one({'id': 'o1'}))['items']] == ['teh']
+        with pytest.raises(NotImplementedError):
+            await db.orders.update_one({'id': 'o1'}, {'$set': {'items.$.quantity': 1}})
+
+    run(scenario())
+
+
+def test_find_one_and_update_returns_before_or_after(db):
+    async def scenario():
+        await db.counters.insert_one({'id': 'receipt', 'seq': 5})
+        before = await db.counters.find_one_and_update({'id': 'receipt'}, {'$inc': {'seq': 1}}, projection={'_id': 0})
+        after = await db.counters.find_one_and_update(
+            {'id': 'receipt'}, {'$inc': {'seq': 1}}, projection={'_id': 0}, return_document=ReturnDocument.AFTER
+        )
+        assert (before['seq'], after['seq']) == (5, 7)
+        created = await db.counters.find_one_and_update(
+            {'id': 'new'}, {'$inc': {'seq': 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        assert created['id'] == 'new' and created['seq'] == 1
+        assert await db.counters.find_one_and_update({'id': 'none'}, {'$inc': {'seq': 1}}) is None
+
+    run(scenario())
+
+
+def test_union_with_archives_then_project(db):
+    async def scenario():
+        await seed(db)
+        await db.orders_archive_2025_12.insert_one(
+            {'id': 'old', 'outlet_id': 'a', 'status': 'completed', 'total': 1, 'created_at': '2025-12-31T09:00:00+00:00'}
+        )
+        rows = await db.orders.aggregate([
+            {'$match': {'outlet_id': 'a'}},
+            {'$unionWith': {'coll': 'orders_archive_2025_12', 'pipeline': [{'$match': {'outlet_id': 'a'}}]}},
+            {'$project': {'_id': 0, 'id': 1, 'total': 1}},
+            {'$sort': {'created_at': 1}},
+        ]).to_list(None)
+        assert rows == [{'id': 'old', 'total': 1}, {'id': 'o1', 'total': 30000}, {'id': 'o2', 'total': 10000}]
+
+    run(scenario())
+
+
+def test_unique_violations_raise_pymongo_errors(db):
+    async def scenario():
+        await seed(db)
+        await db.orders.create_index('id', unique=True)
+        # Ordered: the writes before the rejected one stay, the ones after it never run
+        with pytest.raises(BulkWriteError) as error:
+            await db.orders.bulk_write([
+                UpdateOne({'id': 'o2'}, {'$set': {'status': 'void'}}),
+                InsertOne({'id': 'o1'}),
+                UpdateOne({'id': 'o3'}, {'$set': {'status': 'void'}}),
+            ])
+        details = error.value.details
+        assert [(e['index'], e['code']) for e in details['writeErrors']] == [(1, 11000)]
+        assert details['nMatched'] == 1
+        assert (await db.orders.find_one({'id': 'o2'}))['status'] == 'void'
+        assert (await db.orders.find_one({'id': 'o3'}))['status'] == 'completed'
+
+        # Unordered: every write is attempted
+        with pytest.raises(BulkWriteError) as error:
+            await db.orders.bulk_write([InsertOne({'id': 'o1'}), InsertOne({'id': 'o4'}), InsertOne({'id': 'o2'})],
+                                       ordered=False)
+        assert [e['index'] for e in error.value.details['writeErrors']] == [0, 2]
+        assert error.value.details['nInserted'] == 1
+        assert await db.orders.find_one({'id': 'o4'}) is not None
+
+        with pytest.raises(BulkWriteError):
+            await db.orders.insert_many([{'id': 'o5'}, {'id': 'o1'}, {'id': 'o6'}])
+        assert await db.orders.find_one({'id': 'o5'}) is not None
+        assert await db.orders.find_one({'id': 'o6'}) is None
+        with pytest.raises(DuplicateKeyError):
+            await db.orders.update_one({'id': 'o2'}, {'$set': {'id': 'o1'}})
+
+    run(scenario())
@@ -0,0 +1,69 @@
+"""Stock levels taken by orders (user-044)."""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from tests.factories import line, menu_item, place, stock_of
+
+
+def test_orders_take_stock_and_sell_out(client, cashier):
+    item = menu_item(client, cashier, stock=3)
+    assert place(client, cashier, line(item, 2)).status_code == 200
+    assert stock_of(client, cashier, item)['stock'] == 1
+    refused = place(client, cashier, line(item, 2))
+    assert refused.status_code == 409 and 'Kopi Susu' in refused.json()['detail']
+    assert place(client, cashier, line(item, 1)).status_code == 200
+    item = stock_of(client, cashier, item)
+    assert (item['stock'], item['available']) == (0, False)
+
+
+def test_missing_ingredient_puts_the_other_decrements_back(client, cashier):
+    milk = client.post('/api/ingredients', headers=cashier, json={'name': 'Susu', 'unit': 'ml', 'stock': 1000}).json()
+    beans = client.post('/api/ingredients', headers=cashier, json={'name': 'Kopi', 'unit': 'g', 'stock': 10}).json()
+    item = menu_item(client, cashier, stock=5, recipe=[
+        {'ingredient_id': milk['id'], 'quantity': 150}, {'ingredient_id': beans['id'], 'quantity': 18}
+    ])
+    refused = place(client, cashier, line(item))
+    assert refused.status_code == 409 and 'Kopi' in refused.json()['detail']
+    levels = {i['id']: i['stock'] for i in client.get('/api/ingredients', headers=cashier).json()}
+    assert (levels[milk['id']], levels[beans['id']]) == (1000, 10)
+    assert stock_of(client, cashier, item)['stock'] == 5
+
+
+def test_short_item_puts_back_the_items_before_it(client, cashier):
+    kopi = menu_item(client, cashier, stock=5)
+    teh = menu_item(client, cashier, name='Es Teh', price=5000.0, stock=1)
+    refused = place(client, cashier, line(kopi), line(teh, 2))
+    assert refused.status_code == 409 and 'Es Teh' in refused.json()['detail']
+    assert (stock_of(client, cashier, kopi)['stock'], stock_of(client, cashier, teh)['stock']) == (5, 1)
+
+
+def test_empty_ingredient_sells_out_every_item_using_it(client, cashier):
+    milk = client.post('/api/ingredients', headers=cashier, json={'name': 'Susu', 'unit': 'ml', 'stock': 150}).json()
+    recipe = [{'ingredient_id': milk['id'], 'quantity': 150}]
+    latte = menu_item(client, cashier, name='Latte', recipe=recipe)
+    susu = menu_item(client, cashier, name='Susu Segar', recipe=recipe)
+    plain = menu_item(client, cashier, name='Air Mineral')
+    assert place(client, cashier, line(latte)).status_code == 200
+    available = {i['id']: i['available'] for i in client.get('/api/menu-items', headers=cashier).json()}
+    assert (available[latte['id']], available[susu['id']], available[plain['id']]) == (False, False, True)
+
+
+def test_failed_order_insert_puts_the_stock_back(server, client, cashier, monkeypatch):
+    item = menu_item(client, cashier, stock=3)
+
+    async def failing_insert(document):
+        raise RuntimeError('write failed')
+
+    monkeypatch.setattr(server.db.orders, 'insert_one', failing_insert)
+    with pytest.raises(RuntimeError):
+        place(client, cashier, line(item, 2))
+    assert stock_of(client, cashier, item)['stock'] == 3
+
+
+def test_concurrent_orders_never_oversell(client, cashier):
+    item = menu_item(client, cashier, stock=2)
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        statuses = list(pool.map(lambda _: place(client, cashier, line(item)).status_code, range(5)))
+    assert sorted(statuses) == [200, 200, 409, 409, 409]
+    assert stock_of(client, cashier, item)['stock'] == 0
@@ -0,0 +1,80 @@
+"""Offline sync (user-031)."""
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+LINE = {'menu_item_id': 'teh', 'menu_item_name': 'Es Teh', 'quantity': 1, 'price': 5000.0, 'subtotal': 5000.0}
+
+
+def payment(order_id=None, **extra):
+    return {'id': str(uuid.uuid4()), 'order_id': order_id, 'payment_method': 'cash', 'amount_paid': 5000.0,
+            'change_amount': 0.0, 'total': 5000.0, 'created_at': datetime.now(timezone.utc).isoformat(), **extra}
+
+
+def offline_order():
+    return {'id': str(uuid.uuid4()), 'order_type': 'takeaway', 'items': [LINE], 'subtotal': 5000.0, 'tax': 0.0,
+            'total': 5000.0, 'created_at': datetime.now(timezone.utc).isoformat()}
+
+
+def transaction_count(server, client):
+    return client.portal.call(server.db.transactions.count_documents, {})
+
+
+def test_offline_order_and_payment_are_applied_once(server, client, admin):
+    entry = {'order': offline_order(), 'payment': payment()}
+    first = client.post('/api/sync/batch', headers=admin, json={'entries': [entry]}).json()
+    again = client.post('/api/sync/batch', headers=admin, json={'entries': [entry]}).json()
+    assert first['results'][0]['status'] == 'applied'
+    assert again['results'][0]['status'] == 'duplicate'
+    assert again['results'][0]['transaction_id'] == entry['payment']['id']
+
+
+def test_concurrent_resends_apply_a_batch_once(server, client, cashier):
+    entries = [{'order': offline_order(), 'payment': payment()}, {'order': offline_order()}]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        responses = list(pool.map(
+            lambda _: client.post('/api/sync/batch', headers=cashier, json={'entries': entries}), range(4)
+        ))
+    assert all(r.status_code == 200 for r in responses)
+    for index in range(len(entries)):
+        statuses = sorted(r.json()['results'][index]['status'] for r in responses)
+        assert statuses == ['applied'] + ['duplicate'] * 3
+    orders = client.get('/api/orders', headers=cashier).json()
+    assert sorted(o['id'] for o in orders) == sorted(e['order']['id'] for e in entries)
+    assert client.portal.call(server.db.transactions.count_documents, {'id': entries[0]['payment']['id']}) == 1
+
+
+def test_payment_queued_after_a_lost_online_response_is_not_counted_twice(server, client, admin):
+    order = client.post('/api/orders', headers=admin, json={
+        'order_type': 'takeaway', 'items': [LINE], 'subtotal': 5000.0, 'tax': 0.0, 'total': 5000.0
+    }).json()
+    online = client.post('/api/transactions', headers=admin, json={
+        'order_id': order['id'], 'payment_method': 'cash', 'amount_paid': 5000.0, 'change_amount': 0.0, 'total': 5000.0
+    }).json()
+    before = transaction_count(server, client)
+
+    # The terminal never saw the response and queued the same checkout offline
+    result = client.post('/api/sync/batch', headers=admin, json={'entries': [{'payment': payment(order['id'])}]}).json()
+    assert result['results'][0]['status'] == 'duplicate'
+    assert result['results'][0]['transaction_id'] == online['id']
+    assert transaction_count(server, client) == before
+
+
+def test_second_payment_in_one_batch_is_not_applied(server, client, admin):
+    order = client.post('/api/orders', headers=admin, json={
+        'order_type': 'takeaway', 'items': [LINE], 'subtotal': 5000.0, 'tax': 0.0, 'total': 5000.0
+    }).json()
+    before = transaction_count(server, client)
+    entries = [{'payment': payment(order['id'])}, {'payment': payment(order['id'])}]
+    statuses = [r['status'] for r in client.post('/api/sync/batch', headers=admin, json={'entries': entries}).json()['results']]
+    assert sorted(statuses) == ['applied', 'duplicate']
+    assert transaction_count(server, client) == before + 1
+
+
+def test_payment_for_a_cancelled_order_is_an_error(server, client, admin):
+    order = client.post('/api/orders', headers=admin, json={
+        'order_type': 'takeaway', 'items': [LINE], 'subtotal': 5000.0, 'tax': 0.0, 'total': 5000.0
+    }).json()
+    client.portal.call(server.db.orders.update_one, {'id': order['id']}, {'$set': {'status': 'cancelled'}})
+    result = client.post('/api/sync/batch', headers=admin, json={'entries': [{'payment': payment(order['id'])}]}).json()
+    assert result['results'][0]['status'] == 'error'
@@ -0,0 +1,71 @@
+"""Table turnover and dwell-time report (user-043)."""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tests.factories import add_user, make_order
+
+NASI = {'menu_item_id': 'nasi', 'menu_item_name': 'Nasi Goreng', 'quantity': 1, 'price': 20000.0, 'subtotal': 20000.0}
+
+
+def seat(server, client, table, opened, minutes):
+    """A completed order that kept `table` for `minutes`."""
+    order = make_order(server, opened, [NASI], outlet_id=table['outlet_id'], table_id=table['id'])
+    order['table_number'] = table['table_number']
+    order['completed_at'] = (opened + timedelta(minutes=minutes)).isoformat()
+    order['dwell_seconds'] = minutes * 60.0
+    client.portal.call(server.db.orders.insert_one, order)
+
+
+@pytest.fixture(scope='module')
+def outlet(server, client):
+    outlet_id = uuid.uuid4().hex[:8]
+    headers = add_user(server, client, f'turnover_{outlet_id}', outlet_id=outlet_id)
+    tables = [client.post('/api/tables', headers=headers, json={'table_number': n, 'capacity': 4}).json()
+              for n in ('1', '2')]
+    day = datetime(2025, 3, 3, 10, tzinfo=timezone.utc)
+    seat(server, client, tables[0], day, 30)
+    seat(server, client, tables[0], day + timedelta(days=1), 90)
+    seat(server, client, tables[1], day + timedelta(hours=2), 45)
+    return headers, tables
+
+
+def test_turns_and_dwell_per_table(client, outlet):
+    headers, (first, second) = outlet
+    report = client.get('/api/reports/table-turnover?from=2025-03-03&to=2025-03-04', headers=headers).json()
+    assert (report['days'], report['total_turns'], report['turns_per_table_per_day']) == (2, 3, 0.75)
+    by_table = {t['table_id']: t for t in report['tables']}
+    assert (by_table[first['id']]['turns'], by_table[first['id']]['turns_per_day']) == (2, 1.0)
+    assert by_table[first['id']]['dwell_minutes']['average'] == 60.0
+    assert by_table[first['id']]['dwell_minutes']['max'] == 90.0
+    assert by_table[second['id']]['table_number'] == '2' and by_table[second['id']]['turns'] == 1
+    assert report['dwell_minutes']['max'] == 90.0
+
+
+def test_seated_tables_are_always_live(client, outlet):
+    headers, (_, second) = outlet
+    url = '/api/reports/table-turnover?from=2025-03-03&to=2025-03-04'
+    assert client.get(url, headers=headers).json()['occupied_now'] == []
+    client.post('/api/orders', headers=headers, json={
+        'table_id': second['id'], 'table_number': '2', 'order_type': 'dine-in', 'items': [NASI],
+        'subtotal': 20000.0, 'tax': 0.0, 'total': 20000.0
+    })
+    occupied = client.get(url, headers=headers).json()['occupied_now']
+    assert [t['table_id'] for t in occupied] == [second['id']]
+    assert occupied[0]['seated_minutes'] < 1
+
+
+def test_completed_orders_store_their_dwell(server, client, outlet):
+    headers, (first, _) = outlet
+    order = client.post('/api/orders', headers=headers, json={
+        'table_id': first['id'], 'table_number': '1', 'order_type': 'dine-in', 'items': [NASI],
+        'subtotal': 20000.0, 'tax': 0.0, 'total': 20000.0
+    }).json()
+    assert client.put(f"/api/orders/{order['id']}/complete", headers=headers).status_code == 200
+    stored = client.portal.call(server.db.orders.find_one, {'id': order['id']})
+    assert 0 <= stored['dwell_seconds'] < 60
+
+    today = datetime.now(timezone.utc).date().isoformat()
+    report = client.get(f'/api/reports/table-turnover?from={today}&to={today}', headers=headers).json()
+    assert report['total_turns'] == 1
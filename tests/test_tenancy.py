@@ -0,0 +1,73 @@
+"""Outlet isolation (user-033)."""
+import sqlite3
+
+from tests.factories import add_user
+
+
+def test_register_requires_an_admin(client):
+    response = client.post('/api/auth/register', json={
+        'username': 'intruder', 'password': 'x', 'full_name': 'Intruder', 'role': 'admin'
+    })
+    assert response.status_code in (401, 403)
+
+
+def test_kasir_cannot_register_users(server, client):
+    kasir = add_user(server, client, 'kasir_register', role='kasir')
+    response = client.post('/api/auth/register', headers=kasir, json={
+        'username': 'escalated', 'password': 'x', 'full_name': 'Escalated', 'role': 'admin'
+    })
+    assert response.status_code == 403
+
+
+def test_registered_users_stay_in_the_admins_outlet(server, client):
+    admin = add_user(server, client, 'admin_jakarta', outlet_id='jakarta')
+    response = client.post('/api/auth/register', headers=admin, json={
+        'username': 'kasir_jakarta', 'password': 'x', 'full_name': 'Kasir', 'role': 'kasir',
+        'outlet_id': 'bandung'
+    })
+    assert response.status_code == 200
+    assert response.json()['outlet_id'] == 'jakarta'
+
+
+def test_outlets_do_not_see_each_other(server, client):
+    jakarta = add_user(server, client, 'admin_jkt2', outlet_id='jakarta')
+    bandung = add_user(server, client, 'admin_bdg', outlet_id='bandung')
+    category = client.post('/api/categories', headers=jakarta, json={'name': 'Minuman'}).json()
+    assert category['id'] not in [c['id'] for c in client.get('/api/categories', headers=bandung).json()]
+    assert client.delete(f"/api/categories/{category['id']}", headers=bandung).status_code == 404
+
+
+def test_scoped_collections_have_unique_outlet_id_indexes(server, client):
+    conn = sqlite3.connect(server.os.environ['SQLITE_PATH'])
+    try:
+        indexes = {name: sql for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index'")}
+    finally:
+        conn.close()
+    for collection in server.OUTLET_ID_COLLECTIONS:
+        assert 'UNIQUE' in indexes[f'ix_{collection}_outlet_id_1_id_1']
+    for name in ('ix_users_username_1', 'ix_settings_outlet_id_1'):
+        assert 'UNIQUE' in indexes[name]
+
+
+def test_settings_are_read_only_without_a_token(server, client):
+    jakarta = add_user(server, client, 'admin_jkt3', outlet_id='jakarta')
+    saved = client.put('/api/settings', headers=jakarta, json={'restaurant_name': 'Kopi Jakarta', 'version': 1})
+    assert saved.status_code == 200 and saved.json()['version'] == 2
+    assert client.get('/api/settings', headers=jakarta).json()['restaurant_name'] == 'Kopi Jakarta'
+
+    anonymous = client.get('/api/settings', params={'outlet_id': 'jakarta'}).json()
+    assert anonymous['outlet_id'] == server.DEFAULT_OUTLET_ID
+    assert anonymous['restaurant_name'] != 'Kopi Jakarta'
+
+    client.get('/api/settings', headers=add_user(server, client, 'admin_sby', outlet_id='surabaya'))
+    assert client.portal.call(server.db.settings.count_documents, {'outlet_id': 'surabaya'}) == 0
+    stale = client.put('/api/settings', headers=jakarta, json={'restaurant_name': 'Lama', 'version': 1})
+    assert stale.status_code == 409
+
+
+def test_numbers_count_per_outlet(server, client):
+    order = {'order_type': 'takeaway', 'items': [], 'subtotal': 0.0, 'tax': 0.0, 'total': 0.0}
+    for outlet_id in ('medan', 'makassar'):
+        admin = add_user(server, client, f'admin_{outlet_id}', outlet_id=outlet_id)
+        numbers = [client.post('/api/orders', headers=admin, json=order).json()['order_number'] for _ in range(2)]
+        assert [n[-4:] for n in numbers] == ['0001', '0002']
@@ -0,0 +1,48 @@
+"""Paginated transaction history with embedded orders (user-029)."""
+from datetime import datetime, timezone
+
+import pytest
+
+from tests.factories import make_order, make_transaction
+
+ES_TEH = {'menu_item_id': 'teh', 'menu_item_name': 'Es Teh', 'quantity': 1, 'price': 5000.0, 'subtotal': 5000.0}
+
+
+@pytest.fixture(scope='module')
+def paid(server, client):
+    """One paid order on each of 1-3 February 2025, oldest first."""
+    orders = [make_order(server, datetime(2025, 2, day, 9, tzinfo=timezone.utc), [ES_TEH]) for day in (1, 2, 3)]
+    transactions = [make_transaction(server, order) for order in orders]
+    client.portal.call(server.db.orders.insert_many, orders)
+    client.portal.call(server.db.transactions.insert_many, transactions)
+    return transactions
+
+
+def history(client, admin, **params):
+    response = client.get('/api/transactions/history', headers=admin, params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_pages_are_newest_first(client, admin, paid):
+    first = history(client, admin, limit=2)
+    second = history(client, admin, limit=2, skip=2)
+    assert [t['id'] for t in first['items'] + second['items']] == [t['id'] for t in reversed(paid)]
+    assert (first['has_more'], second['has_more']) == (True, False)
+
+
+def test_orders_are_embedded_on_request(client, admin, paid):
+    page = history(client, admin, limit=1, include_order='true')
+    assert page['items'][0]['order']['id'] == paid[-1]['order_id']
+    assert page['items'][0]['order']['items'][0]['menu_item_name'] == 'Es Teh'
+    assert history(client, admin, limit=1)['items'][0]['order'] is None
+
+
+def test_date_range_is_inclusive(client, admin, paid):
+    page = history(client, admin, start_date='2025-02-02', end_date='2025-02-02')
+    assert [t['id'] for t in page['items']] == [paid[1]['id']]
+
+
+def test_bad_dates_are_rejected(client, admin):
+    response = client.get('/api/transactions/history?start_date=02-02-2025', headers=admin)
+    assert response.status_code == 400
@@ -0,0 +1,23 @@
+"""Regular and time-series transaction layouts (user-047)."""
+from datetime import datetime, timezone
+
+DOC = {'id': 't1', 'outlet_id': 'main', 'payment_method': 'qris', 'cashier': 'Sari',
+       'created_at': '2026-03-01T08:30:00+00:00'}
+RANGE = {'$gte': '2026-03-01T00:00:00+00:00', '$lt': '2026-03-02T00:00:00+00:00'}
+
+
+def test_regular_layout_is_unchanged(server):
+    assert not server.TRANSACTIONS_TIMESERIES
+    assert server.stored_transaction(dict(DOC)) == DOC
+    assert server.transaction_time_filter(RANGE) == {}
+
+
+def test_timeseries_layout_adds_time_and_meta_fields(server, monkeypatch):
+    monkeypatch.setattr(server, 'TRANSACTIONS_TIMESERIES', True)
+    doc = server.stored_transaction(dict(DOC))
+    assert doc['ts'] == datetime(2026, 3, 1, 8, 30, tzinfo=timezone.utc)
+    assert doc['meta'] == {'outlet_id': 'main', 'payment_method': 'qris', 'cashier': 'Sari'}
+    assert doc['created_at'] == DOC['created_at']
+    assert server.transaction_time_filter(RANGE) == {'ts': {
+        '$gte': datetime(2026, 3, 1, tzinfo=timezone.utc), '$lt': datetime(2026, 3, 2, tzinfo=timezone.utc)
+    }}
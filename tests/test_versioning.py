@@ -0,0 +1,15 @@
+"""Optimistic concurrency on versioned documents (user-046)."""
+
+
+def test_stale_version_is_a_conflict(client, cashier):
+    category = client.post('/api/categories', headers=cashier, json={'name': 'Makanan'}).json()
+    assert category['version'] == 1
+    url = f"/api/categories/{category['id']}"
+    updated = client.put(url, headers=cashier, json={'name': 'Makanan Berat', 'version': 1})
+    assert updated.status_code == 200 and updated.json()['version'] == 2
+    stale = client.put(url, headers=cashier, json={'name': 'Snack', 'version': 1})
+    assert stale.status_code == 409
+    missing = client.put('/api/categories/nope', headers=cashier, json={'name': 'Snack', 'version': 1})
+    assert missing.status_code == 404
+    unversioned = client.put(url, headers=cashier, json={'name': 'Snack'})
+    assert unversioned.status_code == 200 and unversioned.json()['version'] == 3